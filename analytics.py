@@ -0,0 +1,255 @@
+"""
+# -- --------------------------------------------------------------------------------------------------- -- #
+# -- project: Quantitative Asset Allocation (QAA)                                                        -- #
+# -- script: analytics.py - Python script with the vectorized performance analytics of NAV paths         -- #
+# -- authors: diegotita4 - Antonio-IF - JoAlfonso - J3SVS - Oscar148                                     -- #
+# -- license: GNU GENERAL PUBLIC LICENSE - Version 3, 29 June 2007                                       -- #
+# -- repository: https://github.com/diegotita4/PAP                                                       -- #
+# -- --------------------------------------------------------------------------------------------------- -- #
+"""
+
+# ----------------------------------------------------------------------------------------------------
+
+# LIBRARIES
+import numpy as np
+import pandas as pd
+
+# ----------------------------------------------------------------------------------------------------
+
+# INPUTS
+# Every metric works column-wise on a (days x portfolios) NAV matrix, so the 11 strategies of a backtest (or every
+# point of a sweep, or every ticker of a price panel) are scored in one pass. Returns follow empyrical: simple
+# daily returns, rf as an annual rate in decimals applied as rf / periods per day, and standard deviations with
+# ddof=1. Missing values (e.g. a ticker that starts trading later) are skipped.
+PERIODS_PER_YEAR = 252
+
+
+def as_nav_matrix(nav):
+    """
+    NAV matrix as a DataFrame with one column per portfolio.
+
+    :param nav: NAV paths (days x portfolios), a single path, or a dict of paths on the same calendar.
+    :type nav: pd.DataFrame, pd.Series, dict or np.ndarray
+    :return: NAV matrix.
+    :rtype: pd.DataFrame
+    """
+    if isinstance(nav, pd.DataFrame):
+        return nav
+    if isinstance(nav, pd.Series):
+        return nav.to_frame(nav.name if nav.name is not None else 'portfolio')
+    if isinstance(nav, dict):
+        return pd.DataFrame(nav)
+    nav = np.asarray(nav, dtype=float)
+    return pd.DataFrame(nav if nav.ndim == 2 else nav[:, None])
+
+
+def simple_returns(nav):
+    """
+    Simple returns of every column of a NAV matrix.
+
+    :param nav: NAV matrix (T x K).
+    :type nav: np.ndarray
+    :return: Returns (T - 1 x K), NaN where either NAV is missing.
+    :rtype: np.ndarray
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return nav[1:] / nav[:-1] - 1
+
+
+def _first_last(nav):
+    """First and last valid value of every column, and the number of returns between them."""
+    valid = ~np.isnan(nav)
+    first_row = np.where(valid.any(axis=0), valid.argmax(axis=0), 0)
+    last_row = np.where(valid.any(axis=0), len(nav) - 1 - valid[::-1].argmax(axis=0), 0)
+    columns = np.arange(nav.shape[1])
+    first, last = nav[first_row, columns], nav[last_row, columns]
+    return first, last, (last_row - first_row).astype(float)
+
+# ----------------------------------------------------------------------------------------------------
+
+# DRAWDOWNS
+def drawdowns(nav):
+    """
+    Drawdown of every column from its running peak.
+
+    :param nav: NAV matrix (T x K).
+    :type nav: np.ndarray
+    :return: nav / running peak - 1 (T x K), zero at every new peak.
+    :rtype: np.ndarray
+    """
+    # fmax ignores the missing values instead of propagating them
+    return nav / np.fmax.accumulate(nav, axis=0) - 1
+
+
+def drawdown_durations(nav):
+    """
+    Number of periods every column has been below its last peak.
+
+    :param nav: NAV matrix (T x K).
+    :type nav: np.ndarray
+    :return: Periods since the last peak (T x K), zero at every new peak.
+    :rtype: np.ndarray
+    """
+    rows = np.broadcast_to(np.arange(len(nav))[:, None], nav.shape)
+    # A missing value inside the path does not end the drawdown; the rows before the first value have no peak to fall from
+    peak = np.fmax.accumulate(nav, axis=0)
+    at_peak = (nav >= peak) | np.isnan(peak)
+    last_peak = np.maximum.accumulate(np.where(at_peak, rows, 0), axis=0)
+    return rows - last_peak
+
+# ----------------------------------------------------------------------------------------------------
+
+# TURNOVER
+def holdings_turnover(shares, prices, portfolio_value=None):
+    """
+    One-way turnover of every rebalance: half the traded value over the portfolio value.
+
+    The first row is the initial purchase from cash and is not counted.
+
+    :param shares: Shares held after every rebalance (R x N).
+    :type shares: np.ndarray
+    :param prices: Prices at every rebalance (R x N).
+    :type prices: np.ndarray
+    :param portfolio_value: Portfolio value at every rebalance (R). Defaults to the value of the shares held.
+    :type portfolio_value: np.ndarray
+    :return: Turnover of rebalances 2..R (R - 1).
+    :rtype: np.ndarray
+    """
+    shares, prices = np.asarray(shares, dtype=float), np.asarray(prices, dtype=float)
+    if portfolio_value is None:
+        portfolio_value = (shares * prices).sum(axis=1)
+    traded = (np.abs(np.diff(shares, axis=0)) * prices[1:]).sum(axis=1)
+    return traded / 2 / np.asarray(portfolio_value, dtype=float)[1:]
+
+# ----------------------------------------------------------------------------------------------------
+
+# SUMMARY
+def performance_summary(nav, benchmark=None, rf=0.0, turnover=None, periods=PERIODS_PER_YEAR):
+    """
+    Performance metrics of every column of a NAV matrix in one vectorized pass.
+
+    Metrics:
+    - final_value / total_return: Last NAV and its return over the first.
+    - cagr: Compound annual growth rate.
+    - annual_volatility: Standard deviation of the returns, annualized.
+    - sharpe_ratio / sortino_ratio: Mean excess return over the volatility or the downside deviation, annualized.
+    - max_drawdown / max_drawdown_duration: Deepest fall from a peak and longest time below a peak (periods).
+    - calmar_ratio: CAGR over the absolute maximum drawdown.
+    - tracking_error / information_ratio: Volatility and mean of the returns in excess of the benchmark, annualized.
+    - annual_turnover: Sum of the one-way rebalance turnover over the years of the path.
+
+    :param nav: NAV paths (days x portfolios), see as_nav_matrix.
+    :type nav: pd.DataFrame
+    :param benchmark: Benchmark prices or NAV on the same calendar (missing dates are skipped).
+    :type benchmark: pd.Series
+    :param rf: Annual risk-free rate in decimals.
+    :type rf: float
+    :param turnover: Per-rebalance one-way turnover of every portfolio (see holdings_turnover), keyed by column.
+    :type turnover: dict
+    :param periods: Periods per year of the NAV. Defaults to 252 trading days.
+    :type periods: int
+    :return: One row per portfolio, one column per metric.
+    :rtype: pd.DataFrame
+    """
+    frame = as_nav_matrix(nav)
+    values = frame.to_numpy(dtype=float)
+    returns = simple_returns(values)
+    first, last, n_returns = _first_last(values)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        excess = returns - rf / periods
+        volatility = np.nanstd(returns, axis=0, ddof=1)
+        downside = np.sqrt(np.nanmean(np.minimum(excess, 0) ** 2, axis=0))
+        cagr = (last / first) ** (periods / n_returns) - 1
+        max_drawdown = np.nanmin(drawdowns(values), axis=0)
+        summary = {
+            'final_value': last,
+            'total_return': last / first - 1,
+            'cagr': cagr,
+            'annual_volatility': volatility * np.sqrt(periods),
+            'sharpe_ratio': np.nanmean(excess, axis=0) / volatility * np.sqrt(periods),
+            'sortino_ratio': np.nanmean(excess, axis=0) / downside * np.sqrt(periods),
+            'max_drawdown': max_drawdown,
+            'max_drawdown_duration': drawdown_durations(values).max(axis=0),
+            'calmar_ratio': cagr / np.abs(max_drawdown),
+        }
+
+        if benchmark is not None:
+            benchmark = pd.Series(benchmark).reindex(frame.index).to_numpy(dtype=float)
+            active = returns - simple_returns(benchmark[:, None])
+            tracking_error = np.nanstd(active, axis=0, ddof=1) * np.sqrt(periods)
+            summary['tracking_error'] = tracking_error
+            summary['information_ratio'] = np.nanmean(active, axis=0) * periods / tracking_error
+
+    if turnover is not None:
+        years = n_returns / periods
+        summary['annual_turnover'] = np.array([np.nansum(turnover[column]) / year if column in turnover and year > 0 else np.nan
+                                               for column, year in zip(frame.columns, years)])
+
+    # Ratios with a zero denominator (a flat path, no losses) are undefined rather than infinite
+    summary = {name: np.where(np.isfinite(metric), metric, np.nan) for name, metric in summary.items()}
+    return pd.DataFrame(summary, index=frame.columns)
+
+# ----------------------------------------------------------------------------------------------------
+
+# ROLLING METRICS
+def _window_sums(values, window):
+    """Sums of every trailing window from cumulative sums, skipping missing values (and their count)."""
+    valid = ~np.isnan(values)
+    cumulative = np.vstack([np.zeros((1, values.shape[1])), np.cumsum(np.where(valid, values, 0.), axis=0)])
+    counts = np.vstack([np.zeros((1, values.shape[1])), np.cumsum(valid, axis=0)])
+    return cumulative[window:] - cumulative[:-window], counts[window:] - counts[:-window]
+
+
+def rolling_metrics(nav, window=PERIODS_PER_YEAR, benchmark=None, rf=0.0, periods=PERIODS_PER_YEAR):
+    """
+    Trailing-window return, volatility, Sharpe, Sortino and tracking error of every column of a NAV matrix.
+
+    Means and variances of every window come from differences of cumulative sums of the returns and their
+    squares, so the cost is O(TK) whatever the window length.
+
+    :param nav: NAV paths (days x portfolios), see as_nav_matrix.
+    :type nav: pd.DataFrame
+    :param window: Returns per window. Defaults to 252.
+    :type window: int
+    :param benchmark: Benchmark prices or NAV on the same calendar, for the rolling tracking error.
+    :type benchmark: pd.Series
+    :param rf: Annual risk-free rate in decimals.
+    :type rf: float
+    :param periods: Periods per year of the NAV. Defaults to 252.
+    :type periods: int
+    :return: One (days x portfolios) DataFrame per metric: annual_return (mean, annualized), annual_volatility,
+             sharpe_ratio, sortino_ratio and tracking_error (with a benchmark), indexed by the window end.
+    :rtype: dict
+    """
+    frame = as_nav_matrix(nav)
+    returns = simple_returns(frame.to_numpy(dtype=float))
+    if window < 2 or window > len(returns):
+        raise ValueError(f"The window must be between 2 and the {len(returns)} returns of the NAV.")
+    index = frame.index[window:]
+
+    def mean_and_std(values):
+        total, n = _window_sums(values, window)
+        total_squares, _ = _window_sums(values ** 2, window)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = total / n
+            variance = np.maximum(total_squares - total * mean, 0) / (n - 1)
+        return mean, np.sqrt(variance)
+
+    excess = returns - rf / periods
+    mean, std = mean_and_std(returns)
+    excess_mean = mean - rf / periods
+    downside_squares, n = _window_sums(np.minimum(excess, 0) ** 2, window)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        metrics = {
+            'annual_return': mean * periods,
+            'annual_volatility': std * np.sqrt(periods),
+            'sharpe_ratio': excess_mean / std * np.sqrt(periods),
+            'sortino_ratio': excess_mean / np.sqrt(downside_squares / n) * np.sqrt(periods),
+        }
+    if benchmark is not None:
+        benchmark = pd.Series(benchmark).reindex(frame.index).to_numpy(dtype=float)
+        metrics['tracking_error'] = mean_and_std(returns - simple_returns(benchmark[:, None]))[1] * np.sqrt(periods)
+
+    return {name: pd.DataFrame(np.where(np.isfinite(metric), metric, np.nan), index=index, columns=frame.columns)
+            for name, metric in metrics.items()}
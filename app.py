@@ -7,6 +7,8 @@ from streamlit_pages.backtesting import show_backtesting
 
 # Importa correctamente la clase QAA desde tu módulo backtest
 from backtest import QAA  
+from weights_cache import WeightsCache, set_default_weights_cache
+from data_store import FactorStore, PriceStore, set_default_factor_store, set_default_price_store
 
 # Decorador para cachear datos; ensure data is only reloaded when necessary
 @st.cache(allow_output_mutation=True, show_spinner=True)
@@ -15,7 +17,25 @@ def load_data(tickers, start_date, end_date):
     strategy.load_data()  # Asume que esta función es la responsable de cargar los datos
     return strategy
 
+# Un solo caché de pesos óptimos por servidor: cambiar de página o reenviar un formulario reutiliza las soluciones ya calculadas
+@st.cache_resource
+def load_weights_cache():
+    return WeightsCache(root='.qaa_store/weights')
+
+# Factores Fama-French guardados en disco: cada rango de fechas se descarga una sola vez por servidor
+@st.cache_resource
+def load_factor_store():
+    return FactorStore(root='.qaa_store/factors')
+
+# Precios ajustados guardados en disco: solo se descargan los rangos de fechas que faltan
+@st.cache_resource
+def load_price_store():
+    return PriceStore(root='.qaa_store/prices')
+
 def main():
+    set_default_weights_cache(load_weights_cache())
+    set_default_factor_store(load_factor_store())
+    set_default_price_store(load_price_store())
     st.sidebar.title("MENÚ DE NAVEGACIÓN")
     # Lista de opciones en el menú lateral
     choice = st.sidebar.radio(" ", ("Cálculo de estrategias QAA", "Backtesting individual", "Backtesting general"))
@@ -1,162 +1,421 @@
-import yfinance as yf
 import numpy as np
 import pandas as pd
-from scipy.optimize import minimize
 from dateutil.relativedelta import relativedelta
-# pip install optuna
-import optuna
 import warnings
-from matplotlib.lines import Line2D
 import logging
-import matplotlib.pyplot as plt
 from functions import QAA
-
-def dynamic_backtesting(tickers, start_date_data, start_backtesting, end_date, rebalance_frequency_months, rf, optimization_strategy, optimization_model, initial_portfolio_value,
-                         commission=0.0025, lower_bound=0.10, higher_bound=0.99):
-    start_date = pd.to_datetime(start_backtesting)
-    end_date = pd.to_datetime(end_date)
-    initial_portfolio_value = float(initial_portfolio_value)
-    portfolio_value = initial_portfolio_value
-    previous_num_shares = pd.Series(0, index=tickers)
-    results = []
-    
-    # Initial process at start_backtesting
-    current_date = start_date
-    rebalance_end_date = current_date   
-    if rebalance_end_date > end_date:
-        rebalance_end_date = end_date
-    
+from moments import MomentAccumulator
+from instrumentation import RunStats, collect_stats, phase
+from data_store import align_factors
+from analytics import holdings_turnover
+
+def load_backtest_panel(tickers, start_date_data, end_date, rf=None, price_store=None, factor_store=None, factor_datasets=('3-factor',)):
+    """
+    Loads the price, benchmark and Fama-French panels once for a whole backtest.
+
+    The factors are aligned with the price calendar here, so every window finds its factor rows with a slice
+    instead of a date lookup (see data_store.factor_join_index).
+
+    Parameters:
+    - tickers (list): List of asset tickers.
+    - start_date_data (str): First date of the historical data.
+    - end_date (str): Last date of the backtest (exclusive, like yfinance).
+    - rf (float, optional): Risk-free rate.
+    - price_store (PriceStore, optional): Local price store used instead of downloading the full history; None uses the process default. Defaults to None.
+    - factor_store (FactorStore, optional): Local Fama-French store; None uses the process default. Defaults to None.
+    - factor_datasets (tuple, optional): Factor datasets to load, see QAA. Defaults to ('3-factor',).
+
+    Returns:
+    - tuple: (data, benchmark_data, ff_data) covering the full backtest.
+    """
+    with phase('load_panel'):
+        panel = QAA(tickers=tickers, start_date=start_date_data, end_date=end_date, rf=rf, price_store=price_store,
+                    factor_store=factor_store, factor_datasets=factor_datasets)
+        return panel.data, panel.benchmark_data, align_factors(panel.ff_data, panel.data.index)
+
+def window_strategy(data, benchmark_data, ff_data, window_end, tickers, start_date_data, rf, optimization_strategy, optimization_model,
+                    lower_bound=0.10, higher_bound=0.99, returns=None, benchmark_returns=None, moments=None, covariance_estimator='Sample',
+                    initial_weights=None, weights_cache=None):
+    """
+    Builds a QAA over the rows of the preloaded panel strictly before window_end, without copying or downloading.
+
+    Parameters:
+    - data (pd.DataFrame): Preloaded asset prices for the full backtest.
+    - benchmark_data (pd.Series): Preloaded benchmark prices for the full backtest.
+    - ff_data (pd.DataFrame): Preloaded Fama-French factors for the full backtest.
+    - window_end (pd.Timestamp): End of the expanding window (exclusive).
+    - returns (pd.DataFrame, optional): Daily returns of the window, used instead of recalculating them from the prices.
+    - benchmark_returns (pd.Series, optional): Daily benchmark returns of the window, used together with returns.
+    - moments (dict, optional): Moments of the window, e.g. from a MomentAccumulator, seeded into the strategy.
+    - covariance_estimator (str, optional): Covariance estimator of the strategy. Defaults to 'Sample'.
+    - initial_weights (np.ndarray, optional): Warm-start weights, usually the optimum of the previous rebalance.
+    - weights_cache (WeightsCache, optional): Cache of optimal weights of the strategy; None uses the process default and False disables it.
+
+    Returns:
+    - QAA: Strategy with the selected optimization strategy and model set.
+    """
+    end_row = data.index.searchsorted(window_end, side='left')
     strategy = QAA(
         tickers=tickers,
-        start_date=start_date_data,  # Historical data from start_date
-        end_date=rebalance_end_date.strftime('%Y-%m-%d'),
+        start_date=start_date_data,
+        end_date=window_end.strftime('%Y-%m-%d'),
         rf=rf,
-        lower_bound= lower_bound,
-        higher_bound=higher_bound
+        lower_bound=lower_bound,
+        higher_bound=higher_bound,
+        data=data.iloc[:end_row],
+        benchmark_data=benchmark_data.iloc[:end_row] if benchmark_data is not None else None,
+        # The factors are sliced like the prices, so the mean RF of the window does not read future dates
+        ff_data=ff_data.loc[ff_data.index < window_end] if ff_data is not None else None,
+        covariance_estimator=covariance_estimator,
+        initial_weights=initial_weights,
+        weights_cache=weights_cache
     )
+    if returns is not None:
+        strategy.returns = returns
+        if benchmark_returns is not None:
+            strategy.benchmark_returns = benchmark_returns.dropna()
+    if moments is not None:
+        strategy.seed_moments(moments)
     strategy.set_optimization_strategy(optimization_strategy)
     strategy.set_optimization_model(optimization_model)
-    strategy.load_data()
-    strategy.optimize()
-    
-    optimal_weights = strategy.optimal_weights
-    
-    investment_value_per_ticker = portfolio_value * optimal_weights
-    # Calculate new price adjusted by the commission
-    current_prices = strategy.data.iloc[-1]
-    adjusted_prices = current_prices * (1 + commission)
-
-    # Calculate number of shares based on the adjusted price
-    num_shares = (investment_value_per_ticker / adjusted_prices).apply(np.floor)
-    invested_value = num_shares * current_prices  # We use the original price to calculate the actual invested value
-    remaining_cash = portfolio_value - invested_value.sum()
-
-    
-    previous_num_shares = num_shares.copy()
-    portfolio_value = invested_value.sum() + remaining_cash
-    
-    result_row = {
-        'data_origin_date': start_date_data,
-        'end_date': rebalance_end_date.strftime('%Y-%m-%d'),
-        **{f'weight_{ticker}': optimal_weights[i] for i, ticker in enumerate(tickers)},
-        **{f'shares_{ticker}': num_shares[ticker] for ticker in tickers},
-        **{f'value_{ticker}': invested_value[ticker] for ticker in tickers},
-        'remaining_cash': remaining_cash,
-        'total_portfolio_value': portfolio_value
-    }
-    
-    results.append(result_row)
-    
-    current_date = rebalance_end_date
-    while current_date <= end_date:
-        rebalance_end_date = current_date + relativedelta(months=rebalance_frequency_months)
-        if rebalance_end_date > end_date:
-            rebalance_end_date = end_date
-        
-        strategy = QAA(
-            tickers=tickers, 
-            start_date=start_date_data, 
-            end_date=rebalance_end_date.strftime('%Y-%m-%d'), 
-            rf=rf,
-            lower_bound= lower_bound,
-            higher_bound=higher_bound
-        )
-        strategy.set_optimization_strategy(optimization_strategy)
-        strategy.set_optimization_model(optimization_model)
-        strategy.load_data()
-        strategy.optimize()
-        
-        current_prices = strategy.data.iloc[-1]
-        optimal_weights = strategy.optimal_weights
-        
-        if not previous_num_shares.equals(pd.Series(0, index=tickers)):
-            portfolio_value = (previous_num_shares * current_prices).sum()
-
-        investment_value_per_ticker = portfolio_value * optimal_weights
-    
-        # Adjust prices for commission
-        adjusted_prices = current_prices * (1 + commission)
-        num_shares = (investment_value_per_ticker / adjusted_prices).apply(np.floor)
-        invested_value = num_shares * current_prices
-        remaining_cash = portfolio_value - invested_value.sum()
-        
-        diff_shares = num_shares - previous_num_shares
-        
-        previous_num_shares = num_shares.copy()
-        portfolio_value = invested_value.sum() + remaining_cash
-
-        result_row = {
-            'data_origin_date': start_date_data,
-            'end_date': rebalance_end_date.strftime('%Y-%m-%d'),
-            **{f'weight_{ticker}': optimal_weights[i] for i, ticker in enumerate(tickers)},
-            **{f'shares_{ticker}': num_shares[ticker] for ticker in tickers},
-            **{f'diff_{ticker}': diff_shares[ticker] for ticker in tickers},
-            **{f'value_{ticker}': invested_value[ticker] for ticker in tickers},
-            'remaining_cash': remaining_cash,
-            'total_portfolio_value': portfolio_value
-        }
-        
-        results.append(result_row)
-        current_date = rebalance_end_date
-        if rebalance_end_date == end_date:
-            break
-    results = pd.DataFrame(results)
-
-    # Daily Data Preparation
+    return strategy
+
+def solver_iterations(strategy):
+    """
+    Iteration and objective-evaluation counts of the last solve of a strategy.
+
+    Parameters:
+    - strategy (QAA): Strategy after optimize().
+
+    Returns:
+    - dict: 'iterations' and 'evaluations' (None when the model does not report them, e.g. HRP).
+    """
+    result = strategy.optimization_result
+    if result is None:
+        return {'iterations': None, 'evaluations': None}
+    # COBYLA reports no iteration count; each of its iterations is one objective evaluation
+    return {'iterations': result.get('nit', result.get('nfev')), 'evaluations': result.get('nfev')}
+
+def rebalance_schedule(start_backtesting, end_date, rebalance_frequency_months):
+    """
+    Rebalance dates of a backtest: start_backtesting, then every rebalance_frequency_months, ending exactly at end_date.
+
+    Parameters:
+    - start_backtesting (str): First rebalance date.
+    - end_date (str): Last date of the backtest.
+    - rebalance_frequency_months (int): Months between rebalances.
+
+    Returns:
+    - list: Rebalance dates as timestamps.
+    """
+    start_date, end_date = pd.to_datetime(start_backtesting), pd.to_datetime(end_date)
+    schedule = [min(start_date, end_date)]
+    while schedule[-1] < end_date:
+        schedule.append(min(schedule[-1] + relativedelta(months=rebalance_frequency_months), end_date))
+    if start_date >= end_date:
+        # The original loop always solved one more window after the first one
+        schedule.append(end_date)
+    return schedule
+
+def rebalance_solver(data, benchmark_data, ff_data, tickers, start_date_data, rf, optimization_strategy, optimization_model,
+                     lower_bound=0.10, higher_bound=0.99, moment_window='expanding', moment_window_length=None, moment_halflife=None,
+                     covariance_estimator='Sample', warm_start=True, compare_cold_start=False):
+    """
+    Builds the function that solves the strategy at each rebalance of a walk-forward simulation over one preloaded panel.
+
+    The returned function must be called with non-decreasing window ends: it feeds the incremental moments with the new
+    rows only and warm-starts every solve from the previous optimum.
+
+    Parameters:
+    - Same as run_backtest.
+
+    Returns:
+    - function: window_end -> (optimal weights as np.ndarray, solver statistics dict).
+    """
+    # Moments are updated with the rows added since the previous rebalance instead of recalculated over the whole window
+    returns = data.pct_change().dropna()
+    benchmark_returns = benchmark_data.pct_change().reindex(returns.index) if benchmark_data is not None else None
+    accumulator = MomentAccumulator(moment_window, length=moment_window_length, halflife=moment_halflife)
+
+    # Adjacent windows overlap almost entirely, so each solve starts from the previous rebalance's optimum
+    warm_weights = None
+    # Cached solutions report no iterations, so the warm/cold comparison always solves
+    weights_cache = False if compare_cold_start else None
+
+    def rebalance_strategy(window_end):
+        nonlocal warm_weights
+        with phase('moment_updates'):
+            window_rows = accumulator.advance(returns, benchmark_returns, window_end)
+            moments = accumulator.moments()
+
+        def solve(initial_weights):
+            strategy = window_strategy(data, benchmark_data, ff_data, window_end, tickers, start_date_data, rf,
+                                       optimization_strategy, optimization_model, lower_bound, higher_bound,
+                                       returns=returns.iloc[window_rows],
+                                       benchmark_returns=benchmark_returns.iloc[window_rows] if benchmark_returns is not None else None,
+                                       moments=moments, covariance_estimator=covariance_estimator,
+                                       initial_weights=initial_weights, weights_cache=weights_cache)
+            strategy.optimize()
+            return strategy
+
+        with phase('rebalance_solve'):
+            strategy = solve(warm_weights)
+        if strategy.optimal_weights is None:
+            raise ValueError(f"The {optimization_model} optimization of {optimization_strategy} did not converge for the window ending {window_end:%Y-%m-%d}.")
+        solver_stats = solver_iterations(strategy)
+        if compare_cold_start:
+            # Solve the same window again from equal weights to report the iterations the warm start saved
+            cold_iterations = solver_iterations(solve(None) if warm_weights is not None else strategy)['iterations']
+            solver_stats['cold_iterations'] = cold_iterations
+            solver_stats['iterations_saved'] = (cold_iterations - solver_stats['iterations']
+                                                if cold_iterations is not None and solver_stats['iterations'] is not None else None)
+        if warm_start:
+            warm_weights = np.asarray(strategy.optimal_weights, dtype=float)
+        return np.asarray(strategy.optimal_weights, dtype=float), solver_stats
+
+    return rebalance_strategy
+
+def value_holdings(data, change_dates, shares, cash, until):
+    """
+    Values a sequence of holdings on every trading day of the panel, one matrix-vector product per holding period.
+
+    Parameters:
+    - data (pd.DataFrame): Price panel (days x N).
+    - change_dates (pd.DatetimeIndex): Sorted dates from which each row of shares and cash is held.
+    - shares (np.ndarray): Shares held from each change date (changes x N).
+    - cash (np.ndarray): Cash held from each change date (changes).
+    - until (pd.Timestamp): End of the valuation (exclusive).
+
+    Returns:
+    - tuple: (dates, holding_period, nav): the trading days from the first change date, the row of shares held on each
+      of them and the daily portfolio value.
+    """
+    with phase('valuation'):
+        return _value_holdings(data.to_numpy(dtype=float), data.index, change_dates, shares, cash, until)
+
+def _value_holdings(prices, index, change_dates, shares, cash, until):
+    day_rows = np.arange(index.searchsorted(change_dates.min(), side='left'), index.searchsorted(until, side='left'))
+    dates = index[day_rows]
+    holding_period = change_dates.searchsorted(dates, side='right') - 1
+    nav = np.empty(len(dates))
+    boundaries = np.flatnonzero(np.diff(holding_period)) + 1
+    period_starts = np.concatenate([[0], boundaries]) if len(dates) else []
+    for start, stop in zip(period_starts, np.concatenate([boundaries, [len(dates)]])):
+        k = holding_period[start]
+        nav[start:stop] = prices[day_rows[start:stop]] @ shares[k] + cash[k]
+    return dates, holding_period, nav
+
+def run_backtest(tickers, start_date_data, start_backtesting, end_date, rebalance_frequency_months, rf, optimization_strategy, optimization_model, initial_portfolio_value,
+                 commission=0.0025, lower_bound=0.10, higher_bound=0.99, price_store=None, data=None, benchmark_data=None, ff_data=None,
+                 moment_window='expanding', moment_window_length=None, moment_halflife=None, covariance_estimator='Sample',
+                 warm_start=True, compare_cold_start=False, rebalance_strategy=None, instrument=False):
+    """
+    Columnar backtest core: solves every rebalance and values the portfolio on every trading day with array operations.
+
+    Holdings are kept as a (rebalances x N) array and prices as the (days x N) panel. The holding period of each trading
+    day is found with one searchsorted, and the daily NAV is one matrix-vector product per holding period.
+
+    Parameters:
+    - tickers (list): List of asset tickers.
+    - start_date_data (str): First date of the historical data.
+    - start_backtesting (str): First rebalance date.
+    - end_date (str): Last date of the backtest.
+    - rebalance_frequency_months (int): Months between rebalances.
+    - rf (float): Risk-free rate.
+    - optimization_strategy (str): QAA strategy solved at every rebalance.
+    - optimization_model (str): QAA model used to solve it.
+    - initial_portfolio_value (float): Cash invested at the first rebalance.
+    - commission (float, optional): Proportional commission added to the purchase price. Defaults to 0.0025.
+    - lower_bound / higher_bound (float, optional): Bounds for the weights. Default to 0.10 and 0.99.
+    - price_store, data, benchmark_data, ff_data (optional): Price store or preloaded panel, see load_backtest_panel.
+    - moment_window, moment_window_length, moment_halflife (optional): Window of the MomentAccumulator. Defaults to expanding.
+    - covariance_estimator (str, optional): Covariance estimator of every solve. Defaults to 'Sample'.
+    - warm_start (bool, optional): Starts each solve from the previous optimum. Defaults to True.
+    - compare_cold_start (bool, optional): Also solves each window from equal weights to report the iterations saved. Defaults to False.
+    - rebalance_strategy (function, optional): Precomputed solver, window_end -> (weights, solver statistics), e.g. shared by
+      the points of a sweep. Defaults to a rebalance_solver over the panel.
+    - instrument (bool, optional): Collects per-phase timings and solver counters in a RunStats under the 'stats' key. Defaults to False.
+
+    Returns:
+    - dict: tickers, rebalance_dates, weights, shares, prices and value (rebalances x N), cash and total_value (rebalances),
+      solver_stats (list of dicts), dates and nav (trading days between the first and the last rebalance), and stats
+      (RunStats, or None when not instrumented).
+    """
+    if instrument:
+        with collect_stats(RunStats()) as stats:
+            backtest = run_backtest(tickers, start_date_data, start_backtesting, end_date, rebalance_frequency_months, rf, optimization_strategy,
+                                    optimization_model, initial_portfolio_value, commission, lower_bound, higher_bound, price_store, data,
+                                    benchmark_data, ff_data, moment_window, moment_window_length, moment_halflife, covariance_estimator,
+                                    warm_start, compare_cold_start, rebalance_strategy)
+        backtest['stats'] = stats
+        return backtest
 
-    # Prepare the dataframe with dynamic column names for each ticker
-    df_columns = ['end_date'] + [f'shares_{ticker}' for ticker in tickers] + ['remaining_cash']
-    df = results[df_columns].copy()
-    df['end_date'] = pd.to_datetime(df['end_date'])
-    df.set_index('end_date', inplace=True)
+    initial_portfolio_value = float(initial_portfolio_value)
 
-    # Generate a date range for the daily data
-    start_date = df.index.min()
-    end_date = df.index.max()
-    date_range = pd.date_range(start=start_date, end=end_date, freq='D')
+    # Load prices and factors once; every rebalance works on an expanding slice of the same panel
+    if data is None:
+        data, benchmark_data, ff_data = load_backtest_panel(tickers, start_date_data, pd.to_datetime(end_date).strftime('%Y-%m-%d'), rf, price_store)
 
-    # Create a new dataframe with a record for each day, forward-filling the rebalancing information
-    daily_data = pd.DataFrame(index=date_range)
-    daily_data = daily_data.join(df, how='left').ffill().reset_index().rename(columns={'index': 'end_date'})
+    if rebalance_strategy is None:
+        rebalance_strategy = rebalance_solver(data, benchmark_data, ff_data, tickers, start_date_data, rf, optimization_strategy, optimization_model,
+                                              lower_bound, higher_bound, moment_window, moment_window_length, moment_halflife,
+                                              covariance_estimator, warm_start, compare_cold_start)
 
-    # Fetch historical stock data using yfinance for the entire range of daily_data
-    stock_data = yf.download(tickers, start=daily_data['end_date'].min(), end=daily_data['end_date'].max())
-    prices = stock_data['Adj Close']
+    rebalance_dates = pd.DatetimeIndex(rebalance_schedule(start_backtesting, end_date, rebalance_frequency_months))
+    # The optimal weights follow the column order of the panel, which may differ from the order of tickers
+    assets = list(data.columns)
+    prices = data.to_numpy(dtype=float)
 
-    # Update the index of daily_data to match the dates from the stock data
-    daily_data.set_index('end_date', inplace=True)
-    daily_data = daily_data.reindex(prices.index).ffill()
+    # Prices of each rebalance: the last row strictly before its date
+    price_rows = data.index.searchsorted(rebalance_dates, side='left') - 1
+    rebalance_prices = prices[price_rows]
 
-    # Calculate the daily portfolio value
-    portfolio_value = daily_data['remaining_cash']
-    for ticker in tickers:
-        portfolio_value += daily_data[f'shares_{ticker}'] * prices[ticker]
+    n_rebalances, n_assets = len(rebalance_dates), len(assets)
+    weights = np.empty((n_rebalances, n_assets))
+    shares = np.empty((n_rebalances, n_assets))
+    cash = np.empty(n_rebalances)
+    solver_stats = []
+
+    portfolio_value = initial_portfolio_value
+    for k in range(n_rebalances):
+        weights[k], stats = rebalance_strategy(rebalance_dates[k])
+        solver_stats.append(stats)
+        if k > 0:
+            # The portfolio is marked to market with the shares held; as before, the uninvested cash is not carried over
+            portfolio_value = shares[k - 1].dot(rebalance_prices[k])
+
+        # Shares are bought at the price adjusted by the commission and valued at the market price
+        shares[k] = np.floor(portfolio_value * weights[k] / (rebalance_prices[k] * (1 + commission)))
+        cash[k] = portfolio_value - shares[k].dot(rebalance_prices[k])
+
+    value = shares * rebalance_prices
+    total_value = value.sum(axis=1) + cash
+
+    dates, holding_period, nav = value_holdings(data, rebalance_dates, shares, cash, until=rebalance_dates.max())
+
+    return {
+        'tickers': assets,
+        'start_date_data': start_date_data,
+        'rebalance_dates': rebalance_dates,
+        'weights': weights,
+        'shares': shares,
+        'prices': rebalance_prices,
+        'value': value,
+        'cash': cash,
+        'total_value': total_value,
+        'solver_stats': solver_stats,
+        'dates': dates,
+        'holding_period': holding_period,
+        'nav': nav,
+        'stats': None,
+    }
+
+def backtest_ledger(backtest):
+    """
+    Tidy (long-format) transaction ledger of a backtest: one row per rebalance and ticker.
+
+    Parameters:
+    - backtest (dict): Output of run_backtest.
+
+    Returns:
+    - pd.DataFrame: end_date, ticker, weight, shares, diff_shares, price and value.
+    """
+    tickers, dates = backtest['tickers'], backtest['rebalance_dates']
+    n_rebalances, n_assets = backtest['shares'].shape
+    diff_shares = np.diff(backtest['shares'], axis=0, prepend=np.nan)
+    return pd.DataFrame({
+        'end_date': np.repeat(dates, n_assets),
+        'ticker': np.tile(tickers, n_rebalances),
+        'weight': backtest['weights'].ravel(),
+        'shares': backtest['shares'].ravel(),
+        'diff_shares': diff_shares.ravel(),
+        'price': backtest['prices'].ravel(),
+        'value': backtest['value'].ravel(),
+    })
+
+def backtest_nav(backtest):
+    """
+    Tidy daily valuation of a backtest.
+
+    Parameters:
+    - backtest (dict): Output of run_backtest.
+
+    Returns:
+    - pd.DataFrame: date, rebalance_date (of the holdings in force), cash and portfolio_value.
+    """
+    holding_period = backtest['holding_period']
+    return pd.DataFrame({
+        'date': backtest['dates'],
+        'rebalance_date': backtest['rebalance_dates'][holding_period],
+        'cash': backtest['cash'][holding_period],
+        'portfolio_value': backtest['nav'],
+    })
+
+def backtest_results(backtest):
+    """
+    Wide results table of a backtest, one row per rebalance, as shown in the Streamlit pages.
+
+    Parameters:
+    - backtest (dict): Output of run_backtest.
+
+    Returns:
+    - pd.DataFrame: data_origin_date, end_date, weight_/shares_/value_ per ticker, remaining_cash, total_portfolio_value,
+      the solver statistics and diff_ per ticker (empty on the first rebalance).
+    """
+    tickers = backtest['tickers']
+    n_rebalances = len(backtest['rebalance_dates'])
+    columns = {
+        'data_origin_date': [backtest['start_date_data']] * n_rebalances,
+        'end_date': backtest['rebalance_dates'].strftime('%Y-%m-%d'),
+    }
+    blocks = [pd.DataFrame(columns),
+              pd.DataFrame(backtest['weights'], columns=[f'weight_{ticker}' for ticker in tickers]),
+              pd.DataFrame(backtest['shares'], columns=[f'shares_{ticker}' for ticker in tickers]),
+              pd.DataFrame(backtest['value'], columns=[f'value_{ticker}' for ticker in tickers]),
+              pd.DataFrame({'remaining_cash': backtest['cash'], 'total_portfolio_value': backtest['total_value']}),
+              pd.DataFrame(backtest['solver_stats']),
+              pd.DataFrame(np.diff(backtest['shares'], axis=0, prepend=np.nan), columns=[f'diff_{ticker}' for ticker in tickers])]
+    return pd.concat(blocks, axis=1)
+
+def dynamic_backtesting(tickers, start_date_data, start_backtesting, end_date, rebalance_frequency_months, rf, optimization_strategy, optimization_model, initial_portfolio_value,
+                         commission=0.0025, lower_bound=0.10, higher_bound=0.99, price_store=None, data=None, benchmark_data=None, ff_data=None,
+                         moment_window='expanding', moment_window_length=None, moment_halflife=None, covariance_estimator='Sample',
+                         warm_start=True, compare_cold_start=False, instrument=False):
+    """
+    Walk-forward backtest rebalanced every rebalance_frequency_months, on top of the columnar core in run_backtest.
+
+    Parameters:
+    - Same as run_backtest.
+
+    Returns:
+    - tuple: (results, daily_data, portfolio_value): the wide results per rebalance, the shares and cash held on every
+      trading day, and the daily portfolio value. Use backtest_ledger and backtest_nav on run_backtest for tidy frames.
+      The one-way turnover of every rebalance is kept in results.attrs['turnover'] (see analytics.performance_summary)
+      and, with instrument=True, the RunStats of the run in results.attrs['stats'].
+    """
+    backtest = run_backtest(tickers, start_date_data, start_backtesting, end_date, rebalance_frequency_months, rf, optimization_strategy, optimization_model,
+                            initial_portfolio_value, commission, lower_bound, higher_bound, price_store, data, benchmark_data, ff_data,
+                            moment_window, moment_window_length, moment_halflife, covariance_estimator, warm_start, compare_cold_start,
+                            instrument=instrument)
+    results = backtest_results(backtest)
+    results.attrs['turnover'] = holdings_turnover(backtest['shares'], backtest['prices'], backtest['total_value'])
+    if instrument:
+        results.attrs['stats'] = backtest['stats']
+
+    holding_period = backtest['holding_period']
+    daily_data = pd.DataFrame(backtest['shares'][holding_period], index=backtest['dates'], columns=[f'shares_{ticker}' for ticker in backtest['tickers']])
+    daily_data['remaining_cash'] = backtest['cash'][holding_period]
+    portfolio_value = pd.Series(backtest['nav'], index=backtest['dates'], name='portfolio_value')
 
     return results, daily_data, portfolio_value
 
 #-------------------------
 
 def plot_portfolio_value(resultados_backtesting, tickers):
+    import yfinance as yf
+    import matplotlib.pyplot as plt
+    from matplotlib.lines import Line2D
+
     # Prepare the dataframe with dynamic column names for each ticker
     df_columns = ['end_date'] + [f'shares_{ticker}' for ticker in tickers] + ['remaining_cash']
     df = resultados_backtesting[df_columns].copy()
@@ -206,171 +465,157 @@ def plot_portfolio_value(resultados_backtesting, tickers):
 
 # ---------
 
-def dynamic_backtesting_x2(tickers, start_date_data, start_backtesting, end_date, rf, optimization_strategy, data, benchmark_data, rebalance_frequency_months=6, input_cash_frequency_months=12, input_cash_amount=0, withdraw_frequency_months=12, withdraw_amount=0, optimization_model='SLSQP', initial_portfolio_value=1_000_000, commission=0.0025):
+def event_schedule(start_backtesting, end_date, frequency_months):
+    """
+    Dates every frequency_months after start_backtesting and strictly before end_date.
+
+    Parameters:
+    - start_backtesting (str): Start of the simulation.
+    - end_date (str): End of the simulation.
+    - frequency_months (int): Months between events; 0 or None disables the event.
+
+    Returns:
+    - list: Event dates as timestamps.
+    """
+    if not frequency_months:
+        return []
+    start_date, end_date = pd.to_datetime(start_backtesting), pd.to_datetime(end_date)
+    schedule, step = [], 1
+    while start_date + relativedelta(months=step * frequency_months) < end_date:
+        schedule.append(start_date + relativedelta(months=step * frequency_months))
+        step += 1
+    return schedule
+
+def dynamic_backtesting_x2(tickers, start_date_data, start_backtesting, end_date, rf, optimization_strategy, data, benchmark_data, rebalance_frequency_months=6, input_cash_frequency_months=12, input_cash_amount=0, withdraw_frequency_months=12, withdraw_amount=0, optimization_model='SLSQP', initial_portfolio_value=1_000_000, commission=0.0025, ff_data=None, price_store=None,
+                           lower_bound=0.10, higher_bound=0.99, covariance_estimator='Sample', warm_start=True):
+    """
+    Event-driven backtest with periodic rebalances, cash injections and withdrawals over one preloaded price panel.
+
+    Every event goes into a queue sorted by date (injections and withdrawals before a rebalance on the same date) and is
+    executed at the last close before its date. Cash is carried between events, injections are invested pro rata to the
+    current holdings, and withdrawals sell the same fraction of every position. The holdings in force are then valued
+    on every trading day with one matrix-vector product per holding period, so the simulation is O(days).
+
+    Parameters:
+    - tickers (list): List of asset tickers.
+    - start_date_data (str): First date of the historical data.
+    - start_backtesting (str): Date of the initial investment.
+    - end_date (str): End of the simulation (exclusive).
+    - rf (float): Risk-free rate.
+    - optimization_strategy (str): QAA strategy solved at every rebalance.
+    - data, benchmark_data (optional): Preloaded price panel; loaded once with load_backtest_panel when None.
+    - rebalance_frequency_months (int, optional): Months between rebalances. Defaults to 6.
+    - input_cash_frequency_months, input_cash_amount (optional): Schedule and amount of the cash injections. Defaults to none.
+    - withdraw_frequency_months, withdraw_amount (optional): Schedule and amount of the withdrawals. Defaults to none.
+    - optimization_model (str, optional): QAA model. Defaults to 'SLSQP'.
+    - initial_portfolio_value (float, optional): Cash invested at start_backtesting. Defaults to 1,000,000.
+    - commission (float, optional): Proportional commission added to the purchase price. Defaults to 0.0025.
+    - ff_data, price_store (optional): Fama-French factors and local price store used when loading the panel.
+    - lower_bound / higher_bound (float, optional): Bounds for the weights. Default to 0.10 and 0.99.
+    - covariance_estimator (str, optional): Covariance estimator of every solve. Defaults to 'Sample'.
+    - warm_start (bool, optional): Starts each solve from the previous optimum. Defaults to True.
+
+    Returns:
+    - tuple: (results, daily_data, portfolio_value): one row per event with its action, the shares and cash held on every
+      trading day, and the daily portfolio value.
+    """
     start_date = pd.to_datetime(start_backtesting)
     end_date = pd.to_datetime(end_date)
-    portfolio_value = initial_portfolio_value
-    previous_num_shares = pd.Series(0, index=tickers)
-    results = []
-
-    # Initial process at start_backtesting
-    current_date = start_date
-
-    # --- Function to calculate new shares and update portfolio ---
-    def calculate_new_shares(current_prices, target_value_per_ticker):
-        adjusted_prices = current_prices * (1 + commission)
-        num_shares = (target_value_per_ticker / adjusted_prices).apply(np.floor)
-        invested_value = num_shares * current_prices
-        remaining_cash = portfolio_value - invested_value.sum()
-        return num_shares, remaining_cash
-
-    # --- Function to execute rebalancing ---
-    def execute_rebalance():
-        nonlocal portfolio_value, previous_num_shares
-        strategy = QAA(tickers=tickers, start_date=start_date_data, end_date=current_date.strftime('%Y-%m-%d'), rf=rf)
-        strategy.set_optimization_strategy(optimization_strategy)
-        strategy.set_optimization_model(optimization_model)
-        strategy.load_data()
-        strategy.optimize()
-        optimal_weights = strategy.optimal_weights
-        current_prices = strategy.data.iloc[-1]  
-
-        # Use current portfolio value to calculate investment per ticker
-        if not previous_num_shares.equals(pd.Series(0, index=tickers)):
-            portfolio_value = (previous_num_shares * current_prices).sum()  
-        investment_value_per_ticker = portfolio_value * optimal_weights
-
-        num_shares, remaining_cash = calculate_new_shares(current_prices, investment_value_per_ticker)
-
-        diff_shares = num_shares - previous_num_shares
-        previous_num_shares = num_shares.copy()
-        portfolio_value = (num_shares * current_prices).sum() + remaining_cash 
-        return optimal_weights, num_shares, diff_shares, remaining_cash    
-
-    # --- Initial Rebalance (Start) ---
-    strategy = QAA(tickers=tickers, start_date=start_date_data, end_date=current_date.strftime('%Y-%m-%d'), rf=rf)
-    optimal_weights, num_shares, diff_shares, remaining_cash = execute_rebalance()
-    action = 'Start'
-    current_prices = strategy.load_data()[0].iloc[-1]  # Get current_prices here
-
-    result_row = {
-        'data_origin_date': start_date_data,
-        'end_date': current_date.strftime('%Y-%m-%d'),
-        'action': action,
-        **{f'weight_{ticker}': optimal_weights[i] for i, ticker in enumerate(tickers)},
-        **{f'shares_{ticker}': num_shares[ticker] for ticker in tickers},
-        **{f'diff_{ticker}': diff_shares[ticker] for ticker in tickers},
-        **{f'value_{ticker}': (num_shares * current_prices)[ticker] for ticker in tickers},  
-        'remaining_cash': remaining_cash,
-        'total_portfolio_value': portfolio_value
-    }
-    results.append(result_row)
-
-
-    # --- Main Loop (Monthly Iteration) ---
-    while current_date <= end_date:
-        current_date += relativedelta(months=1)  # Move to the next month
-
-        # Rebalancing
-        if current_date.month % rebalance_frequency_months == 0:
-            optimal_weights, num_shares, diff_shares, remaining_cash = execute_rebalance()
-            action = 'Rebalance' 
-        else:
-            optimal_weights = None
-            num_shares = previous_num_shares
-            diff_shares = pd.Series(0, index=tickers)
-            remaining_cash = None 
-            action = None 
-
-        # Capital Injection
-        if current_date.month % input_cash_frequency_months == 0:
-            portfolio_value += input_cash_amount
-            current_prices = QAA(tickers=tickers, start_date=start_date_data, end_date=current_date.strftime('%Y-%m-%d'), rf=rf).load_data()[0].iloc[-1]
-            investment_value_per_ticker = portfolio_value * previous_num_shares / previous_num_shares.sum()  
-            num_shares, remaining_cash = calculate_new_shares(current_prices, investment_value_per_ticker)
-            diff_shares = num_shares - previous_num_shares
-            previous_num_shares = num_shares.copy()
-            action = 'Input'
-
-        # Capital Withdrawal (Assuming selling shares proportionally)
-        if current_date.month % withdraw_frequency_months == 0 and portfolio_value >= withdraw_amount:
-            withdraw_proportion = withdraw_amount / portfolio_value
-            current_prices = QAA(tickers=tickers, start_date=start_date_data, end_date=current_date.strftime('%Y-%m-%d'), rf=rf).load_data()[0].iloc[-1]
-            shares_to_sell = (previous_num_shares * withdraw_proportion).apply(np.floor)
-            portfolio_value -= (shares_to_sell * current_prices).sum()
-            num_shares = previous_num_shares - shares_to_sell
-            diff_shares = num_shares - previous_num_shares 
-            previous_num_shares = num_shares.copy()
-            remaining_cash = 0  
-            action = 'Withdraw'
-
-        # End-of-Month Weight Calculation (Assuming based on current portfolio value)
-        current_prices = QAA(tickers=tickers, start_date=start_date_data, end_date=current_date.strftime('%Y-%m-%d'), rf=rf).load_data()[0].iloc[-1]
-        current_value_per_ticker = num_shares * current_prices
-        if current_value_per_ticker.sum() > 0:
-            end_of_month_weights = current_value_per_ticker / current_value_per_ticker.sum()
-        else:
-            end_of_month_weights = pd.Series(0, index=tickers)
-
-        if action is not None: 
-            result_row = {
-                'data_origin_date': start_date_data,
-                'end_date': current_date.strftime('%Y-%m-%d'),
-                'action': action, 
-                **{f'weight_{ticker}': optimal_weights[i] if optimal_weights is not None else None for i, ticker in enumerate(tickers)},
-                **{f'shares_{ticker}': num_shares[ticker] for ticker in tickers},
-                **{f'diff_{ticker}': diff_shares[ticker] for ticker in tickers},
-                **{f'value_{ticker}': current_value_per_ticker[ticker] for ticker in tickers},
-                **{f'eom_weight_{ticker}': end_of_month_weights[i] for i, ticker in enumerate(tickers)},
-                'remaining_cash': remaining_cash,
-                'total_portfolio_value': portfolio_value
-            }
-            results.append(result_row)
-
-    results = pd.DataFrame(results)
-
-    # Daily Data Preparation
-
-    # Prepare the dataframe with dynamic column names for each ticker
-    df_columns = ['end_date'] + [f'shares_{ticker}' for ticker in tickers] + ['remaining_cash']
-    df = results[df_columns].copy()
-    df['end_date'] = pd.to_datetime(df['end_date'])
-    df.set_index('end_date', inplace=True)
-
-    # Generate a date range for the daily data
-    start_date = df.index.min()
-    end_date = df.index.max()
-    date_range = pd.date_range(start=start_date, end=end_date, freq='D')
 
-    # Create a new dataframe with a record for each day, forward-filling the rebalancing information
-    daily_data = pd.DataFrame(index=date_range)
-    daily_data = daily_data.join(df, how='left').ffill().reset_index().rename(columns={'index': 'end_date'})
-
-    # Fetch historical stock data using yfinance for the entire range of daily_data
-    stock_data = yf.download(tickers, start=daily_data['end_date'].min(), end=daily_data['end_date'].max())
-    prices = stock_data['Adj Close']
-
-    # Update the index of daily_data to match the dates from the stock data
-    daily_data.set_index('end_date', inplace=True)
-    daily_data = daily_data.reindex(prices.index).ffill()
-
-    # Calculate the daily portfolio value
-    portfolio_value = daily_data['remaining_cash']
-    for ticker in tickers:
-        portfolio_value += daily_data[f'shares_{ticker}'] * prices[ticker]
+    # Load prices and factors once for the whole simulation
+    if data is None:
+        data, benchmark_data, ff_data = load_backtest_panel(tickers, start_date_data, end_date.strftime('%Y-%m-%d'), rf, price_store)
+    rebalance_strategy = rebalance_solver(data, benchmark_data, ff_data, tickers, start_date_data, rf, optimization_strategy, optimization_model,
+                                          lower_bound, higher_bound, covariance_estimator=covariance_estimator, warm_start=warm_start)
+    assets = list(data.columns)
+    prices = data.to_numpy(dtype=float)
+
+    # Pre-sorted event queue: (date, priority, action)
+    events = [(start_date, 2, 'Start')]
+    if input_cash_amount:
+        events += [(date, 0, 'Input') for date in event_schedule(start_date, end_date, input_cash_frequency_months)]
+    if withdraw_amount:
+        events += [(date, 1, 'Withdraw') for date in event_schedule(start_date, end_date, withdraw_frequency_months)]
+    events += [(date, 2, 'Rebalance') for date in event_schedule(start_date, end_date, rebalance_frequency_months)]
+    events.sort(key=lambda event: event[:2])
+
+    event_dates = pd.DatetimeIndex([date for date, _, _ in events])
+    event_prices = prices[data.index.searchsorted(event_dates, side='left') - 1]
+
+    n_events, n_assets = len(events), len(assets)
+    target_weights = np.full((n_events, n_assets), np.nan)
+    shares = np.zeros((n_events, n_assets))
+    cash = np.zeros(n_events)
+    flows = np.zeros(n_events)
+    actions = []
+
+    current_shares, current_cash = np.zeros(n_assets), float(initial_portfolio_value)
+    for k, (date, _, action) in enumerate(events):
+        current_prices = event_prices[k]
+        invested = current_shares * current_prices
+
+        if action in ('Start', 'Rebalance'):
+            target_weights[k], _ = rebalance_strategy(date)
+            portfolio_value = invested.sum() + current_cash
+            current_shares = np.floor(portfolio_value * target_weights[k] / (current_prices * (1 + commission)))
+            current_cash = portfolio_value - current_shares.dot(current_prices)
+        elif action == 'Input':
+            # New cash is invested pro rata to the market value of the current positions
+            flows[k] = input_cash_amount
+            current_cash += input_cash_amount
+            if invested.sum() > 0:
+                new_shares = np.floor(input_cash_amount * invested / invested.sum() / (current_prices * (1 + commission)))
+                current_shares = current_shares + new_shares
+                current_cash -= new_shares.dot(current_prices)
+        elif action == 'Withdraw':
+            portfolio_value = invested.sum() + current_cash
+            if portfolio_value < withdraw_amount:
+                action = 'Withdraw skipped'
+            else:
+                # Selling the rounded-up fraction of every position keeps the cash account non-negative
+                sold_shares = np.minimum(np.ceil(current_shares * withdraw_amount / portfolio_value), current_shares)
+                flows[k] = -withdraw_amount
+                current_shares = current_shares - sold_shares
+                current_cash += sold_shares.dot(current_prices) - withdraw_amount
+
+        actions.append(action)
+        shares[k], cash[k] = current_shares, current_cash
+
+    value = shares * event_prices
+    total_value = value.sum(axis=1) + cash
+    holding_weights = np.divide(value, value.sum(axis=1, keepdims=True), out=np.zeros_like(value), where=value.sum(axis=1, keepdims=True) > 0)
+
+    results = pd.concat([
+        pd.DataFrame({'data_origin_date': [start_date_data] * n_events, 'end_date': event_dates.strftime('%Y-%m-%d'), 'action': actions}),
+        pd.DataFrame(target_weights, columns=[f'weight_{ticker}' for ticker in assets]),
+        pd.DataFrame(shares, columns=[f'shares_{ticker}' for ticker in assets]),
+        pd.DataFrame(np.diff(shares, axis=0, prepend=0), columns=[f'diff_{ticker}' for ticker in assets]),
+        pd.DataFrame(value, columns=[f'value_{ticker}' for ticker in assets]),
+        pd.DataFrame(holding_weights, columns=[f'holding_weight_{ticker}' for ticker in assets]),
+        pd.DataFrame({'cash_flow': flows, 'remaining_cash': cash, 'total_portfolio_value': total_value}),
+    ], axis=1)
+
+    dates, holding_period, nav = value_holdings(data, event_dates, shares, cash, until=end_date)
+    daily_data = pd.DataFrame(shares[holding_period], index=dates, columns=[f'shares_{ticker}' for ticker in assets])
+    daily_data['remaining_cash'] = cash[holding_period]
+    portfolio_value = pd.Series(nav, index=dates, name='portfolio_value')
 
     return results, daily_data, portfolio_value
 
-# EXAMPLE (DOES NOT WORK YET)
+# EXAMPLE
 
 # a,b,c = dynamic_backtesting_x2(
 #     tickers=tickers, 
 #     start_date_data='2020-01-02', 
 #     start_backtesting='2023-01-23', 
 #     end_date='2024-01-23', 
-#     rebalance_frequency_months = rebalance_frequency_months , 
 #     rf=rf, 
 #     optimization_strategy=optimization_strategy, 
+#     data=None,
+#     benchmark_data=None,
+#     rebalance_frequency_months=rebalance_frequency_months, 
+#     input_cash_frequency_months=12,
+#     input_cash_amount=100_000,
 #     optimization_model=optimization_model,
-#     initial_portfolio_value = initial_portfolio_value
+#     initial_portfolio_value=initial_portfolio_value
 # )
@@ -0,0 +1,366 @@
+"""
+# -- --------------------------------------------------------------------------------------------------- -- #
+# -- project: Quantitative Asset Allocation (QAA)                                                        -- #
+# -- script: benchmark.py - Python script with the offline benchmark of the optimizers and backtests     -- #
+# -- authors: diegotita4 - Antonio-IF - JoAlfonso - J3SVS - Oscar148                                     -- #
+# -- license: GNU GENERAL PUBLIC LICENSE - Version 3, 29 June 2007                                       -- #
+# -- repository: https://github.com/diegotita4/PAP                                                       -- #
+# -- --------------------------------------------------------------------------------------------------- -- #
+
+Usage:
+    python benchmark.py --profile quick --output benchmark_report.json
+    python benchmark.py --profile full --assets 5 50 500 --years 1 20 --models SLSQP QP
+"""
+
+# ----------------------------------------------------------------------------------------------------
+
+# LIBRARIES
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import warnings
+import subprocess
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+import scipy
+
+from functions import QAA
+from backtest import dynamic_backtesting
+from weights_cache import get_default_weights_cache, set_default_weights_cache
+from strategies import STRATEGIES as STRATEGY_REGISTRY, MODELS as ALL_MODELS, get_strategy
+
+# ----------------------------------------------------------------------------------------------------
+
+# SUITE DEFINITION
+STRATEGIES = list(STRATEGY_REGISTRY)
+MODELS = list(ALL_MODELS)
+
+PROFILES = {
+    'quick': {
+        'assets': [5, 20],
+        'years': [1, 3],
+        'backtest_assets': [5, 20],
+        'backtest_years': [3],
+        # Largest universe solved with each model; the Optuna search (500 trials) is left to the full profile
+        'max_assets': {'Monte Carlo': 0, 'Monte Carlo Parallel': 0, 'COBYLA': 5},
+    },
+    'full': {
+        'assets': [5, 20, 50, 100, 250, 500],
+        'years': [1, 5, 10, 20],
+        'backtest_assets': [5, 50, 500],
+        'backtest_years': [1, 5, 20],
+        'max_assets': {'Monte Carlo': 20, 'Monte Carlo Parallel': 50, 'COBYLA': 100},
+    },
+}
+
+# ----------------------------------------------------------------------------------------------------
+
+# SYNTHETIC MARKET
+def synthetic_market(n_assets, years, seed=0, start='2000-01-03', rf=0.02):
+    """
+    Deterministic daily prices from a multivariate geometric Brownian motion with a three-factor structure.
+
+    Log returns are drift + B f_t + e_t, with market, size and value factors f_t, market betas around one,
+    style loadings around zero and independent specific noise e_t. The benchmark follows the market factor
+    and the factors are returned in the Fama-French daily format (percent), so every strategy runs offline.
+
+    :param n_assets: Number of assets.
+    :type n_assets: int
+    :param years: Length of the sample in years of 252 trading days.
+    :type years: float
+    :param seed: Seed of the generator; the same seed always returns the same market.
+    :type seed: int
+    :param start: First business day of the sample.
+    :type start: str
+    :param rf: Annual risk-free rate.
+    :type rf: float
+    :return: (tickers, data, benchmark_data, ff_data).
+    :rtype: tuple
+    """
+    rng = np.random.default_rng(seed)
+    n_days = int(round(252 * years))
+    dates = pd.bdate_range(start, periods=n_days + 1, name='Date')
+    tickers = [f'A{i:03d}' for i in range(n_assets)]
+
+    factor_mean = np.array([0.0003, 0.0001, 0.0001])
+    factor_vol = np.array([0.010, 0.005, 0.005])
+    factors = factor_mean + factor_vol * rng.standard_normal((n_days, 3))
+    loadings = np.column_stack([rng.normal(1.0, 0.3, n_assets), rng.normal(0.0, 0.5, n_assets), rng.normal(0.0, 0.5, n_assets)])
+    specific_vol = rng.uniform(0.008, 0.020, n_assets)
+    drift = rng.normal(0.0001, 0.0002, n_assets)
+
+    systematic = factors @ loadings.T
+    total_var = (loadings ** 2) @ factor_vol ** 2 + specific_vol ** 2
+    log_returns = drift - total_var / 2 + systematic + specific_vol * rng.standard_normal((n_days, n_assets))
+    prices = 100 * np.exp(np.vstack([np.zeros(n_assets), np.cumsum(log_returns, axis=0)]))
+    benchmark = 100 * np.exp(np.concatenate([[0.], np.cumsum(factors[:, 0] - factor_vol[0] ** 2 / 2)]))
+
+    data = pd.DataFrame(prices, index=dates, columns=tickers)
+    benchmark_data = pd.Series(benchmark, index=dates, name='SPY')
+    ff_data = pd.DataFrame(np.vstack([np.zeros(3), factors]) * 100, index=dates, columns=['Mkt-RF', 'SMB', 'HML'])
+    ff_data['Mkt-RF'] -= rf / 252 * 100
+    ff_data['RF'] = rf / 252 * 100
+    return tickers, data, benchmark_data, ff_data
+
+# ----------------------------------------------------------------------------------------------------
+
+# MEASUREMENT
+def measure(function, repeat=1, memory=True):
+    """
+    Runs a function repeat times untraced for the wall time and once more under tracemalloc for the peak memory.
+
+    Tracing slows pure-Python loops (COBYLA, Optuna) by an order of magnitude, which is why it gets its own run.
+
+    :param function: Function without arguments to measure.
+    :type function: callable
+    :param repeat: Number of timed runs; the fastest one is reported.
+    :type repeat: int
+    :param memory: Whether to run the traced run.
+    :type memory: bool
+    :return: (output of the last run, best wall time in seconds, peak traced memory in MiB or None).
+    :rtype: tuple
+    """
+    wall_times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = function()
+        wall_times.append(time.perf_counter() - start)
+
+    if not memory:
+        return output, min(wall_times), None
+    tracemalloc.start()
+    try:
+        function()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return output, min(wall_times), peak / 1024 ** 2
+
+
+def converged(qaa_instance):
+    """Whether the last solve returned finite weights on the budget constraint and the solver reported success."""
+    weights = qaa_instance.optimal_weights
+    if weights is None:
+        return False
+    weights = np.asarray(weights, dtype=float)
+    result = qaa_instance.optimization_result
+    solver_success = bool(result.get('success', True)) if result is not None else True
+    return solver_success and bool(np.isfinite(weights).all()) and abs(weights.sum() - 1) < 1e-4
+
+
+@contextmanager
+def isolated_run():
+    """
+    Switches off the process-wide weights cache so every case solves, and silences the solver warnings.
+
+    Both are restored on exit, so a suite run from the app or a test session leaves the process as it was.
+    """
+    previous_weights_cache = get_default_weights_cache()
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        set_default_weights_cache(None)
+        try:
+            yield
+        finally:
+            set_default_weights_cache(previous_weights_cache)
+
+
+def optimizer_case(strategy, model, tickers, data, benchmark_data, ff_data, rf, lower_bound, higher_bound, repeat, memory):
+    """Benchmarks one QAA.optimize call and returns its report entry."""
+    def solve():
+        qaa_instance = QAA(tickers=tickers, rf=rf, lower_bound=lower_bound, higher_bound=higher_bound, data=data,
+                           benchmark_data=benchmark_data, ff_data=ff_data, weights_cache=False)
+        qaa_instance.set_optimization_strategy(strategy)
+        qaa_instance.set_optimization_model(model)
+        qaa_instance.optimize()
+        return qaa_instance
+
+    try:
+        qaa_instance, wall_time, peak_memory = measure(solve, repeat, memory)
+    except Exception as error:
+        return {'status': 'error', 'error': f'{type(error).__name__}: {error}'}
+
+    result = qaa_instance.optimization_result
+    is_converged = converged(qaa_instance)
+    return {
+        'status': 'converged' if is_converged else 'not converged',
+        'wall_time_s': wall_time,
+        'peak_memory_mib': peak_memory,
+        'evaluations': int(result['nfev']) if result is not None and 'nfev' in result else None,
+        'iterations': int(result['nit']) if result is not None and 'nit' in result else None,
+        'objective': float(qaa_instance.objective_function(np.asarray(qaa_instance.optimal_weights, dtype=float)))
+                     if is_converged and not get_strategy(strategy).closed_form else None,
+    }
+
+
+def backtest_case(strategy, model, tickers, data, benchmark_data, ff_data, rf, lower_bound, higher_bound, rebalance_frequency_months, repeat, memory):
+    """Benchmarks one end-to-end dynamic_backtesting run and returns its report entry."""
+    # The first quarter of the sample (at least half a year) is the estimation window of the first rebalance
+    start_backtesting = data.index[max(126, len(data) // 4)]
+
+    def run():
+        return dynamic_backtesting(tickers, data.index[0], start_backtesting, data.index[-1], rebalance_frequency_months, rf, strategy, model,
+                                   1_000_000, lower_bound=lower_bound, higher_bound=higher_bound, data=data, benchmark_data=benchmark_data,
+                                   ff_data=ff_data)
+
+    try:
+        (results, _, portfolio_value), wall_time, peak_memory = measure(run, repeat, memory)
+    except Exception as error:
+        return {'status': 'error', 'error': f'{type(error).__name__}: {error}'}
+
+    evaluations = results['evaluations'].dropna() if 'evaluations' in results else pd.Series(dtype=float)
+    return {
+        'status': 'converged',
+        'wall_time_s': wall_time,
+        'peak_memory_mib': peak_memory,
+        'rebalances': len(results),
+        'trading_days': len(portfolio_value),
+        'evaluations': int(evaluations.sum()) if len(evaluations) else None,
+        'final_value': float(portfolio_value.iloc[-1]) if len(portfolio_value) else None,
+    }
+
+# ----------------------------------------------------------------------------------------------------
+
+# SUITE
+def run_suite(profile='quick', assets=None, years=None, strategies=None, models=None, backtest_strategy='Minimum Variance',
+              backtest_model='SLSQP', rebalance_frequency_months=3, rf=0.02, lower_bound=0.0, higher_bound=0.99, repeat=1, seed=0,
+              backtests=True, memory=True, log=print):
+    """
+    Runs every strategy x model on each synthetic universe and the end-to-end backtests, and builds the report.
+
+    Parameters:
+    - profile (str, optional): 'quick' or 'full', see PROFILES. Defaults to 'quick'.
+    - assets / years (list, optional): Universe sizes and sample lengths, overriding the profile.
+    - strategies / models (list, optional): Subsets of STRATEGIES and MODELS. Default to all of them.
+    - backtest_strategy / backtest_model (str, optional): Strategy and model of the backtests. Default to Minimum Variance with SLSQP.
+    - rebalance_frequency_months (int, optional): Months between the backtest rebalances. Defaults to 3.
+    - rf (float, optional): Annual risk-free rate. Defaults to 0.02.
+    - lower_bound / higher_bound (float, optional): Bounds for the weights, loose enough for 500 assets. Default to 0.0 and 0.99.
+    - repeat (int, optional): Timed runs per case; the fastest is reported. Defaults to 1.
+    - seed (int, optional): Seed of the synthetic markets. Defaults to 0.
+    - backtests (bool, optional): Also runs the backtest cases. Defaults to True.
+    - memory (bool, optional): Records the peak traced memory of every case in an extra run. Defaults to True.
+    - log (callable, optional): Progress printer, or None for silence. Defaults to print.
+
+    Returns:
+    - dict: metadata, optimizers and backtests entries, and a summary with the convergence rate per model and strategy.
+    """
+    settings = PROFILES[profile]
+    assets = assets or settings['assets']
+    years = years or settings['years']
+    strategies = strategies or STRATEGIES
+    models = models or MODELS
+    log = log or (lambda *args: None)
+
+    with isolated_run():
+        optimizers = []
+        for n_assets in assets:
+            for n_years in years:
+                tickers, data, benchmark_data, ff_data = synthetic_market(n_assets, n_years, seed)
+                for strategy in strategies:
+                    # HRP does not use the optimization model, so it is measured once per universe
+                    for model in (models[:1] if get_strategy(strategy).closed_form else models):
+                        case = {'strategy': strategy, 'model': model, 'assets': n_assets, 'years': n_years}
+                        if model not in get_strategy(strategy).models():
+                            entry = {'status': 'unsupported'}
+                        elif n_assets > settings['max_assets'].get(model, n_assets):
+                            entry = {'status': 'skipped'}
+                        else:
+                            entry = optimizer_case(strategy, model, tickers, data, benchmark_data, ff_data, rf, lower_bound, higher_bound, repeat, memory)
+                        optimizers.append({**case, **entry})
+                        log(f"{strategy:>24} | {model:>17} | N={n_assets:>3} | T={n_years:>2}y | {entry['status']:>13} | "
+                            f"{entry.get('wall_time_s', float('nan')):8.3f} s")
+
+        backtest_entries = []
+        if backtests:
+            for n_assets in settings['backtest_assets'] if assets == settings['assets'] else assets:
+                for n_years in settings['backtest_years'] if years == settings['years'] else years:
+                    tickers, data, benchmark_data, ff_data = synthetic_market(n_assets, n_years, seed)
+                    entry = backtest_case(backtest_strategy, backtest_model, tickers, data, benchmark_data, ff_data, rf, lower_bound,
+                                          higher_bound, rebalance_frequency_months, repeat, memory)
+                    backtest_entries.append({'strategy': backtest_strategy, 'model': backtest_model, 'assets': n_assets, 'years': n_years,
+                                             'rebalance_frequency_months': rebalance_frequency_months, **entry})
+                    log(f"{'backtest ' + backtest_strategy:>24} | {backtest_model:>17} | N={n_assets:>3} | T={n_years:>2}y | "
+                        f"{entry['status']:>13} | {entry.get('wall_time_s', float('nan')):8.3f} s")
+
+        return {
+            'metadata': metadata(profile, seed, repeat, memory, rf, lower_bound, higher_bound),
+            'optimizers': optimizers,
+            'backtests': backtest_entries,
+            'summary': summarize(optimizers),
+        }
+
+
+def summarize(optimizers):
+    """Convergence rate and total wall time per model and per strategy, over the cases that were attempted."""
+    frame = pd.DataFrame([entry for entry in optimizers if entry['status'] not in ('skipped', 'unsupported')])
+    if frame.empty:
+        return {}
+    frame['converged'] = frame['status'] == 'converged'
+    summary = {}
+    for key in ('model', 'strategy'):
+        grouped = frame.groupby(key)
+        summary[f'by_{key}'] = {
+            name: {'cases': int(len(group)), 'convergence_rate': float(group['converged'].mean()),
+                   'errors': int((group['status'] == 'error').sum()), 'wall_time_s': float(group['wall_time_s'].sum(skipna=True))}
+            for name, group in grouped
+        }
+    return summary
+
+
+def metadata(profile, seed, repeat, memory, rf, lower_bound, higher_bound):
+    """Versions and settings of the run, so two reports can be compared."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'scipy': scipy.__version__,
+        'platform': platform.platform(),
+        'profile': profile,
+        'seed': seed,
+        'repeat': repeat,
+        'memory': memory,
+        'rf': rf,
+        'lower_bound': lower_bound,
+        'higher_bound': higher_bound,
+    }
+
+# ----------------------------------------------------------------------------------------------------
+
+# COMMAND LINE
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Offline benchmark of the QAA optimizers and backtests on synthetic markets.')
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='quick')
+    parser.add_argument('--assets', type=int, nargs='+', help='Universe sizes, overriding the profile.')
+    parser.add_argument('--years', type=float, nargs='+', help='Sample lengths in years, overriding the profile.')
+    parser.add_argument('--strategies', nargs='+', choices=STRATEGIES, metavar='STRATEGY')
+    parser.add_argument('--models', nargs='+', choices=MODELS, metavar='MODEL')
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-backtests', action='store_true')
+    parser.add_argument('--no-memory', action='store_true', help='Skip the traced runs that measure the peak memory.')
+    parser.add_argument('--output', default='benchmark_report.json')
+    args = parser.parse_args(argv)
+
+    report = run_suite(args.profile, args.assets, args.years, args.strategies, args.models, repeat=args.repeat, seed=args.seed,
+                       backtests=not args.no_backtests, memory=not args.no_memory)
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=2, sort_keys=True, default=float)
+    print(f'Report written to {args.output}')
+    return report
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,246 @@
+"""
+# -- --------------------------------------------------------------------------------------------------- -- #
+# -- project: Quantitative Asset Allocation (QAA)                                                        -- #
+# -- script: covariance.py - Python script with the covariance estimators selectable on QAA              -- #
+# -- authors: diegotita4 - Antonio-IF - JoAlfonso - J3SVS - Oscar148                                     -- #
+# -- license: GNU GENERAL PUBLIC LICENSE - Version 3, 29 June 2007                                       -- #
+# -- repository: https://github.com/diegotita4/PAP                                                       -- #
+# -- --------------------------------------------------------------------------------------------------- -- #
+"""
+
+# ----------------------------------------------------------------------------------------------------
+
+# LIBRARIES
+import numpy as np
+
+# ----------------------------------------------------------------------------------------------------
+
+# ESTIMATORS
+COVARIANCE_ESTIMATORS = ('Sample', 'Ledoit-Wolf', 'OAS', 'Constant Correlation', 'Factor Model')
+
+# Shrinkage intensities are estimated on the centered returns as in the original papers and applied to
+# the unbiased sample covariance, so every estimator shares the scale of np.cov.
+
+def sample_covariance(returns):
+    """
+    Unbiased sample covariance matrix.
+
+    :param returns: Daily returns (T x N).
+    :type returns: np.ndarray
+    :return: Covariance matrix (N x N).
+    :rtype: np.ndarray
+    """
+    return np.atleast_2d(np.cov(returns, rowvar=False))
+
+
+def ledoit_wolf_covariance(returns, sample_cov=None):
+    """
+    Ledoit-Wolf (2004) shrinkage of the sample covariance towards a scaled identity.
+
+    :param returns: Daily returns (T x N).
+    :type returns: np.ndarray
+    :param sample_cov: Sample covariance of the returns, reused when already calculated.
+    :type sample_cov: np.ndarray
+    :return: Shrunk covariance matrix and shrinkage intensity.
+    :rtype: tuple
+    """
+    sample_cov = sample_covariance(returns) if sample_cov is None else sample_cov
+    n_obs, n_assets = returns.shape
+    centered = returns - returns.mean(axis=0)
+    squared = centered ** 2
+
+    empirical_cov = centered.T @ centered / n_obs
+    mu = np.trace(empirical_cov) / n_assets
+    delta = ((empirical_cov - mu * np.eye(n_assets)) ** 2).sum() / n_assets
+    beta = ((squared.T @ squared).sum() / n_obs - (empirical_cov ** 2).sum()) / (n_assets * n_obs)
+    shrinkage = 0. if delta == 0 else min(beta, delta) / delta
+
+    target = np.trace(sample_cov) / n_assets * np.eye(n_assets)
+    return (1 - shrinkage) * sample_cov + shrinkage * target, shrinkage
+
+
+def oas_covariance(returns, sample_cov=None):
+    """
+    Oracle Approximating Shrinkage (Chen et al., 2010) of the sample covariance towards a scaled identity.
+
+    :param returns: Daily returns (T x N).
+    :type returns: np.ndarray
+    :param sample_cov: Sample covariance of the returns, reused when already calculated.
+    :type sample_cov: np.ndarray
+    :return: Shrunk covariance matrix and shrinkage intensity.
+    :rtype: tuple
+    """
+    sample_cov = sample_covariance(returns) if sample_cov is None else sample_cov
+    n_obs, n_assets = returns.shape
+    empirical_cov = sample_cov * (n_obs - 1) / n_obs
+
+    alpha = (empirical_cov ** 2).mean()
+    mu = np.trace(empirical_cov) / n_assets
+    numerator = alpha + mu ** 2
+    denominator = (n_obs + 1) * (alpha - mu ** 2 / n_assets)
+    shrinkage = 1. if denominator == 0 else min(numerator / denominator, 1.)
+
+    target = np.trace(sample_cov) / n_assets * np.eye(n_assets)
+    return (1 - shrinkage) * sample_cov + shrinkage * target, shrinkage
+
+
+def constant_correlation_covariance(returns, sample_cov=None):
+    """
+    Ledoit-Wolf (2003) shrinkage of the sample covariance towards the constant-correlation model.
+
+    :param returns: Daily returns (T x N).
+    :type returns: np.ndarray
+    :param sample_cov: Sample covariance of the returns, reused when already calculated.
+    :type sample_cov: np.ndarray
+    :return: Shrunk covariance matrix and shrinkage intensity.
+    :rtype: tuple
+    """
+    sample_cov = sample_covariance(returns) if sample_cov is None else sample_cov
+    n_obs, n_assets = returns.shape
+    centered = returns - returns.mean(axis=0)
+    empirical_cov = centered.T @ centered / n_obs
+
+    std = np.sqrt(np.diag(empirical_cov))
+    corr = empirical_cov / np.outer(std, std)
+    mean_corr = (corr.sum() - n_assets) / (n_assets * (n_assets - 1)) if n_assets > 1 else 0.
+    target = mean_corr * np.outer(std, std)
+    np.fill_diagonal(target, np.diag(empirical_cov))
+
+    # pi: asymptotic variance of the sample covariance entries; rho: covariance with the target entries
+    squared = centered ** 2
+    pi_matrix = squared.T @ squared / n_obs - empirical_cov ** 2
+    theta = (centered ** 3).T @ centered / n_obs - np.diag(empirical_cov)[:, None] * empirical_cov
+    rho_off = mean_corr / 2 * (np.outer(1 / std, std) * theta + np.outer(std, 1 / std) * theta.T)
+    np.fill_diagonal(rho_off, 0)
+    rho = np.trace(pi_matrix) + rho_off.sum()
+    gamma = ((target - empirical_cov) ** 2).sum()
+    shrinkage = 0. if gamma == 0 else max(0., min(1., (pi_matrix.sum() - rho) / gamma / n_obs))
+
+    sample_std = np.sqrt(np.diag(sample_cov))
+    sample_target = mean_corr * np.outer(sample_std, sample_std)
+    np.fill_diagonal(sample_target, np.diag(sample_cov))
+    return (1 - shrinkage) * sample_cov + shrinkage * sample_target, shrinkage
+
+# ----------------------------------------------------------------------------------------------------
+
+# LOW-RANK FACTOR MODEL
+class FactorCovariance:
+    """
+    Covariance matrix stored as B F B^T + D, with K factors and a diagonal of specific variances.
+
+    Products and quadratic forms never build the N x N matrix, so they cost O(NK) instead of O(N^2).
+
+    Methods:
+    - dot: Covariance times a weight vector.
+    - quadratic: Portfolio variance of one weight vector or of every row of a weight matrix.
+    - scaled: Same model with every variance multiplied by a factor (e.g. 252 to annualize).
+    - to_dense: The full N x N matrix.
+    """
+
+    def __init__(self, loadings, factor_cov, specific_var):
+        """
+        Initialize the FactorCovariance.
+
+        :param loadings: Factor loadings B (N x K).
+        :type loadings: np.ndarray
+        :param factor_cov: Covariance of the factors F (K x K).
+        :type factor_cov: np.ndarray
+        :param specific_var: Specific (residual) variances D (N).
+        :type specific_var: np.ndarray
+        """
+        self.loadings = loadings
+        self.factor_cov = factor_cov
+        self.specific_var = specific_var
+
+    def dot(self, weights):
+        """Covariance times the weights, B (F (B^T w)) + D w."""
+        return self.loadings @ (self.factor_cov @ (self.loadings.T @ weights)) + self.specific_var * weights
+
+    def quadratic(self, weights):
+        """Variance w^T (B F B^T + D) w of a weight vector, or of every row of a (K x N) weight matrix."""
+        exposures = weights @ self.loadings
+        return ((exposures @ self.factor_cov) * exposures).sum(axis=-1) + (weights ** 2) @ self.specific_var
+
+    def scaled(self, factor):
+        """Same model with every variance multiplied by factor."""
+        return FactorCovariance(self.loadings, self.factor_cov * factor, self.specific_var * factor)
+
+    def to_dense(self):
+        """The full covariance matrix."""
+        return self.loadings @ self.factor_cov @ self.loadings.T + np.diag(self.specific_var)
+
+
+def factor_regression(returns, factors):
+    """
+    Time-series regression of every asset on the factors at once, r_t = a + B f_t + e_t.
+
+    The N regressions share the (K + 1) x (K + 1) normal equations, so fitting them costs one (K + 1) x T by
+    T x N product; the residual variances come from the sums of squares without forming the T x N residuals.
+
+    :param returns: Daily returns (T x N).
+    :type returns: np.ndarray
+    :param factors: Daily factor returns on the same rows, in decimal units (T x K).
+    :type factors: np.ndarray
+    :return: (intercepts (N), loadings (N x K), specific variances (N)).
+    :rtype: tuple
+    """
+    design = np.column_stack([np.ones(len(factors)), factors])
+    gram, cross = design.T @ design, design.T @ returns
+    try:
+        coefficients = np.linalg.solve(gram, cross)
+    except np.linalg.LinAlgError:
+        coefficients = np.linalg.lstsq(design, returns, rcond=None)[0]
+    residual_ss = np.einsum('tn,tn->n', returns, returns) - np.einsum('kn,kn->n', coefficients, cross)
+    specific_var = np.maximum(residual_ss, 0) / (len(returns) - design.shape[1])
+    return coefficients[0], coefficients[1:].T, specific_var
+
+
+def factor_model_covariance(returns, factors):
+    """
+    Low-rank covariance from a time-series regression of the returns on a set of factors.
+
+    :param returns: Daily returns (T x N).
+    :type returns: np.ndarray
+    :param factors: Daily factor returns on the same rows, in decimal units (T x K).
+    :type factors: np.ndarray
+    :return: Factor covariance model.
+    :rtype: FactorCovariance
+    """
+    _, loadings, specific_var = factor_regression(returns, factors)
+    return FactorCovariance(
+        loadings=loadings,
+        factor_cov=np.atleast_2d(np.cov(factors, rowvar=False)),
+        specific_var=specific_var,
+    )
+
+
+def estimate_covariance(returns, estimator='Sample', sample_cov=None, factors=None):
+    """
+    Estimates the covariance matrix of the returns with the selected estimator.
+
+    :param returns: Daily returns (T x N).
+    :type returns: np.ndarray
+    :param estimator: One of COVARIANCE_ESTIMATORS.
+    :type estimator: str
+    :param sample_cov: Sample covariance of the returns, reused when already calculated.
+    :type sample_cov: np.ndarray
+    :param factors: Daily factor returns in decimal units (T x K), required by 'Factor Model'.
+    :type factors: np.ndarray
+    :return: Dense covariance matrix and the factor model (None for the other estimators).
+    :rtype: tuple
+    """
+    if estimator == 'Sample':
+        return (sample_covariance(returns) if sample_cov is None else sample_cov), None
+    elif estimator == 'Ledoit-Wolf':
+        return ledoit_wolf_covariance(returns, sample_cov)[0], None
+    elif estimator == 'OAS':
+        return oas_covariance(returns, sample_cov)[0], None
+    elif estimator == 'Constant Correlation':
+        return constant_correlation_covariance(returns, sample_cov)[0], None
+    elif estimator == 'Factor Model':
+        if factors is None:
+            raise ValueError("The factor model needs factor returns.")
+        model = factor_model_covariance(returns, factors)
+        return model.to_dense(), model
+    else:
+        raise ValueError(f"Unknown covariance estimator '{estimator}'. Use one of {COVARIANCE_ESTIMATORS}.")
@@ -0,0 +1,541 @@
+"""
+# -- --------------------------------------------------------------------------------------------------- -- #
+# -- project: Quantitative Asset Allocation (QAA)                                                        -- #
+# -- script: data_store.py - Python script with the local price and factor stores used by QAA            -- #
+# -- authors: diegotita4 - Antonio-IF - JoAlfonso - J3SVS - Oscar148                                     -- #
+# -- license: GNU GENERAL PUBLIC LICENSE - Version 3, 29 June 2007                                       -- #
+# -- repository: https://github.com/diegotita4/PAP                                                       -- #
+# -- --------------------------------------------------------------------------------------------------- -- #
+"""
+
+# ----------------------------------------------------------------------------------------------------
+
+# LIBRARIES
+import os
+import json
+import logging
+import numpy as np
+import pandas as pd
+from instrumentation import count
+
+# ----------------------------------------------------------------------------------------------------
+
+# PRICE PROVIDERS
+class YahooFinanceProvider:
+    """
+    Price provider backed by yfinance.
+
+    Methods:
+    - fetch: Downloads adjusted close prices for a list of tickers.
+    """
+
+    def fetch(self, tickers, start, end):
+        """
+        Downloads adjusted close prices for the given tickers.
+
+        :param tickers: List of tickers to download.
+        :type tickers: list
+        :param start: First date to download (inclusive).
+        :type start: pd.Timestamp
+        :param end: Last date to download (exclusive).
+        :type end: pd.Timestamp
+        :return: Adjusted close prices, one column per ticker.
+        :rtype: pd.DataFrame
+        """
+        import yfinance as yf
+        data = yf.download(list(tickers), start=start, end=end, auto_adjust=False, progress=False)['Adj Close']
+        if isinstance(data, pd.Series):
+            data = data.to_frame(tickers[0])
+        return data
+
+
+class FileProvider:
+    """
+    Offline price provider that serves prices from a local CSV or Parquet file.
+
+    The file must contain a date column (or index) and one column of adjusted close prices per ticker.
+    It is a stand-in for YahooFinanceProvider in tests and offline sessions.
+
+    Methods:
+    - fetch: Returns the adjusted close prices stored in the file for a list of tickers.
+    """
+
+    def __init__(self, path):
+        """
+        Initialize the FileProvider with the path of the price file.
+
+        :param path: Path to a .csv or .parquet file with prices.
+        :type path: str
+        """
+        self.path = path
+        self._prices = None
+
+    @property
+    def prices(self):
+        """Prices stored in the file, read on first use."""
+        if self._prices is None:
+            if self.path.endswith('.parquet'):
+                prices = pd.read_parquet(self.path)
+            else:
+                prices = pd.read_csv(self.path, index_col=0, parse_dates=True)
+            prices.index = pd.to_datetime(prices.index)
+            self._prices = prices.sort_index()
+        return self._prices
+
+    def fetch(self, tickers, start, end):
+        """
+        Returns the stored prices for the given tickers in [start, end).
+
+        :param tickers: List of tickers to return.
+        :type tickers: list
+        :param start: First date to return (inclusive).
+        :type start: pd.Timestamp
+        :param end: Last date to return (exclusive).
+        :type end: pd.Timestamp
+        :return: Adjusted close prices, one column per ticker.
+        :rtype: pd.DataFrame
+        """
+        prices = self.prices
+        mask = (prices.index >= start) & (prices.index < end)
+        return prices.loc[mask, [ticker for ticker in tickers if ticker in prices.columns]]
+
+# ----------------------------------------------------------------------------------------------------
+
+# LOCAL STORES
+class CoveredStore:
+    """
+    Base of the local stores: the date range already requested from the provider for every key (ticker or
+    dataset), kept in a JSON file next to the data so each range is fetched once.
+
+    Methods:
+    - missing_ranges: Returns the date ranges that must be fetched for a key.
+    """
+
+    COVERAGE_FILE = '_coverage.json'
+    # Dates older than this many days without data are final (weekends, holidays, delisted tickers) and stay covered
+    SETTLEMENT_DAYS = 7
+
+    @staticmethod
+    def _normalize_range(start, end):
+        """Converts a start/end pair into timestamps, filling open ends."""
+        start = pd.Timestamp(start) if start is not None else pd.Timestamp('1970-01-01')
+        end = pd.Timestamp(end) if end is not None else pd.Timestamp.today().normalize() + pd.Timedelta(days=1)
+        return start, end
+
+    def _read_coverage(self):
+        path = os.path.join(self.root, self.COVERAGE_FILE)
+        if not os.path.exists(path):
+            return {}
+        with open(path) as file:
+            raw = json.load(file)
+        return {key: (pd.Timestamp(start), pd.Timestamp(end)) for key, (start, end) in raw.items()}
+
+    def _write_coverage(self):
+        path = os.path.join(self.root, self.COVERAGE_FILE)
+        raw = {key: [start.isoformat(), end.isoformat()] for key, (start, end) in self.coverage.items()}
+        with open(path, 'w') as file:
+            json.dump(raw, file)
+
+    def _extend_coverage(self, key, range_start, range_end, last_returned):
+        """
+        Adds a fetched range to the coverage of a key, up to the day after the last date the provider returned.
+
+        A range ending today or later, or past the publication lag of the provider, is only covered up to its last
+        row (and never past yesterday, whose bar is the last complete one), so the missing tail is fetched again on
+        the next load. Empty stretches older than SETTLEMENT_DAYS are final and are covered.
+
+        :param key: Ticker or dataset.
+        :type key: str
+        :param range_start: First fetched date (inclusive).
+        :type range_start: pd.Timestamp
+        :param range_end: Last fetched date (exclusive).
+        :type range_end: pd.Timestamp
+        :param last_returned: Last date the provider returned for the key in the range, or None.
+        :type last_returned: pd.Timestamp
+        """
+        today = pd.Timestamp.today().normalize()
+        settled = today - pd.Timedelta(days=self.SETTLEMENT_DAYS)
+        if last_returned is not None:
+            settled = max(settled, last_returned + pd.Timedelta(days=1))
+        covered_end = max(range_start, min(range_end, today, settled))
+        if key in self.coverage:
+            previous_start, previous_end = self.coverage[key]
+            self.coverage[key] = (min(previous_start, range_start), max(previous_end, covered_end))
+        else:
+            self.coverage[key] = (range_start, covered_end)
+
+    def missing_ranges(self, key, start, end):
+        """
+        Returns the date ranges of [start, end) that are not yet in the store for a ticker or dataset.
+
+        Ranges are extended to touch the stored coverage so it always remains a single contiguous interval.
+
+        :param key: Ticker or dataset to check.
+        :type key: str
+        :param start: First requested date (inclusive).
+        :type start: pd.Timestamp
+        :param end: Last requested date (exclusive).
+        :type end: pd.Timestamp
+        :return: List of (start, end) tuples to fetch.
+        :rtype: list
+        """
+        if key not in self.coverage:
+            return [(start, end)]
+        covered_start, covered_end = self.coverage[key]
+        ranges = []
+        if start < covered_start:
+            ranges.append((start, covered_start))
+        if end > covered_end:
+            ranges.append((covered_end, end))
+        return ranges
+
+
+class PriceStore(CoveredStore):
+    """
+    Persistent on-disk price store keyed by ticker and date.
+
+    Each ticker is stored in its own Parquet file together with the date range that has already been
+    requested from the provider. Only the missing part of a requested range is fetched, so repeated
+    loads of overlapping windows are served from local disk.
+
+    Adjusted prices are rebased over the whole history after every split or dividend, so each top-up also
+    fetches the stored bar next to it; when the provider no longer agrees with the stored value the ticker is
+    fetched again over its full coverage instead of joining two adjustment bases.
+
+    Methods:
+    - load: Returns prices for a list of tickers, topping up the store from the provider if needed.
+    - missing_ranges: Returns the date ranges that must be fetched for a ticker.
+    - clear: Removes every stored ticker.
+    """
+
+    def __init__(self, root='.qaa_store/prices', provider=None):
+        """
+        Initialize the PriceStore.
+
+        :param root: Directory where the Parquet files are kept.
+        :type root: str
+        :param provider: Object with a fetch(tickers, start, end) method. Defaults to YahooFinanceProvider.
+        :type provider: object
+        """
+        self.root = root
+        self.provider = provider if provider is not None else YahooFinanceProvider()
+        os.makedirs(self.root, exist_ok=True)
+        self.coverage = self._read_coverage()
+
+    def _ticker_path(self, ticker):
+        return os.path.join(self.root, f"{ticker.replace('/', '_')}.parquet")
+
+    def _read_ticker(self, ticker):
+        path = self._ticker_path(ticker)
+        if not os.path.exists(path):
+            return pd.Series(dtype=float, name=ticker)
+        return pd.read_parquet(path)['price'].rename(ticker)
+
+    def _write_ticker(self, ticker, prices):
+        prices.rename('price').to_frame().to_parquet(self._ticker_path(ticker))
+
+    @staticmethod
+    def _with_overlap(stored, range_start, range_end):
+        """Extends a missing range to the stored bar it touches, so the top-up can be checked against the store."""
+        if len(stored):
+            if range_start > stored.index[-1]:
+                return stored.index[-1], range_end
+            if range_end <= stored.index[0]:
+                return range_start, stored.index[0] + pd.Timedelta(days=1)
+        return range_start, range_end
+
+    @staticmethod
+    def _rebased(stored, new, rtol=1e-6):
+        """Whether newly fetched prices disagree with the stored ones on their common dates."""
+        overlap = stored.index.intersection(new.index)
+        return len(overlap) > 0 and not np.allclose(new[overlap].to_numpy(dtype=float), stored[overlap].to_numpy(dtype=float), rtol=rtol)
+
+    def load(self, tickers, start=None, end=None):
+        """
+        Returns adjusted close prices for the tickers in [start, end), fetching only the missing ranges.
+
+        :param tickers: List of tickers to load.
+        :type tickers: list
+        :param start: First date (inclusive). Defaults to the earliest available date.
+        :type start: str or pd.Timestamp
+        :param end: Last date (exclusive). Defaults to tomorrow.
+        :type end: str or pd.Timestamp
+        :return: Prices with one column per ticker, sorted by ticker like yfinance.
+        :rtype: pd.DataFrame
+        """
+        start, end = self._normalize_range(start, end)
+
+        # Group tickers that miss the same range so each range is fetched with a single provider call
+        pending, stored = {}, {}
+        for ticker in tickers:
+            for missing in self.missing_ranges(ticker, start, end):
+                if ticker not in stored:
+                    stored[ticker] = self._read_ticker(ticker)
+                pending.setdefault(self._with_overlap(stored[ticker], *missing), []).append(ticker)
+
+        updated, rebased = {}, set()
+        for (range_start, range_end), range_tickers in pending.items():
+            fetched = self.provider.fetch(range_tickers, range_start, range_end)
+            count('downloaded_values', int(fetched.size))
+            for ticker in range_tickers:
+                new = fetched[ticker].dropna() if ticker in fetched else pd.Series(dtype=float)
+                if self._rebased(stored[ticker], new):
+                    rebased.add(ticker)
+                combined = pd.concat([updated[ticker] if ticker in updated else stored[ticker], new.rename(ticker)])
+                updated[ticker] = combined[~combined.index.duplicated(keep='last')].sort_index()
+                self._extend_coverage(ticker, range_start, range_end, new.index.max() if len(new) else None)
+
+        # A split or dividend since the last load rebased the history: replace it instead of appending to it
+        refetch = {}
+        for ticker in rebased:
+            refetch.setdefault(self.coverage[ticker], []).append(ticker)
+        for (range_start, range_end), range_tickers in refetch.items():
+            fetched = self.provider.fetch(range_tickers, range_start, range_end)
+            count('downloaded_values', int(fetched.size))
+            for ticker in range_tickers:
+                updated[ticker] = fetched[ticker].dropna().rename(ticker) if ticker in fetched else pd.Series(dtype=float, name=ticker)
+
+        for ticker, prices in updated.items():
+            self._write_ticker(ticker, prices)
+        if updated:
+            self._write_coverage()
+
+        columns = {ticker: updated[ticker] if ticker in updated else self._read_ticker(ticker) for ticker in sorted(tickers)}
+        data = pd.DataFrame(columns)
+        data.index.name = 'Date'
+        return data.loc[(data.index >= start) & (data.index < end)]
+
+    def clear(self):
+        """Removes every stored ticker and its coverage."""
+        for ticker in list(self.coverage):
+            path = self._ticker_path(ticker)
+            if os.path.exists(path):
+                os.remove(path)
+        self.coverage = {}
+        self._write_coverage()
+
+# ----------------------------------------------------------------------------------------------------
+
+# DEFAULT PRICE STORE
+_DEFAULT_PRICE_STORE = None
+
+
+def set_default_price_store(store):
+    """
+    Sets the price store used by every QAA created without an explicit price_store.
+
+    :param store: PriceStore shared by the process, or None to download the prices on every load.
+    :type store: PriceStore
+    """
+    global _DEFAULT_PRICE_STORE
+    _DEFAULT_PRICE_STORE = store
+
+
+def get_default_price_store():
+    """Price store used by every QAA created without an explicit price_store (None when disabled)."""
+    return _DEFAULT_PRICE_STORE
+
+# ----------------------------------------------------------------------------------------------------
+
+# FAMA-FRENCH FACTOR DATASETS
+# Daily Kenneth French datasets by short name; every file is in percent and the factor files include RF
+FACTOR_DATASETS = {
+    '3-factor': 'F-F_Research_Data_Factors_daily',
+    '5-factor': 'F-F_Research_Data_5_Factors_2x3_daily',
+    'momentum': 'F-F_Momentum_Factor_daily',
+}
+
+
+class FamaFrenchProvider:
+    """
+    Factor provider backed by the Kenneth French data library (through pandas_datareader).
+
+    Methods:
+    - fetch: Downloads one daily factor dataset.
+    """
+
+    def fetch(self, dataset, start, end):
+        """
+        Downloads a daily factor dataset.
+
+        :param dataset: Short name of the dataset, one of FACTOR_DATASETS.
+        :type dataset: str
+        :param start: First date to download (inclusive).
+        :type start: pd.Timestamp
+        :param end: Last date to download (inclusive).
+        :type end: pd.Timestamp
+        :return: Daily factor returns in percent, one column per factor.
+        :rtype: pd.DataFrame
+        """
+        import pandas_datareader.data as web
+        factors = web.DataReader(FACTOR_DATASETS[dataset], 'famafrench', start=start, end=end)[0]
+        # The momentum file pads its column name ('Mom   ')
+        factors.columns = [column.strip() for column in factors.columns]
+        factors.index = pd.to_datetime(factors.index)
+        return factors
+
+
+def join_factor_datasets(frames):
+    """
+    Joins several factor datasets on their common dates, keeping the first copy of repeated columns (Mkt-RF, RF, ...).
+
+    :param frames: Factor datasets in the order of preference.
+    :type frames: list
+    :return: One column per distinct factor.
+    :rtype: pd.DataFrame
+    """
+    factors = pd.concat(frames, axis=1, join='inner')
+    return factors.loc[:, ~factors.columns.duplicated()]
+
+
+def factor_join_index(factor_index, calendar):
+    """
+    Positions of the dates of a returns calendar in a factor index, -1 where the factors have no row.
+
+    A calendar that is a contiguous run of the factor index (e.g. a backtest window of factors already aligned
+    with align_factors) is resolved with two binary searches instead of hashing every date.
+
+    :param factor_index: Sorted dates of the factors.
+    :type factor_index: pd.DatetimeIndex
+    :param calendar: Dates of the asset returns.
+    :type calendar: pd.DatetimeIndex
+    :return: Row positions in the factors (len(calendar)).
+    :rtype: np.ndarray
+    """
+    if len(calendar):
+        first, last = factor_index.searchsorted([calendar[0], calendar[-1]])
+        if last - first + 1 == len(calendar) and factor_index[first:last + 1].equals(calendar):
+            return np.arange(first, last + 1)
+    return factor_index.get_indexer(calendar)
+
+
+def align_factors(factors, calendar):
+    """
+    Factor returns on the dates of a returns calendar.
+
+    Dates missing from the factor files (holidays of one calendar, the months the library has not published yet)
+    get zero factor returns instead of failing the lookup.
+
+    :param factors: Factor returns.
+    :type factors: pd.DataFrame
+    :param calendar: Dates of the asset returns.
+    :type calendar: pd.DatetimeIndex
+    :return: Factor returns indexed by calendar.
+    :rtype: pd.DataFrame
+    """
+    positions = factor_join_index(factors.index, calendar)
+    values = factors.to_numpy(dtype=float)[positions]
+    missing = positions < 0
+    if missing.any():
+        values[missing] = 0.
+        logging.getLogger(__name__).warning("%d return dates have no Fama-French factors; their factor returns are set to zero.", int(missing.sum()))
+    return pd.DataFrame(values, index=calendar, columns=factors.columns)
+
+# ----------------------------------------------------------------------------------------------------
+
+# LOCAL FACTOR STORE
+class FactorStore(CoveredStore):
+    """
+    Persistent on-disk store of the daily Fama-French datasets.
+
+    Each dataset is kept in its own Parquet file with the date range already requested from the provider, so
+    building many QAA instances (every window of a backtest, every page of the app) downloads each range once.
+
+    Methods:
+    - load: Returns the joined factors of one or more datasets, topping up the store from the provider if needed.
+    - clear: Removes every stored dataset.
+    """
+
+    COVERAGE_FILE = '_coverage.json'
+    # The library is updated about monthly and runs one to three months behind, so only older gaps are final
+    SETTLEMENT_DAYS = 120
+
+    def __init__(self, root='.qaa_store/factors', provider=None):
+        """
+        Initialize the FactorStore.
+
+        :param root: Directory where the Parquet files are kept.
+        :type root: str
+        :param provider: Object with a fetch(dataset, start, end) method. Defaults to FamaFrenchProvider.
+        :type provider: object
+        """
+        self.root = root
+        self.provider = provider if provider is not None else FamaFrenchProvider()
+        os.makedirs(self.root, exist_ok=True)
+        self.coverage = self._read_coverage()
+        self._frames = {}
+
+    def _dataset_path(self, dataset):
+        return os.path.join(self.root, f'{dataset}.parquet')
+
+    def _read_dataset(self, dataset):
+        if dataset not in self._frames:
+            path = self._dataset_path(dataset)
+            self._frames[dataset] = pd.read_parquet(path) if os.path.exists(path) else None
+        return self._frames[dataset]
+
+    def load(self, datasets=('3-factor',), start=None, end=None):
+        """
+        Returns the daily factors of the datasets in [start, end), fetching only the missing ranges.
+
+        :param datasets: Short names of the datasets, see FACTOR_DATASETS.
+        :type datasets: tuple
+        :param start: First date (inclusive). Defaults to the earliest available date.
+        :type start: str or pd.Timestamp
+        :param end: Last date (exclusive). Defaults to tomorrow.
+        :type end: str or pd.Timestamp
+        :return: Factor returns in percent, one column per distinct factor, on the dates common to the datasets.
+        :rtype: pd.DataFrame
+        """
+        start, end = self._normalize_range(start, end)
+        frames = []
+        for dataset in datasets:
+            if dataset not in FACTOR_DATASETS:
+                raise ValueError(f"Unknown factor dataset '{dataset}'. Use one of {list(FACTOR_DATASETS)}.")
+
+            stored = self._read_dataset(dataset)
+            missing = self.missing_ranges(dataset, start, end)
+            for range_start, range_end in missing:
+                fetched = self.provider.fetch(dataset, range_start, range_end - pd.Timedelta(days=1))
+                count('downloaded_values', int(fetched.size))
+                stored = fetched if stored is None else pd.concat([stored, fetched])
+                stored = stored[~stored.index.duplicated(keep='last')].sort_index()
+                # Dates the library has not published yet stay missing, so a later load picks them up
+                self._extend_coverage(dataset, range_start, range_end, fetched.index.max() if len(fetched) else None)
+            if missing:
+                stored.to_parquet(self._dataset_path(dataset))
+                self._frames[dataset] = stored
+                self._write_coverage()
+            frames.append(stored.loc[(stored.index >= start) & (stored.index < end)])
+
+        return join_factor_datasets(frames)
+
+    def clear(self):
+        """Removes every stored dataset and its coverage."""
+        for dataset in list(self.coverage):
+            path = self._dataset_path(dataset)
+            if os.path.exists(path):
+                os.remove(path)
+        self.coverage, self._frames = {}, {}
+        self._write_coverage()
+
+# ----------------------------------------------------------------------------------------------------
+
+# DEFAULT FACTOR STORE
+_DEFAULT_FACTOR_STORE = None
+
+
+def set_default_factor_store(store):
+    """
+    Sets the factor store used by every QAA created without an explicit factor_store.
+
+    :param store: FactorStore shared by the process, or None to download the factors on every load.
+    :type store: FactorStore
+    """
+    global _DEFAULT_FACTOR_STORE
+    _DEFAULT_FACTOR_STORE = store
+
+
+def get_default_factor_store():
+    """Factor store used by every QAA created without an explicit factor_store (None when disabled)."""
+    return _DEFAULT_FACTOR_STORE
@@ -11,28 +11,28 @@
 # ----------------------------------------------------------------------------------------------------
 
 # LIBRARIES / WARNINGS
+# yfinance, pandas_datareader and optuna are imported where they are used, so importing this
+# module and constructing a QAA stay cheap until a strategy actually needs them
 import numpy as np
 import pandas as pd
-import yfinance as yf
-import matplotlib.pyplot as plt
 from datetime import datetime
 from scipy.optimize import minimize
+from scipy.linalg import cho_factor, cho_solve, LinAlgError
 from scipy.spatial.distance import squareform
-from scipy.cluster.hierarchy import linkage, dendrogram, leaves_list
-import optuna
+from scipy.cluster.hierarchy import linkage, leaves_list
+import time
 import warnings
 import logging
-from pypfopt import EfficientFrontier, risk_models, expected_returns
-from pypfopt.efficient_frontier import EfficientCVaR
-import pandas_datareader.data as web
-import seaborn as sns
-from scipy.cluster.hierarchy import dendrogram, linkage, leaves_list
-from scipy.spatial.distance import squareform
-from pypfopt.hierarchical_portfolio import HRPOpt
-optuna.logging.set_verbosity(optuna.logging.WARNING)
 warnings.filterwarnings('ignore', message='A new study created in memory with name:')
 warnings.filterwarnings('ignore', message='Method COBYLA cannot handle bounds.')
-import empyrical # pip install empyrical
+from scipy.optimize import OptimizeResult
+from solvers import solve_box_qp, maximize_ratio_on_frontier, solve_cvar_lp, sample_bounded_simplex, project_capped_simplex
+from covariance import estimate_covariance, factor_regression, FactorCovariance
+from data_store import FamaFrenchProvider, join_factor_datasets, align_factors, get_default_factor_store, get_default_price_store
+from weights_cache import optimization_key, get_default_weights_cache
+from instrumentation import phase, count, counted, active_stats
+from analytics import performance_summary
+from strategies import MODELS, STOCHASTIC_MODELS, get_strategy, canonical_strategy, route_model
 
 # ----------------------------------------------------------------------------------------------------
 
@@ -51,17 +51,24 @@ import empyrical # pip install empyrical
 
 class HierarchicalRiskParity:
     
-    def __init__(self, returns):
+    def __init__(self, returns, cov=None, corr=None):
         """
         Initialize the HierarchicalRiskParity object with returns data.
 
         :param returns: Historical returns of assets.
         :type returns: pd.DataFrame
+        :param cov: Precomputed covariance matrix of the returns, e.g. from QAA.moments.
+        :type cov: np.ndarray
+        :param corr: Precomputed correlation matrix of the returns, e.g. from QAA.moments.
+        :type corr: np.ndarray
         """
         self.names = returns.columns
         self.returns = returns
-        self.cov = returns.cov()
-        self.corr = returns.corr()
+        self.cov = np.atleast_2d(np.cov(returns.to_numpy(dtype=float), rowvar=False)) if cov is None else np.asarray(cov, dtype=float)
+        if corr is None:
+            std = np.sqrt(np.diag(self.cov))
+            corr = self.cov / np.outer(std, std)
+        self.corr = np.asarray(corr, dtype=float)
         
         self.link = None
         self.sort_ix = None
@@ -71,89 +78,96 @@ class HierarchicalRiskParity:
         """
         Perform quasi-diagonalization ordering on a linkage matrix.
 
+        The leaves of the dendrogram read left to right are exactly the quasi-diagonal order.
+
         :param link: Linkage matrix from hierarchical clustering.
         :type link: np.ndarray
         :return: Ordered indices based on quasi-diagonalization.
-        :rtype: list
-        """
-        link = link.astype(int)
-        sort_ix = pd.Series([link[-1, 0], link[-1, 1]])
-        num_items = link[-1, 3]
-
-        while sort_ix.max() >= num_items:
-            sort_ix.index = range(0, sort_ix.shape[0] * 2, 2)
-            df0 = sort_ix[sort_ix >= num_items]
-            i = df0.index
-            j = df0.values - num_items
-            sort_ix[i] = link[j, 0]
-            df0 = pd.Series(link[j, 1], index=i + 1)
-            sort_ix = pd.concat([sort_ix, df0])
-            sort_ix = sort_ix.sort_index()
-            sort_ix.index = range(sort_ix.shape[0])
-
-        return sort_ix.tolist()
+        :rtype: np.ndarray
+        """
+        return leaves_list(link)
    
     def cluster_variation(self, cov, c_items):
         """
         Calculate the variance of a cluster.
 
         :param cov: Covariance matrix of returns.
-        :type cov: pd.DataFrame
+        :type cov: np.ndarray
         :param c_items: Indices of items in the cluster.
         :type c_items: list
         :return: Variance of the cluster.
         :rtype: float
         """
-        c_cov = cov.iloc[c_items, c_items]
+        c_cov = np.asarray(cov)[np.ix_(c_items, c_items)]
         
         ivp_weights = 1. / np.diag(c_cov)
         ivp_weights /= ivp_weights.sum()
-        ivp_weights = ivp_weights.reshape(-1, 1)
         
-        cluster_variance = np.dot(np.dot(ivp_weights.T, c_cov), ivp_weights)[0, 0]
-        return cluster_variance
+        return ivp_weights.dot(c_cov).dot(ivp_weights)
 
     @staticmethod
-    def bisection(items):
+    def bisection(clusters):
         """
-        Recursively split clusters into subclusters.
+        Split every cluster of more than one item into two halves.
 
-        :param items: List of cluster indices.
-        :type items: list
-        :return: List of subcluster indices after bisection.
-        :rtype: list
+        :param clusters: Clusters as (start, end) rows over the quasi-diagonal order.
+        :type clusters: np.ndarray
+        :return: Split clusters as (start, middle, end) rows.
+        :rtype: np.ndarray
         """
-        new_items = [i[int(j):int(k)] for i in items for j, k in ((0, len(i) / 2), (len(i) / 2, len(i))) if len(i) > 1]
-        return new_items
+        clusters = clusters[clusters[:, 1] - clusters[:, 0] > 1]
+        middle = clusters[:, 0] + (clusters[:, 1] - clusters[:, 0]) // 2
+        return np.column_stack([clusters[:, 0], middle, clusters[:, 1]])
 
     def HRP(self, cov, sort_ix):
         """
         Calculate asset weights using hierarchical risk parity.
 
+        Inverse-variance cluster variances come from a summed-area table of ivp_i * ivp_j * cov_ij over the
+        quasi-diagonal order: the variance of cluster [a, b) is its block sum divided by (sum of ivp in [a, b))^2,
+        so every bisection level is evaluated in batch with index arithmetic only.
+
         :param cov: Covariance matrix of returns.
-        :type cov: pd.DataFrame
+        :type cov: np.ndarray
         :param sort_ix: Ordered indices from quasi-diagonalization.
-        :type sort_ix: list
-        :return: Asset weights based on HRP.
-        :rtype: pd.Series
+        :type sort_ix: np.ndarray
+        :return: Asset weights in the quasi-diagonal order.
+        :rtype: np.ndarray
         """
-        weights = pd.Series(1, index=sort_ix)
-        clusters = [sort_ix]
+        sort_ix = np.asarray(sort_ix)
+        sorted_cov = np.asarray(cov)[np.ix_(sort_ix, sort_ix)]
+        n_items = len(sort_ix)
 
-        while len(clusters) > 0:
-            clusters = self.bisection(clusters)
+        ivp = 1. / np.diag(sorted_cov)
+        ivp_cumsum = np.concatenate([[0.], np.cumsum(ivp)])
+        block_sums = np.zeros((n_items + 1, n_items + 1))
+        block_sums[1:, 1:] = (sorted_cov * np.outer(ivp, ivp)).cumsum(axis=0).cumsum(axis=1)
 
-            for i in range(0, len(clusters), 2):
-                cluster_0 = clusters[i]
-                cluster_1 = clusters[i + 1]
+        def cluster_variances(start, end):
+            block = block_sums[end, end] - block_sums[start, end] - block_sums[end, start] + block_sums[start, start]
+            return block / (ivp_cumsum[end] - ivp_cumsum[start]) ** 2
 
-                c_var0 = self.cluster_variation(cov, cluster_0)
-                c_var1 = self.cluster_variation(cov, cluster_1)
+        weights = np.ones(n_items)
+        clusters = np.array([[0, n_items]])
 
-                alpha = 1 - c_var0 / (c_var0 + c_var1)
+        while len(clusters) > 0:
+            splits = self.bisection(clusters)
+            if len(splits) == 0:
+                break
+            start, middle, end = splits.T
 
-                weights[cluster_0] *= alpha
-                weights[cluster_1] *= 1 - alpha
+            c_var0 = cluster_variances(start, middle)
+            c_var1 = cluster_variances(middle, end)
+            alpha = 1 - c_var0 / (c_var0 + c_var1)
+
+            # Scale both halves of every split at once by expanding (start, end) ranges into positions
+            range_starts = np.column_stack([start, middle]).ravel()
+            range_lengths = np.column_stack([middle - start, end - middle]).ravel()
+            offsets = np.repeat(np.cumsum(range_lengths) - range_lengths, range_lengths)
+            positions = np.arange(range_lengths.sum()) - offsets + np.repeat(range_starts, range_lengths)
+            weights[positions] *= np.repeat(np.column_stack([alpha, 1 - alpha]).ravel(), range_lengths)
+
+            clusters = np.concatenate([splits[:, [0, 1]], splits[:, [1, 2]]])
 
         return weights
 
@@ -161,23 +175,110 @@ class HierarchicalRiskParity:
         """
         Optimize asset weights using the specified linkage method.
 
-        :param linkage_method: Method used for hierarchical clustering.
+        :param linkage_method: Method used for hierarchical clustering ('single', 'complete', 'average', 'weighted', 'centroid', 'median' or 'ward').
         :type linkage_method: str
         :return: Optimized asset weights based on HRP.
         :rtype: pd.Series
         """
-        self.link = linkage(squareform(1 - self.corr), method=linkage_method)
+        distance = np.clip(1 - self.corr, 0, None)
+        distance = (distance + distance.T) / 2
+        np.fill_diagonal(distance, 0)
+        self.link = linkage(squareform(distance, checks=False), method=linkage_method)
         self.sort_ix = self.get_quasi_diagonalization(self.link)
         sorted_weights = self.HRP(self.cov, self.sort_ix)
-        self.weights = pd.Series(index=self.names, dtype=float)
 
-        for i, ix in enumerate(self.sort_ix):
-            self.weights.iloc[ix] = sorted_weights.iloc[i]
-        self.weights.name = "HRP"
+        weights = np.empty(len(self.names))
+        weights[self.sort_ix] = sorted_weights
+        self.weights = pd.Series(weights, index=self.names, name="HRP")
         
         return self.weights
 
 
+# ----------------------------------------------------------------------------------------------------
+
+class BlackLitterman:
+
+    def __init__(self, mean, cov, opinions_p=None, opinions_q=None, omega=None, tau=0.025):
+        """
+        Initialize the BlackLitterman model and compute its posterior once.
+
+        Without views the model uses one absolute view per asset (identity P) expecting the historical
+        mean increased by 5%, with a diagonal uncertainty of 0.1.
+
+        :param mean: Prior (historical) mean returns of the assets.
+        :type mean: np.ndarray
+        :param cov: Covariance matrix of returns.
+        :type cov: np.ndarray
+        :param opinions_p: Pick matrix of the views (K x N).
+        :type opinions_p: np.ndarray
+        :param opinions_q: Expected returns of the views (K).
+        :type opinions_q: np.ndarray
+        :param omega: Uncertainty matrix of the views (K x K).
+        :type omega: np.ndarray
+        :param tau: Scaling of the prior covariance.
+        :type tau: float
+        """
+        self.mean = np.asarray(mean, dtype=float)
+        self.cov = np.asarray(cov, dtype=float)
+        self.tau = tau
+
+        self.opinions_p = np.eye(self.mean.shape[0]) if opinions_p is None else np.atleast_2d(np.asarray(opinions_p, dtype=float))
+        self.opinions_q = self.mean * 1.05 if opinions_q is None else np.asarray(opinions_q, dtype=float).ravel()
+        self.omega = np.diag(np.full(self.opinions_p.shape[0], 0.1)) if omega is None else np.atleast_2d(np.asarray(omega, dtype=float))
+
+        if self.opinions_p.shape[1] != self.mean.shape[0]:
+            raise ValueError("Dimension mismatch between the assets and the number of columns in 'opinions_p'.")
+        if self.opinions_q.shape[0] != self.opinions_p.shape[0] or self.omega.shape != (self.opinions_p.shape[0],) * 2:
+            raise ValueError("Dimension mismatch between 'opinions_p', 'opinions_q' and 'omega'.")
+
+        self.posterior_mu, self.posterior_cov = self.posterior()
+        self.risk_matrix = self.tau * self.posterior_cov
+
+    def posterior(self):
+        """
+        Calculate the posterior mean and covariance with a Cholesky solve instead of an explicit inverse.
+
+        :return: Posterior mean and covariance.
+        :rtype: tuple
+        """
+        tau_cov = self.tau * self.cov
+        tau_cov_pt = tau_cov.dot(self.opinions_p.T)
+        views_cov = self.opinions_p.dot(tau_cov_pt) + self.omega
+
+        adjusted_returns = self.opinions_q - self.opinions_p.dot(self.mean)
+        rhs = np.column_stack([adjusted_returns, tau_cov_pt.T])
+        try:
+            solved = cho_solve(cho_factor(views_cov), rhs)
+        except LinAlgError:
+            solved = np.linalg.lstsq(views_cov, rhs, rcond=None)[0]
+
+        posterior_mu = self.mean + tau_cov_pt.dot(solved[:, 0])
+        posterior_cov = self.cov + tau_cov - tau_cov_pt.dot(solved[:, 1:])
+        return posterior_mu, (posterior_cov + posterior_cov.T) / 2
+
+    def objective(self, weights):
+        """
+        Negative posterior return plus the tau-scaled posterior variance.
+
+        :param weights: Asset weights.
+        :type weights: np.ndarray
+        :return: Objective value.
+        :rtype: float
+        """
+        return -weights.dot(self.posterior_mu) + 0.5 * weights.dot(self.risk_matrix).dot(weights)
+
+    def gradient(self, weights):
+        """
+        Gradient of the objective.
+
+        :param weights: Asset weights.
+        :type weights: np.ndarray
+        :return: Gradient vector.
+        :rtype: np.ndarray
+        """
+        return -self.posterior_mu + self.risk_matrix.dot(weights)
+
+
 # ----------------------------------------------------------------------------------------------------
 
 # CLASS DEFINITION
@@ -195,29 +296,53 @@ class QAA:
     - higher_bound (float): Higher bound for asset weights.
     - start_date (str): Start date for data retrieval.
     - end_date (str): End date for data retrieval.
+    - price_store (PriceStore): Local price store used instead of downloading the full history.
+    - covariance_estimator (str): Covariance estimator used by every strategy.
+    - initial_weights (np.ndarray): Warm-start weights for the iterative solvers, e.g. the previous rebalance's optimum.
+    - optimization_result (OptimizeResult): Outcome of the last solve, with its iteration (nit) and evaluation (nfev) counts.
+    - weights_cache (WeightsCache): Cache of optimal weights consulted by optimize; None uses the process default, False disables it.
+    - stats (RunStats): Collector active during the last optimize (see instrumentation.collect_stats), None when disabled.
     - optimization_strategy (str): Selected optimization strategy.
-    - optimization_model (str): Selected optimization model.
+    - optimization_model (str): Selected optimization model; 'Auto' picks the fastest applicable one (see strategies.route_model).
+    - routed_model (str): Model that ran the last solve, i.e. the one chosen by 'Auto'.
 
     Methods:
     - _init_: Constructor of the OptimizedStrategy class.
     - set_optimization_strategy: Sets the optimization strategy.
     - set_optimization_model: Sets the optimization model.
+    - strategy_spec: Registry entry of the selected strategy, with its inputs and solver capabilities.
+    - prepare_inputs: Computes only the inputs the selected strategy reads.
+    - set_covariance_estimator: Sets the covariance estimator.
     - load_data: Loads historical data for the assets.
     - calculate_returns: Calculates daily returns for the assets.
-    - validate_returns_empyrical: Validates the returns of each ticker using empyrical.
+    - moments: Cached annualized moments of the returns, recomputed only when the returns change.
+    - validate_returns_empyrical: Annualized return and Sharpe ratio of each ticker (see analytics.performance_summary).
     - optimize_slsqp: Optimizes the objective function using the SLSQP method.
     - optimize_montecarlo: Optimizes the objective function using the Montecarlo method.
     - optimize_cobyla: Optimizes the objective function using the COBYLA method.
+    - optimize_qp: Optimizes variance-type strategies with the exact box-constrained QP solver.
+    - optimize_lp: Optimizes CVaR with the Rockafellar-Uryasev linear program.
+    - optimize_montecarlo_batch: Optimizes the objective function by scoring thousands of random portfolios at once.
+    - optimize_montecarlo_parallel: Optimizes the objective function with one Optuna study shared by several processes.
+    - optimize_slsqp_multistart: Optimizes the objective function with SLSQP from several starting points in parallel.
+    - batch_objective: Evaluates the selected strategy's objective for a whole matrix of weights.
     - minimum_variance: Calculates the portfolio with the minimum variance.
     - omega_ratio: Calculates the portfolio with the Omega ratio.
     - semivariance: Calculates the portfolio with the Semivariance.
     - roy_safety_first_ratio: Calculates the portfolio with the Roy Safety First Ratio.
     - cvar: Calculates the portfolio with the CVaR (Conditional Value at Risk).
+    - set_black_litterman_views: Sets the views (P, Q, Omega, tau) used by the Black-Litterman strategy.
     - sortino_ratio: Calculates the portfolio with the Sortino ratio.
-    - optimize: Executes the selected optimization strategy and model.
+    - factor_model / fama_french_factor_model: Fama-French factor model of the window and the Sharpe ratio under it.
+    - cache_key: Content hash of the current problem, used by the weights cache.
+    - optimize: Executes the selected optimization strategy and model, or reuses the cached solution of the same problem.
+    - reuse_or_solve: Cache lookup around solve, without the instrumentation.
+    - solve: Executes the selected optimization strategy and model.
     """
 
-    def __init__(self, tickers=None, benchmark_ticker='SPY', rf=None, lower_bound=0.10, higher_bound=0.99, start_date=None, end_date=None):
+    def __init__(self, tickers=None, benchmark_ticker='SPY', rf=None, lower_bound=0.10, higher_bound=0.99, start_date=None, end_date=None, price_store=None,
+                 data=None, benchmark_data=None, ff_data=None, covariance_estimator='Sample', initial_weights=None, weights_cache=None,
+                 factor_store=None, factor_datasets=('3-factor',)):
         """
         Initializes the QAA class.
 
@@ -229,6 +354,15 @@ class QAA:
         - higher_bound (float, optional): Higher bound for asset weights. Defaults to 0.99.
         - start_date (str, optional): Start date for data retrieval. Defaults to None.
         - end_date (str, optional): End date for data retrieval. Defaults to None.
+        - price_store (PriceStore, optional): Local price store; only the missing date ranges are downloaded. None uses the process default (see data_store.py) and False downloads the prices. Defaults to None.
+        - data (pd.DataFrame, optional): Preloaded asset prices; skips the download when given. Defaults to None.
+        - benchmark_data (pd.Series, optional): Preloaded benchmark prices, used together with data. Defaults to None.
+        - ff_data (pd.DataFrame, optional): Preloaded Fama-French daily factors; skips the download when given. Defaults to None.
+        - covariance_estimator (str, optional): 'Sample', 'Ledoit-Wolf', 'OAS', 'Constant Correlation' or 'Factor Model'. Defaults to 'Sample'.
+        - initial_weights (np.ndarray, optional): Warm-start weights for SLSQP, COBYLA, QP and Monte Carlo. Defaults to equal weights.
+        - weights_cache (WeightsCache, optional): Cache of optimal weights; None uses the process default (see weights_cache.py) and False disables it. Defaults to None.
+        - factor_store (FactorStore, optional): Local Fama-French store; None uses the process default (see data_store.py) and False downloads the factors. Defaults to None.
+        - factor_datasets (tuple, optional): Factor datasets to load: '3-factor', '5-factor' and/or 'momentum'. Defaults to ('3-factor',).
         """
         self.tickers = tickers
         self.benchmark_ticker = benchmark_ticker
@@ -237,13 +371,28 @@ class QAA:
         self.higher_bound = higher_bound
         self.start_date = start_date
         self.end_date = end_date
-        self.data, self.benchmark_data = self.load_data()
-        self.returns = self.calculate_returns()
-        self.benchmark_returns = self.calculate_benchmark_returns()
+        self.price_store = price_store
+        self.covariance_estimator = covariance_estimator
+        self._moments = None
+        self._black_litterman_model = None
+        self.black_litterman_views = {}
+
+        # Data, returns and factors are loaded lazily on first access (see the LAZY DATA section)
+        self._data, self._benchmark_data = data, benchmark_data
+        self._returns, self._benchmark_returns = None, None
+        self._ff_data, self._ff_returns = ff_data, None
+        self.factor_store = factor_store
+        self.factor_datasets = tuple(factor_datasets)
+
+        self.initial_weights = initial_weights
         self.optimal_weights = None
+        self.optimization_result = None
+        self.weights_cache = weights_cache
+        self.stats = None
+        self.frontier_cloud = None
         self.optimization_strategy = None
         self.optimization_model = None
-        self.ff_data, self.ff_returns = self.load_ff_data()
+        self.routed_model = None
 
     def calculate_benchmark_returns(self):
         """Calculates daily returns for the benchmark asset."""
@@ -253,17 +402,61 @@ class QAA:
             raise ValueError("Benchmark data not found.")
 
     def set_optimization_strategy(self, strategy):
-        """Sets the optimization strategy."""
-        self.optimization_strategy = strategy
+        """Sets the optimization strategy; aliases such as 'Hierarchical Risk Parity' are stored by their registry name."""
+        self.optimization_strategy = canonical_strategy(strategy)
 
     def set_optimization_model(self, model):
         """Sets the optimization model."""
         self.optimization_model = model
+
+    def strategy_spec(self):
+        """Registry entry of the selected strategy (see strategies.py)."""
+        return get_strategy(self.optimization_strategy)
+
+    def strategy_objective(self):
+        """Objective of the selected strategy, to be minimized."""
+        spec = self.strategy_spec()
+        if spec.objective is None:
+            raise ValueError(f"The {spec.name} strategy has no objective function.")
+        return spec.objective(self)
+
+    def prepare_inputs(self):
+        """
+        Computes the inputs the selected strategy reads before any solver runs.
+
+        The moment cache is always built (mean, covariance, correlation, downside deviations and, with benchmark
+        prices, the semivariance matrix, in one pass over the returns). Past it, the Fama-French factors are only
+        loaded for strategies that declare them, the factor model is only fitted for the factor-model strategy and
+        the Black-Litterman posterior is only built for the views strategy.
+        """
+        spec = self.strategy_spec()
+        if 'benchmark' in spec.inputs and self.benchmark_data is None:
+            raise ValueError(f"The {spec.name} strategy needs the benchmark prices.")
+        self.moments
+        if 'factors' in spec.inputs:
+            self.factor_risk_free_rate()
+        if 'factor_model' in spec.inputs:
+            self.factor_model()
+        if 'views' in spec.inputs:
+            self.black_litterman_model
+        return spec
+
+    def starting_weights(self):
+        """Initial point of the iterative solvers: the warm-start weights projected onto the bounds, or equal weights."""
+        n_assets = len(self.tickers)
+        if self.initial_weights is not None and len(self.initial_weights) == n_assets:
+            return project_capped_simplex(np.asarray(self.initial_weights, dtype=float), self.lower_bound, self.higher_bound)
+        return np.ones(n_assets) / n_assets
+
+    def set_covariance_estimator(self, estimator):
+        """Sets the covariance estimator and drops the moments estimated with the previous one."""
+        self.covariance_estimator = estimator
+        self.invalidate_moments()
         
     def calculate_portfolio_return(self):
         """Calculates the expected portfolio return based on current optimal weights."""
         if self.optimal_weights is not None and self.returns is not None:
-            portfolio_return = np.dot(self.optimal_weights, self.returns.mean()) * 252  # annualizing the return
+            portfolio_return = np.dot(self.optimal_weights, self.moments['mean_annual'])  # annualizing the return
             return portfolio_return
         else:
             return 0  # Return 0 or handle appropriately if weights or returns are not defined
@@ -272,7 +465,7 @@ class QAA:
     def calculate_portfolio_volatility(self):
         """Calculates the portfolio volatility based on current optimal weights."""
         if self.optimal_weights is not None and self.returns is not None:
-            return np.sqrt(np.dot(self.optimal_weights.T, np.dot(self.returns.cov() * 252, self.optimal_weights)))  # annualized volatility
+            return np.sqrt(self.portfolio_variance(self.optimal_weights))  # annualized volatility
         return None
     
     def calculate_portfolio_metrics(qaa_instance):
@@ -286,82 +479,288 @@ class QAA:
 
 
     def load_data(self):
-        """Loads historical data for the assets and benchmark."""
+        """Loads historical data for the assets and benchmark and keeps it on the instance."""
         if not self.tickers or self.benchmark_ticker is None:
             raise ValueError("You must provide a list of tickers and a benchmark ticker.")
         tickers_with_benchmark = self.tickers + [self.benchmark_ticker] if self.benchmark_ticker not in self.tickers else self.tickers
-        data = yf.download(tickers_with_benchmark, start=self.start_date, end=self.end_date)['Adj Close']
+        store = get_default_price_store() if self.price_store is None else self.price_store
+        with phase('download_prices'):
+            if store:
+                data = store.load(tickers_with_benchmark, start=self.start_date, end=self.end_date)
+            else:
+                import yfinance as yf
+                data = yf.download(tickers_with_benchmark, start=self.start_date, end=self.end_date)['Adj Close']
+                count('downloaded_values', int(data.size))
         benchmark_data = data.pop(self.benchmark_ticker) if self.benchmark_ticker in data else None
+        self.data, self.benchmark_data = data, benchmark_data
         return data, benchmark_data
     
     def load_ff_data(self):
-        ff_data = web.DataReader('F-F_Research_Data_Factors_daily', 'famafrench', start=self.start_date, end=self.end_date)[0]
-        ff_returns = ff_data[['Mkt-RF', 'SMB', 'HML']].loc[self.returns.index]
+        """Loads the Fama-French daily factors of factor_datasets from the factor store, or downloads them."""
+        store = get_default_factor_store() if self.factor_store is None else self.factor_store
+        with phase('load_ff_data'):
+            if store:
+                ff_data = store.load(self.factor_datasets, start=self.start_date, end=self.end_date)
+            else:
+                provider = FamaFrenchProvider()
+                ff_data = join_factor_datasets([provider.fetch(dataset, self.start_date, self.end_date) for dataset in self.factor_datasets])
+                count('downloaded_values', int(ff_data.size))
+        ff_returns = self.align_ff_returns(ff_data)
         return ff_data, ff_returns
 
+    def align_ff_returns(self, ff_data):
+        """Selects every Fama-French factor but RF on the dates of the asset returns (zero on dates without factors)."""
+        return align_factors(ff_data.drop(columns='RF', errors='ignore'), self.returns.index)
+
     def calculate_returns(self):
         """Calculates daily returns for the assets."""
         return self.data.pct_change().dropna()
 
-    def validate_returns_empyrical(self):
-        """Validates the returns of each ticker using empyrical."""
-        results = {}
+    # ----------------------------------------------------------------------------------------------------
 
-        for ticker in self.tickers:
-            # Assuming self.data already has the adjusted closing prices of each ticker
-            prices = self.data[ticker]
+    # LAZY DATA
+    @property
+    def data(self):
+        """Prices of the assets, downloaded on first access."""
+        if self._data is None:
+            self.load_data()
+        return self._data
+
+    @data.setter
+    def data(self, data):
+        self._data = data
+        self._returns, self._ff_returns = None, None
+        self.invalidate_moments()
+
+    @property
+    def benchmark_data(self):
+        """Prices of the benchmark, downloaded together with the assets on first access."""
+        if self._data is None:
+            self.load_data()
+        return self._benchmark_data
+
+    @benchmark_data.setter
+    def benchmark_data(self, benchmark_data):
+        self._benchmark_data = benchmark_data
+        self._benchmark_returns = None
+        self.invalidate_moments()
+
+    @property
+    def returns(self):
+        """Daily returns of the assets, calculated on first access."""
+        if self._returns is None:
+            with phase('returns'):
+                self._returns = self.calculate_returns()
+        return self._returns
+
+    @returns.setter
+    def returns(self, returns):
+        self._returns = returns
+        self._ff_returns = None
+        self.invalidate_moments()
+
+    @property
+    def benchmark_returns(self):
+        """Daily returns of the benchmark, calculated on first access."""
+        if self._benchmark_returns is None:
+            self._benchmark_returns = self.calculate_benchmark_returns()
+        return self._benchmark_returns
+
+    @benchmark_returns.setter
+    def benchmark_returns(self, benchmark_returns):
+        self._benchmark_returns = benchmark_returns
+        self.invalidate_moments()
+
+    @property
+    def ff_data(self):
+        """Fama-French daily factors, downloaded the first time a strategy needs them."""
+        if self._ff_data is None:
+            self._ff_data, self._ff_returns = self.load_ff_data()
+        return self._ff_data
+
+    @ff_data.setter
+    def ff_data(self, ff_data):
+        self._ff_data, self._ff_returns = ff_data, None
+        if self._moments is not None:
+            self._moments.pop('ff_rf', None)
+            self._moments.pop('factor_model', None)
+
+    @property
+    def ff_returns(self):
+        """Fama-French factor returns on the dates of the asset returns."""
+        if self._ff_returns is None:
+            self._ff_returns = self.align_ff_returns(self.ff_data)
+        return self._ff_returns
+
+    @ff_returns.setter
+    def ff_returns(self, ff_returns):
+        self._ff_returns = ff_returns
 
-            # Calculate daily returns
-            daily_returns = prices.pct_change().dropna()
+    # ----------------------------------------------------------------------------------------------------
+
+    # MOMENT CACHE
+
+    def invalidate_moments(self):
+        """Drops the cached moments so they are recomputed from the current returns on next use."""
+        self._moments = None
+        self._black_litterman_model = None
 
-            # Calculate annualized return and Sharpe ratio
-            annualized_return = empyrical.annual_return(daily_returns)
-            sharpe_ratio = empyrical.sharpe_ratio(daily_returns, risk_free=self.rf / 252)
+    @property
+    def moments(self):
+        """
+        Moments of the current returns window as NumPy arrays, computed once and reused by every strategy.
+
+        Keys:
+        - returns: Daily returns matrix (T x N).
+        - mean / cov: Daily mean vector and covariance matrix, from the selected covariance estimator.
+        - mean_annual / cov_annual: Annualized (252 days) mean vector and covariance matrix.
+        - corr: Correlation matrix.
+        - downside_std: Standard deviation of the returns with gains set to zero.
+        - cov_model: Low-rank FactorCovariance behind cov with the 'Factor Model' estimator, None otherwise.
+        - semivariance: Semivariance matrix against the benchmark (None without benchmark returns).
+        - benchmark_mean: Daily mean return of the benchmark (None without benchmark returns).
+        - ff_rf: Mean Fama-French risk-free rate, added by factor_risk_free_rate() the first time it is needed.
+        - factor_model: Fitted Fama-French factor model of the window, added by factor_model() the first time it is needed.
+        """
+        if self._moments is None:
+            with phase('moments'):
+                self._moments = self.calculate_moments()
+        return self._moments
+
+    def calculate_moments(self):
+        """Calculates the moments exposed by the moments property."""
+        returns = self.returns.to_numpy(dtype=float)
+        mean = returns.mean(axis=0)
+        cov = np.atleast_2d(np.cov(returns, rowvar=False))
+        std = np.sqrt(np.diag(cov))
+        corr = cov / np.outer(std, std)
+        downside_std = np.minimum(returns, 0).std(axis=0, ddof=1)
+
+        semivariance, benchmark_mean = None, None
+        benchmark_returns = self.benchmark_returns if self.benchmark_data is not None else None
+        if benchmark_returns is not None:
+            diff = self.returns.subtract(benchmark_returns, axis=0).to_numpy(dtype=float)
+            downside_risk = pd.DataFrame(np.minimum(diff, 0)).std().to_numpy()
+            semivariance = np.outer(downside_risk, downside_risk) * corr * 100
+            benchmark_mean = float(benchmark_returns.mean())
+
+        return self.apply_covariance_estimator({
+            'returns': returns,
+            'mean': mean,
+            'cov': cov,
+            'mean_annual': mean * 252,
+            'cov_annual': cov * 252,
+            'corr': corr,
+            'downside_std': downside_std,
+            'semivariance': semivariance,
+            'benchmark_mean': benchmark_mean,
+        })
+
+    def apply_covariance_estimator(self, moments):
+        """
+        Replaces the sample covariance of a moments dict with the selected estimator.
 
-            # Store the results
-            results[ticker] = {
-                'Annualized Return': annualized_return,
-                'Sharpe Ratio': sharpe_ratio
+        The semivariance matrix keeps the sample correlation it was built with.
+
+        Parameters:
+        - moments (dict): Moments with the sample covariance, as calculated by calculate_moments.
+
+        Returns:
+        - dict: The same dict with cov, cov_annual, corr and cov_model updated.
+        """
+        moments['cov_model'] = None
+        if self.covariance_estimator == 'Sample':
+            return moments
+
+        factors = self.ff_returns.to_numpy(dtype=float) / 100 if self.covariance_estimator == 'Factor Model' else None
+        cov, cov_model = estimate_covariance(moments['returns'], self.covariance_estimator, sample_cov=moments['cov'], factors=factors)
+        std = np.sqrt(np.diag(cov))
+        moments.update({'cov': cov, 'cov_annual': cov * 252, 'corr': cov / np.outer(std, std), 'cov_model': cov_model})
+        return moments
+
+    def covariance_dot(self, weights, annual=True):
+        """Covariance matrix times the weights; O(NK) with the 'Factor Model' estimator."""
+        moments = self.moments
+        if moments.get('cov_model') is not None:
+            return moments['cov_model'].dot(weights) * (252 if annual else 1)
+        return np.dot(moments['cov_annual' if annual else 'cov'], weights)
+
+    def portfolio_variance(self, weights, annual=True):
+        """
+        Portfolio variance of a weight vector, or of every row of a (K x N) weight matrix.
+
+        Quadratic forms use the low-rank factor model in O(NK) when it is selected.
+        """
+        moments = self.moments
+        if moments.get('cov_model') is not None:
+            return moments['cov_model'].quadratic(weights) * (252 if annual else 1)
+        cov = moments['cov_annual' if annual else 'cov']
+        if np.ndim(weights) == 2:
+            return np.einsum('kn,nm,km->k', weights, cov, weights)
+        return np.dot(weights.T, np.dot(cov, weights))
+
+    def seed_moments(self, moments):
+        """
+        Uses precomputed moments, e.g. from a MomentAccumulator, instead of calculating them from the returns.
+
+        Parameters:
+        - moments (dict): Moments with the keys of calculate_moments; 'returns' is taken from the current returns when missing.
+        """
+        self._black_litterman_model = None
+        self._moments = self.apply_covariance_estimator({'returns': self.returns.to_numpy(dtype=float), **moments})
+
+    def factor_risk_free_rate(self):
+        """Mean Fama-French risk-free rate, cached with the moments; only this loads the factors."""
+        moments = self.moments
+        if 'ff_rf' not in moments:
+            moments['ff_rf'] = float(self.ff_data['RF'].mean())
+        return moments['ff_rf']
+
+    def factor_model(self):
+        """
+        Fama-French factor model of the current window, fitted once and cached with the moments.
+
+        The excess returns of every asset are regressed on the factors in one batched least squares (see
+        covariance.factor_regression). Expected excess returns are the factor premia B E[f], without the
+        intercepts, and the covariance is the low-rank B F B^T + D, so the objective costs O(NK) per evaluation.
+
+        Returns:
+        - dict: premia (daily expected excess returns, N), cov (daily FactorCovariance) and loadings (N x K).
+        """
+        moments = self.moments
+        if 'factor_model' not in moments:
+            factors = self.ff_returns.to_numpy(dtype=float) / 100
+            risk_free = align_factors(self.ff_data[['RF']], self.returns.index).to_numpy(dtype=float) / 100
+            _, loadings, specific_var = factor_regression(moments['returns'] - risk_free, factors)
+            moments['factor_model'] = {
+                'premia': loadings @ factors.mean(axis=0),
+                'cov': FactorCovariance(loadings, np.atleast_2d(np.cov(factors, rowvar=False)), specific_var),
+                'loadings': loadings,
             }
+        return moments['factor_model']
 
-        return results
+    def validate_returns_empyrical(self):
+        """Annualized return and Sharpe ratio of each ticker, scored for all the tickers at once with the definitions of empyrical."""
+        metrics = performance_summary(self.data[self.tickers], rf=self.rf or 0.)
+        return {ticker: {'Annualized Return': metrics.loc[ticker, 'cagr'], 'Sharpe Ratio': metrics.loc[ticker, 'sharpe_ratio']}
+                for ticker in self.tickers}
 # ----------------------------------------------------------------------------------------------------
 
     # OPTIMIZATION MODEL SELECTION
      # 1ST OPTIMIZE MODEL: "SLSQP"
     def optimize_slsqp(self):
         """Optimizes the objective function using the SLSQP method."""
-        if self.optimization_strategy == 'Minimum Variance':
-            objective = self.minimum_variance
-        elif self.optimization_strategy == 'Omega Ratio':
-            objective = lambda weights: -self.omega_ratio(weights, self.rf)
-        elif self.optimization_strategy == 'Semivariance':
-            objective = self.semivariance()
-        elif self.optimization_strategy == 'Roy Safety First Ratio':
-             objective = self.roy_safety_first_ratio
-        elif self.optimization_strategy == 'Sortino Ratio':
-             objective = self.sortino_ratio
-        elif self.optimization_strategy == 'Fama French':
-             objective = self.fama_french
-        elif self.optimization_strategy == 'CVaR':
-            objective = lambda weights: self.cvar(weights, alpha=0.05)
-        elif self.optimization_strategy == 'HRP':
-            hrp_instance = HierarchicalRiskParity(self.returns)
-            hrp_weights = hrp_instance.optimize_hrp()
-            self.optimization_strategy = hrp_weights
-        elif self.optimization_strategy == 'Sharpe Ratio':
-             objective = self.sharpe_ratio
-        elif self.optimization_strategy == 'Black Litterman':
-             objective = self.black_litterman
-        elif self.optimization_strategy == 'Total Return':
-             objective = self.Total_return
-        else:
-            raise ValueError("Invalid optimization strategy.")
+        objective = self.strategy_objective()
 
-        constraints = ({'type': 'eq', 'fun': lambda x: np.sum(x) - 1})
+        # Analytic gradients for the objective and the budget constraint avoid N + 1 finite-difference calls per step
+        constraints = ({'type': 'eq', 'fun': counted('constraint_calls', lambda x: np.sum(x) - 1), 'jac': lambda x: np.ones_like(x)})
         bounds = [(self.lower_bound, self.higher_bound) for _ in self.tickers]
+        gradient = self.get_gradient()
 
-        result = minimize(objective, np.ones(len(self.tickers)) / len(self.tickers), method='SLSQP', bounds=bounds, constraints=constraints)
+        result = minimize(counted('objective_calls', objective), self.starting_weights(), method='SLSQP',
+                          jac=counted('gradient_calls', gradient) if gradient is not None else None,
+                          bounds=bounds, constraints=constraints)
+        self.optimization_result = result
         self.optimal_weights = result.x if result.success else None
 # ----------------------------------------------------------------------------------------------------
 
@@ -369,6 +768,10 @@ class QAA:
 
     def optimize_montecarlo(self):
         """Optimizes the objective function using the Montecarlo method."""
+        import optuna
+        optuna.logging.set_verbosity(optuna.logging.WARNING)
+        strategy_objective = self.strategy_objective()
+
         def objective(trial):
             # Suppress specific warnings from Optuna about suggest_uniform
             with warnings.catch_warnings():
@@ -386,52 +789,24 @@ class QAA:
                 if weight < self.lower_bound:
                     penalty += 1e6 * (self.lower_bound - weight) ** 2
 
-            # Calculate the objective value based on the selected strategy, including the penalty
-            if self.optimization_strategy == 'Minimum Variance':
-                objective_value = self.minimum_variance(weights) + penalty
-            elif self.optimization_strategy == 'Omega Ratio':
-                objective_value = -self.omega_ratio(weights, self.rf) + penalty
-            elif self.optimization_strategy == 'Semivariance':
-                objective_function = self.semivariance()  # Get the lambda function
-                objective_value = objective_function(weights) + penalty  # Invoke it with the weights
-            elif self.optimization_strategy == 'Roy Safety First Ratio':
-                objective_value = self.roy_safety_first_ratio(weights) + penalty
-            elif self.optimization_strategy == 'Sortino Ratio':  
-                objective_value = self.sortino_ratio(weights) + penalty
-            elif self.optimization_strategy == 'Fama French':
-                objective_value = self.fama_french(weights) + penalty
-            elif self.optimization_strategy == 'CVaR':
-                portfolio_returns = np.dot(self.returns, weights)
-                VaR = np.percentile(portfolio_returns, 100 * 0.05)
-                CVaR = np.mean(portfolio_returns[portfolio_returns <= VaR])
-                return -CVaR + penalty  # Minimize the negative CVaR (maximize CVaR)
-                # objective_value = -self.cvar(weights, alpha=0.05) + penalty
-            elif self.optimization_strategy == 'Sharpe Ratio':
-                objective_value = self.sharpe_ratio(weights) + penalty
-            elif self.optimization_strategy == 'Hierarchical Risk Parity':
-                hrp_instance = HierarchicalRiskParity(self.returns)
-                hrp_weights = hrp_instance.optimize_hrp()
-                self.optimal_weights = hrp_weights
-                return objective_value + penalty
-            elif self.optimization_strategy == 'Black Litterman':
-                objective_value = self.black_litterman(weights) + penalty
-            elif self.optimization_strategy == 'Total Return':
-                objective_value = self.Total_return(weights) + penalty
-            else:
-                raise ValueError("Invalid optimization strategy.")
-
-            return objective_value
+            # Objective of the selected strategy, including the penalty
+            return strategy_objective(weights) + penalty
 
         # Create an Optuna study and find the optimal weights
         study = optuna.create_study(sampler=optuna.samplers.TPESampler(), direction='minimize')
+        if self.initial_weights is not None:
+            # The warm-start weights are evaluated first, so the search never ends worse than the previous optimum
+            study.enqueue_trial({f"weight_{i}": float(weight) for i, weight in enumerate(self.starting_weights())})
 
         num_trials = 500  # Adjust the number of trials as necessary
-        study.optimize(objective, n_trials=num_trials, n_jobs=-1)  # n_jobs=-1 uses all available cores
+        study.optimize(counted('objective_calls', objective), n_trials=num_trials, n_jobs=-1)  # n_jobs=-1 uses all available cores
 
         # Get and save the optimal weights
         optimal_weights = np.array([study.best_params[f"weight_{i}"] for i in range(len(self.tickers))])
         optimal_weights /= np.sum(optimal_weights)  # Normalize the weights to sum to 1
         self.optimal_weights = optimal_weights
+        self.optimization_result = OptimizeResult(x=optimal_weights, fun=study.best_value, success=True,
+                                                  nit=study.best_trial.number + 1, nfev=len(study.trials))
 
     # ----------------------------------------------------------------------------------------------------
 
@@ -439,59 +814,161 @@ class QAA:
 
     def optimize_cobyla(self):
         """Optimizes the objective function using the COBYLA method."""
-        if self.optimization_strategy == 'Minimum Variance':
-            objective = self.minimum_variance
-        elif self.optimization_strategy == 'Omega Ratio':
-            objective = lambda weights: -self.omega_ratio(weights, self.rf)
-        elif self.optimization_strategy == 'Semivariance':
-            objective = self.semivariance()
-        elif self.optimization_strategy == 'Roy Safety First Ratio':
-            objective = self.roy_safety_first_ratio
-        elif self.optimization_strategy == 'Sortino Ratio':
-             objective = self.sortino_ratio
-        elif self.optimization_strategy == 'Fama French':
-            objective = self.fama_french
-        elif self.optimization_strategy == 'CVaR':
-            objective = lambda weights: self.cvar(weights, alpha=0.05)
-        elif self.optimization_strategy == 'Sharpe Ratio':
-             objective = self.sharpe_ratio
-        elif self.optimization_strategy == 'Hierarchical Risk Parity':
-            hrp_instance = HierarchicalRiskParity(self.returns)
-            hrp_weights = hrp_instance.optimize_hrp()
-            self.optimal_weights = hrp_weights
-            objetive = self.hrp_weights
-        elif self.optimization_strategy == 'Black Litterman':
-             objective = self.black_litterman
-        elif self.optimization_strategy == 'Total Return':
-             objective = self.Total_return
-        else:
-            raise ValueError("Invalid optimization strategy.")
-
-        initial_weights = np.ones(len(self.tickers)) / len(self.tickers)
+        objective = self.strategy_objective()
+        initial_weights = self.starting_weights()
 
         # Define inequality constraints
-        constraints = [{'type': 'ineq', 'fun': lambda weights, i=i: weights[i] - 0.10} for i in range(len(self.tickers))]
+        constraints = [{'type': 'ineq', 'fun': lambda weights, i=i: weights[i] - self.lower_bound} for i in range(len(self.tickers))]
+        constraints += [{'type': 'ineq', 'fun': lambda weights, i=i: self.higher_bound - weights[i]} for i in range(len(self.tickers))]
         constraints += [{'type': 'ineq', 'fun': lambda weights: 1 - np.sum(weights)},
                         {'type': 'ineq', 'fun': lambda weights: np.sum(weights) - 0.99}]  # Ensure sum close to 1
 
-        result = minimize(objective, initial_weights, method='COBYLA', constraints=constraints, options={'maxiter': 10000, 'tol': 0.0001})
+        options = {'maxiter': 10000, 'tol': 0.0001}
+        if self.initial_weights is not None:
+            # Near the previous optimum a small initial trust region avoids re-exploring the whole simplex
+            options['rhobeg'] = 0.01
+        constraints = [{**constraint, 'fun': counted('constraint_calls', constraint['fun'])} for constraint in constraints]
+        result = minimize(counted('objective_calls', objective), initial_weights, method='COBYLA', constraints=constraints, options=options)
+        self.optimization_result = result
         if result.success:
             self.optimal_weights = result.x / np.sum(result.x)
         else:
             self.optimal_weights = None
     # ----------------------------------------------------------------------------------------------------  
 
+     # 4TH OPTIMIZE MODEL: "QP"
+
+    def optimize_qp(self):
+        """Optimizes the strategies that register a quadratic program (see strategies.py) exactly."""
+        spec = self.strategy_spec()
+        if spec.qp is None:
+            raise ValueError(f"The QP model does not support the {spec.name} strategy.")
+        # Warm start from the given weights or from the previous solution of this instance, if any
+        initial_weights = self.initial_weights if self.initial_weights is not None else self.optimal_weights
+
+        quadratic, linear = spec.qp(self)
+        if spec.frontier:
+            # Each inner step is a mean-variance QP along the bounded efficient frontier
+            objective = self.strategy_objective()
+            result = maximize_ratio_on_frontier(quadratic, linear, lambda weights: -objective(weights), self.lower_bound, self.higher_bound,
+                                                initial_weights)
+        else:
+            result = solve_box_qp(quadratic, linear, self.lower_bound, self.higher_bound, initial_weights)
+
+        self.optimization_result = result
+        self.optimal_weights = result.x if result.success else None
+    # ----------------------------------------------------------------------------------------------------  
+
+     # 5TH OPTIMIZE MODEL: "LP"
+
+    def optimize_lp(self, alpha=0.05):
+        """Optimizes CVaR as a linear program over the historical scenarios."""
+        spec = self.strategy_spec()
+        if 'LP' not in spec.exact_models:
+            raise ValueError(f"The LP model does not support the {spec.name} strategy.")
+
+        result = solve_cvar_lp(self.moments['returns'], alpha, self.lower_bound, self.higher_bound)
+        self.optimization_result = result
+        self.optimal_weights = result.x if result.success else None
+    # ----------------------------------------------------------------------------------------------------  
+
+     # 6TH OPTIMIZE MODEL: "MONTE CARLO BATCH"
+
+    def optimize_montecarlo_batch(self, n_samples=10000, keep_cloud=False, seed=None, chunk_size=2000):
+        """
+        Optimizes the objective function by random search over Dirichlet-sampled portfolios scored in batch.
+
+        Parameters:
+        - n_samples (int, optional): Number of random portfolios. Defaults to 10000.
+        - keep_cloud (bool, optional): Stores every sampled portfolio with its return, volatility and objective in frontier_cloud. Defaults to False.
+        - seed (int, optional): Seed for the random generator. Defaults to None.
+        - chunk_size (int, optional): Portfolios scored per matrix product, bounding memory to T x chunk_size. Defaults to 2000.
+        """
+        if self.strategy_spec().closed_form:
+            self.optimal_weights = self.optimize_hrp()
+            return
+
+        weights = sample_bounded_simplex(n_samples, len(self.tickers), self.lower_bound, self.higher_bound, seed)
+        values = np.concatenate([self.batch_objective(weights[start:start + chunk_size])
+                                 for start in range(0, n_samples, chunk_size)])
+        values = np.where(np.isnan(values), np.inf, values)
+        count('objective_calls', n_samples)
+
+        self.optimal_weights = weights[np.argmin(values)]
+        self.optimization_result = OptimizeResult(x=self.optimal_weights, fun=values.min(), success=True, nit=1, nfev=n_samples)
+        if keep_cloud:
+            self.frontier_cloud = pd.DataFrame(weights, columns=self.returns.columns)
+            self.frontier_cloud['return'] = weights.dot(self.moments['mean_annual'])
+            self.frontier_cloud['volatility'] = np.sqrt(self.portfolio_variance(weights))
+            self.frontier_cloud['objective'] = values
+    # ----------------------------------------------------------------------------------------------------  
+
+     # 7TH OPTIMIZE MODEL: "MONTE CARLO PARALLEL (optuna over processes)"
+
+    def optimize_montecarlo_parallel(self, n_trials=500, n_workers=None, parameterization='stick-breaking', seed=None):
+        """
+        Optimizes the objective function with one Optuna study run by several processes over a shared journal file.
+
+        Unlike optimize_montecarlo, whose n_jobs=-1 only adds threads, every worker is a process, and each trial is a
+        point of the bounded simplex (stick-breaking or softmax, projected onto the bounds) instead of normalized
+        free weights with a penalty. See parallel.run_parallel_study.
+
+        Parameters:
+        - n_trials (int, optional): Trial budget shared by all the workers. Defaults to 500.
+        - n_workers (int, optional): Worker processes. Defaults to the number of cores.
+        - parameterization (str, optional): 'stick-breaking' or 'softmax'. Defaults to 'stick-breaking'.
+        - seed (int, optional): Seed of the samplers. Defaults to None.
+        """
+        if self.strategy_spec().closed_form:
+            self.optimal_weights = self.optimize_hrp()
+            return
+
+        from parallel import run_parallel_study
+        result = run_parallel_study(self, n_trials, n_workers, parameterization, seed)
+        count('objective_calls', result.nfev)
+        self.optimization_result = result
+        self.optimal_weights = result.x
+    # ----------------------------------------------------------------------------------------------------  
+
+     # 8TH OPTIMIZE MODEL: "SLSQP MULTI-START"
+
+    def optimize_slsqp_multistart(self, n_starts=8, n_workers=None, agreement=3, seed=None):
+        """
+        Optimizes the objective function with SLSQP from several diverse starting points on a process pool.
+
+        Ratio objectives (Omega, Sortino, Sharpe, Total Return) are not convex under the bounds, so a single start can
+        stop at a poor local optimum or fail. The warm-start weights, equal weights, corners and Dirichlet draws are
+        solved in parallel and the best converged solution is kept; the search ends once `agreement` starts reach the
+        same optimum. See parallel.run_multistart_slsqp.
+
+        Parameters:
+        - n_starts (int, optional): Maximum number of starting points. Defaults to 8.
+        - n_workers (int, optional): Worker processes. Defaults to the number of cores.
+        - agreement (int, optional): Starts at the same optimum that stop the search. Defaults to 3.
+        - seed (int, optional): Seed of the Dirichlet starting points. Defaults to None.
+        """
+        if self.strategy_spec().closed_form:
+            self.optimal_weights = self.optimize_hrp()
+            return
+
+        from parallel import run_multistart_slsqp
+        result = run_multistart_slsqp(self, n_starts, n_workers, agreement, seed=seed)
+        count('objective_calls', result.nfev)
+        self.optimization_result = result
+        self.optimal_weights = result.x if result.success else None
+    # ----------------------------------------------------------------------------------------------------  
+
     # 1ST QAA STRATEGY: "MIN VARIANCE"
     def minimum_variance(self, weights):
         """Minimum variance strategy."""
-        return np.dot(weights.T, np.dot(self.returns.cov() * 252, weights))
+        return self.portfolio_variance(weights)
     
     # ----------------------------------------------------------------------------------------------------  
 
     # 2ND QAA STRATEGY: "OMEGA"
     def omega_ratio(self, weights, threshold=0.0):
         """Strategy based on the Omega Ratio."""
-        portfolio_returns = np.dot(self.returns, weights)
+        portfolio_returns = np.dot(self.moments['returns'], weights)
         excess_returns = portfolio_returns - threshold
 
         gain = np.sum(excess_returns[excess_returns > 0])
@@ -504,16 +981,8 @@ class QAA:
 
     # 3RD QAA STRATEGY: "SEMIVARIANCE"
     def semivariance(self):
-        diff = self.returns.subtract(self.benchmark_returns, axis=0)
-        negative_diff = diff.copy()
-        negative_diff[negative_diff > 0] = 0
-        downside_risk = negative_diff.std()
-
-        downside_risk_df = downside_risk.to_frame()
-        downside_risk_transposed = downside_risk_df.T
-        mmult = np.dot(downside_risk_df, downside_risk_transposed)
-        correlation = self.returns.corr()
-        semi_var_matrix = (mmult * correlation) * 100
+        # Downside risk against the benchmark times the correlation matrix, taken from the moment cache
+        semi_var_matrix = self.moments['semivariance']
 
         # Define the objective function to minimize the total semivariance of the portfolio
         semivariance = lambda w: np.dot(w.T, np.dot(semi_var_matrix, w))
@@ -522,70 +991,55 @@ class QAA:
     # ----------------------------------------------------------------------------------------------------  
 
     # 4TH QAA STRATEGY: "Black Litterman"
-    def black_litterman(self, weights, expected_returns=None, opinions_p=None, tau=0.025):
-        # Asumir retornos históricos incrementados si no se especifican retornos esperados
-        if expected_returns is None:
-            expected_returns = self.returns.mean() * 1.05
-
-        # Utilizar una matriz de identidad si no se proporcionan opiniones específicas
-        if opinions_p is None:
-            opinions_p = np.eye(self.returns.shape[1])  # Asegurar que tiene la misma dimensión que el número de activos
-
-        # Convertir expected_returns a un array numpy si aún no lo es
-        expected_returns = np.array(expected_returns)
-
-        # Asegurarse de que las dimensiones son compatibles
-        if expected_returns.shape[0] != opinions_p.shape[1]:
-            raise ValueError("Dimension mismatch between 'expected_returns' and the number of columns in 'opinions_p'.")
-
-        # Calcular Omega y otros parámetros necesarios
-        Omega = np.diag(np.full(opinions_p.shape[0], 0.1))  # Matriz diagonal para la incertidumbre en las opiniones
+    def set_black_litterman_views(self, opinions_p=None, opinions_q=None, omega=None, tau=0.025):
+        """
+        Sets the views used by the Black-Litterman strategy.
 
-        # Datos de entrada
-        cov = self.returns.cov().values  # Convertir a numpy array si es necesario
-        tau_cov = tau * cov
+        Parameters:
+        - opinions_p (np.ndarray, optional): Pick matrix of the views (K x N). Defaults to one absolute view per asset.
+        - opinions_q (np.ndarray, optional): Expected daily returns of the views (K). Defaults to the historical mean increased by 5%.
+        - omega (np.ndarray, optional): Uncertainty matrix of the views (K x K). Defaults to 0.1 on the diagonal.
+        - tau (float, optional): Scaling of the prior covariance. Defaults to 0.025.
+        """
+        self.black_litterman_views = {'opinions_p': opinions_p, 'opinions_q': opinions_q, 'omega': omega, 'tau': tau}
+        self._black_litterman_model = None
 
-        # Calculando la inversa necesaria para el modelo
-        inv = np.linalg.inv(opinions_p.dot(tau_cov).dot(opinions_p.T) + Omega)
-        
-        # Ajustar returns.mean() a un vector fila
-        mean_returns = self.returns.mean().values.reshape(-1, 1)  # Reshape para asegurar dimensiones correctas
+    @property
+    def black_litterman_model(self):
+        """Black-Litterman model of the current window and views, with its posterior computed once."""
+        if self._black_litterman_model is None:
+            self._black_litterman_model = BlackLitterman(self.moments['mean'], self.moments['cov'], **self.black_litterman_views)
+        return self._black_litterman_model
 
-        # Calcular posterior_mu según Black-Litterman
-        adjusted_returns = expected_returns.reshape(-1, 1) - opinions_p.dot(mean_returns)
-        posterior_mu = mean_returns.flatten() + tau_cov.dot(opinions_p.T).dot(inv).dot(adjusted_returns).flatten()
+    def black_litterman(self, weights, expected_returns=None, opinions_p=None, tau=0.025):
+        # Usar el modelo precalculado salvo que se pidan opiniones distintas para esta evaluación
+        if expected_returns is None and opinions_p is None and tau == 0.025:
+            model = self.black_litterman_model
+        else:
+            model = BlackLitterman(self.moments['mean'], self.moments['cov'], opinions_p=opinions_p, opinions_q=expected_returns, tau=tau)
 
         # Asegurar que posterior_mu tiene las dimensiones correctas para el cálculo final
-        if posterior_mu.shape[0] != weights.shape[0]:
+        if model.posterior_mu.shape[0] != weights.shape[0]:
             raise ValueError("Dimension mismatch in final calculation.")
 
-        posterior_cov = cov + tau_cov - tau_cov.dot(opinions_p.T).dot(inv).dot(opinions_p).dot(tau_cov)
-
         # Función objetivo
-        objective_function = -weights.dot(posterior_mu) + 0.5 * tau * weights.dot(posterior_cov).dot(weights)
-
-        return objective_function
-
-
-
+        return model.objective(weights)
 
     # ----------------------------------------------------------------------------------------------------
 
     # 5TH QAA STRATEGY: "ROY SAFETY FIRST RATIO"
     def roy_safety_first_ratio(self, weights):
         """Roy's Safety-First Ratio strategy."""
-        expected_return = np.dot(self.returns.mean() * 252, weights)
-        volatility = np.sqrt(np.dot(weights.T, np.dot(self.returns.cov() * 252, weights)))
+        expected_return = np.dot(self.moments['mean_annual'], weights)
+        volatility = np.sqrt(self.portfolio_variance(weights))
         return -(expected_return - self.rf) / volatility
 
     # ----------------------------------------------------------------------------------------------------  
 
     # 6TH QAA STRATEGY: "SORTINO RATIO"
     def sortino_ratio(self, weights):
-        portfolio_return = np.sum(self.returns.mean() * weights) * 252
-        downside_returns = self.returns.copy()
-        downside_returns[downside_returns > 0] = 0
-        downside_std = np.sqrt(np.sum((downside_returns.std() * weights)**2) * 252)
+        portfolio_return = np.sum(self.moments['mean'] * weights) * 252
+        downside_std = np.sqrt(np.sum((self.moments['downside_std'] * weights)**2) * 252)
         sortino_ratio = (portfolio_return - self.rf) / downside_std
         return -sortino_ratio  
 
@@ -593,13 +1047,10 @@ class QAA:
     # 7TH QAA STRATEGY: "FAMA FRENCH"
     def fama_french(self, weights):
         """Optimizes the objective function using Fama-French factors."""
-        all_returns = pd.concat([self.returns, self.ff_returns], axis=1)
-        risk_free_rate = self.ff_data['RF'].mean()
-        ff_weights = np.append(weights, np.zeros(3))  
-        portfolio_returns = np.dot(all_returns, ff_weights)
-        ff_covariance = np.cov(all_returns.T)
-        portfolio_volatility = np.sqrt(np.dot(ff_weights.T, np.dot(ff_covariance, ff_weights)))
-        ff_ratio = (portfolio_returns.mean() * 252 - risk_free_rate) / portfolio_volatility
+        # The factor legs carry zero weight, so only the asset block of the joint moments contributes
+        risk_free_rate = self.factor_risk_free_rate()
+        portfolio_volatility = np.sqrt(self.portfolio_variance(weights, annual=False))
+        ff_ratio = (np.dot(self.moments['mean'], weights) * 252 - risk_free_rate) / portfolio_volatility
         return -ff_ratio
     
     # ---------------------------------------------------------------------------------------------------- 
@@ -607,7 +1058,7 @@ class QAA:
     # 8TH QAA STRATEGY: "CVAR"
     def cvar(self, weights, alpha=0.05):
         """CVaR (Conditional Value at Risk) strategy."""
-        portfolio_returns = np.dot(self.returns, weights)
+        portfolio_returns = np.dot(self.moments['returns'], weights)
         VaR = np.percentile(portfolio_returns, alpha * 100)
         CVaR = portfolio_returns[portfolio_returns <= VaR].mean()
         return -CVaR  # Negative because we want to minimize CVaR
@@ -618,7 +1069,7 @@ class QAA:
     # 9TH QAA STRATEGY: "HIERARCHICAL RISK PARITY"
     def optimize_hrp(self):
         """Optimizes using HRP."""
-        hrp = HierarchicalRiskParity(self.returns)
+        hrp = HierarchicalRiskParity(self.returns, cov=self.moments['cov'], corr=self.moments['corr'])
         hrp_weights = hrp.optimize_hrp()
         return hrp_weights
     # ----------------------------------------------------------------------------------------------------  
@@ -626,11 +1077,15 @@ class QAA:
     # 10TH QAA STRATEGY: "SHARPE RATIO"
     def sharpe_ratio(self,weights):
         """Strategy based on the Sortino Ratio."""
-        portfolio_return = np.sum(self.returns.mean() * weights)
-        portfolio_volatility = np.sqrt(np.dot(weights.T, np.dot(self.returns.cov() * 252, weights)))
-        sharpe_ratio = (portfolio_return - self.rf/100) * 252 / portfolio_volatility
+        portfolio_return = np.sum(self.moments['mean'] * weights)
+        portfolio_volatility = np.sqrt(self.portfolio_variance(weights))
+        sharpe_ratio = self.sharpe_excess(portfolio_return) * 252 / portfolio_volatility
         return -sharpe_ratio
 
+    def sharpe_excess(self, daily_return):
+        """Daily return in excess of rf as the Sharpe strategy measures it; shared by its objective, gradient, batch and QP forms."""
+        return daily_return - self.rf / 100
+
 
     # ----------------------------------------------------------------------------------------------------  
 
@@ -646,65 +1101,333 @@ class QAA:
             Returns:
             - float: Valor de los pesos de Total Return AA.
             """
-            # Calcula los rendimientos del portafolio
-            portfolio_returns = np.dot(self.returns, weights)
-
             # Calcula la volatilidad del portafolio
-            portfolio_volatility = np.sqrt(np.dot(weights.T, np.dot(self.returns.cov() * 252, weights)))
+            portfolio_volatility = np.sqrt(self.portfolio_variance(weights))
 
             # Calcula el rendimiento esperado de la cartera (tau)
-            portfolio_expected_return = np.dot(weights, self.returns.mean())
+            portfolio_expected_return = np.dot(weights, self.moments['mean'])
 
             rf = self.rf
-            benchmark_returns = self.benchmark_returns.mean()
+            benchmark_returns = self.moments['benchmark_mean']
 
             # Calcula el ratio de Sharpe modificado utilizando la fórmula
-            objective_function = (np.dot(weights, self.returns.mean()) - rf) / (
-                        benchmark_returns - rf + lambda_a * np.sqrt(
-                    np.dot(weights.T, np.dot(self.returns.cov() * 252, weights))))
+            objective_function = (portfolio_expected_return - rf) / (
+                        benchmark_returns - rf + lambda_a * portfolio_volatility)
 
             return objective_function
 
     # ----------------------------------------------------------------------------------------------------
 
+    # 12TH QAA STRATEGY: "FAMA FRENCH FACTOR MODEL"
+    def fama_french_factor_model(self, weights):
+        """Negative Sharpe ratio of the portfolio under the fitted Fama-French factor model."""
+        model = self.factor_model()
+        excess_return = np.dot(model['premia'], weights) * 252
+        return -excess_return / np.sqrt(model['cov'].quadratic(weights) * 252)
+
+    # ----------------------------------------------------------------------------------------------------
+
+    # ANALYTIC GRADIENTS
+    def minimum_variance_gradient(self, weights):
+        """Gradient of the minimum variance objective."""
+        return 2 * self.covariance_dot(weights)
+
+    def omega_ratio_gradient(self, weights, threshold=0.0):
+        """Smoothed surrogate gradient of the negative Omega ratio (softplus gains and losses)."""
+        returns = self.moments['returns']
+        excess_returns = np.dot(returns, weights) - threshold
+        gain = np.sum(excess_returns[excess_returns > 0])
+        loss = -np.sum(excess_returns[excess_returns < 0])
+        if loss == 0:
+            return np.zeros_like(weights)
+        bandwidth = max(0.05 * excess_returns.std(), 1e-12)
+        up = 1 / (1 + np.exp(-np.clip(excess_returns / bandwidth, -500, 500)))
+        gain_gradient = np.dot(returns.T, up)
+        loss_gradient = -np.dot(returns.T, 1 - up)
+        return -(gain_gradient * loss - gain * loss_gradient) / loss ** 2
+
+    def semivariance_gradient(self, weights):
+        """Gradient of the semivariance objective."""
+        semi_var_matrix = self.moments['semivariance']
+        return np.dot(semi_var_matrix + semi_var_matrix.T, weights)
+
+    def black_litterman_gradient(self, weights):
+        """Gradient of the Black-Litterman objective."""
+        return self.black_litterman_model.gradient(weights)
+
+    def roy_safety_first_ratio_gradient(self, weights):
+        """Gradient of the negative Roy Safety First ratio."""
+        mean = self.moments['mean_annual']
+        cov_weights = self.covariance_dot(weights)
+        volatility = np.sqrt(np.dot(weights, cov_weights))
+        excess_return = np.dot(mean, weights) - self.rf
+        return -(mean / volatility - excess_return * cov_weights / volatility ** 3)
+
+    def sortino_ratio_gradient(self, weights):
+        """Gradient of the negative Sortino ratio."""
+        mean, downside_variance = self.moments['mean'] * 252, self.moments['downside_std'] ** 2 * 252
+        downside_std = np.sqrt(np.sum(downside_variance * weights ** 2))
+        excess_return = np.dot(mean, weights) - self.rf
+        return -(mean / downside_std - excess_return * downside_variance * weights / downside_std ** 3)
+
+    def fama_french_gradient(self, weights):
+        """Gradient of the negative Fama-French ratio."""
+        mean = self.moments['mean'] * 252
+        cov_weights = self.covariance_dot(weights, annual=False)
+        volatility = np.sqrt(np.dot(weights, cov_weights))
+        excess_return = np.dot(mean, weights) - self.factor_risk_free_rate()
+        return -(mean / volatility - excess_return * cov_weights / volatility ** 3)
+
+    def cvar_gradient(self, weights, alpha=0.05):
+        """Smoothed surrogate gradient of the CVaR objective (sigmoid tail weights around the VaR)."""
+        returns = self.moments['returns']
+        portfolio_returns = np.dot(returns, weights)
+        VaR = np.percentile(portfolio_returns, alpha * 100)
+        bandwidth = max(0.05 * portfolio_returns.std(), 1e-12)
+        tail = 1 / (1 + np.exp(-np.clip((VaR - portfolio_returns) / bandwidth, -500, 500)))
+        return -np.dot(returns.T, tail) / tail.sum()
+
+    def sharpe_ratio_gradient(self, weights):
+        """Gradient of the negative Sharpe ratio."""
+        mean = self.moments['mean']
+        cov_weights = self.covariance_dot(weights)
+        volatility = np.sqrt(np.dot(weights, cov_weights))
+        excess_return = self.sharpe_excess(np.dot(mean, weights))
+        return -252 * (mean / volatility - excess_return * cov_weights / volatility ** 3)
+
+    def Total_return_gradient(self, weights, lambda_a=1):
+        """Gradient of the Total Return AA objective."""
+        mean = self.moments['mean']
+        cov_weights = self.covariance_dot(weights)
+        volatility = np.sqrt(np.dot(weights, cov_weights))
+        numerator = np.dot(mean, weights) - self.rf
+        denominator = self.moments['benchmark_mean'] - self.rf + lambda_a * volatility
+        return mean / denominator - numerator * lambda_a * cov_weights / (volatility * denominator ** 2)
+
+    def fama_french_factor_model_gradient(self, weights):
+        """Gradient of the negative factor-model Sharpe ratio."""
+        model = self.factor_model()
+        premia, cov_weights = model['premia'] * 252, model['cov'].dot(weights) * 252
+        volatility = np.sqrt(np.dot(weights, cov_weights))
+        return -(premia / volatility - np.dot(premia, weights) * cov_weights / volatility ** 3)
+
+    def get_gradient(self):
+        """Returns the gradient of the selected strategy's objective, or None when the strategy has none."""
+        spec = self.strategy_spec()
+        return spec.gradient(self) if spec.gradient is not None else None
+
+    # ----------------------------------------------------------------------------------------------------
+
+    # BATCH OBJECTIVES
+    def batch_objective(self, weights):
+        """
+        Evaluates the selected strategy's objective for every row of a weight matrix at once.
+
+        Quadratic forms are computed as ((W @ C) * W).sum(axis=1) and scenario-based strategies score all
+        portfolios with a single (T x N) @ (N x K) product. The batch form of every strategy is registered in
+        strategies.py next to its single-portfolio objective.
+
+        Parameters:
+        - weights (np.ndarray): Weight matrix (K x N).
+
+        Returns:
+        - np.ndarray: Objective values (K), to be minimized like the single-portfolio objectives.
+        """
+        spec = self.strategy_spec()
+        if not spec.batch:
+            raise ValueError(f"The {spec.name} strategy has no batch objective.")
+        return spec.batch_objective(self)(weights)
+
+    def minimum_variance_batch(self, weights):
+        return self.portfolio_variance(weights)
+
+    def omega_ratio_batch(self, weights):
+        excess_returns = self.moments['returns'].dot(weights.T) - self.rf
+        gain = np.where(excess_returns > 0, excess_returns, 0).sum(axis=0)
+        loss = -np.where(excess_returns < 0, excess_returns, 0).sum(axis=0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return -np.where(loss == 0, np.inf, gain / loss)
+
+    def semivariance_batch(self, weights):
+        return np.einsum('kn,nm,km->k', weights, self.moments['semivariance'], weights)
+
+    def roy_safety_first_ratio_batch(self, weights):
+        return -(weights.dot(self.moments['mean_annual']) - self.rf) / np.sqrt(self.portfolio_variance(weights))
+
+    def sortino_ratio_batch(self, weights):
+        downside_std = np.sqrt(((weights * self.moments['downside_std']) ** 2).sum(axis=1) * 252)
+        return -(weights.dot(self.moments['mean']) * 252 - self.rf) / downside_std
+
+    def fama_french_batch(self, weights):
+        return -(weights.dot(self.moments['mean']) * 252 - self.factor_risk_free_rate()) / np.sqrt(self.portfolio_variance(weights, annual=False))
+
+    def cvar_batch(self, weights, alpha=0.05):
+        portfolio_returns = self.moments['returns'].dot(weights.T)
+        VaR = np.percentile(portfolio_returns, 100 * alpha, axis=0)
+        tail = portfolio_returns <= VaR
+        return -(portfolio_returns * tail).sum(axis=0) / tail.sum(axis=0)
+
+    def sharpe_ratio_batch(self, weights):
+        return -self.sharpe_excess(weights.dot(self.moments['mean'])) * 252 / np.sqrt(self.portfolio_variance(weights))
+
+    def black_litterman_batch(self, weights):
+        model = self.black_litterman_model
+        return -weights.dot(model.posterior_mu) + 0.5 * np.einsum('kn,nm,km->k', weights, model.risk_matrix, weights)
+
+    def fama_french_factor_model_batch(self, weights):
+        model = self.factor_model()
+        return -weights.dot(model['premia']) * 252 / np.sqrt(model['cov'].quadratic(weights) * 252)
+
+    def Total_return_batch(self, weights):
+        volatility = np.sqrt(self.portfolio_variance(weights))
+        return (weights.dot(self.moments['mean']) - self.rf) / (self.moments['benchmark_mean'] - self.rf + volatility)
+
+    # ----------------------------------------------------------------------------------------------------
+
+    # QUADRATIC PROGRAMS
+    # (Q, c) of min 0.5 * w'Qw + c'w over the bounded simplex; for Sharpe, the frontier whose ratio is maximized
+    def minimum_variance_qp(self):
+        return 2 * self.moments['cov_annual'], None
+
+    def semivariance_qp(self):
+        return 2 * self.moments['semivariance'], None
+
+    def black_litterman_qp(self):
+        model = self.black_litterman_model
+        return model.risk_matrix, -model.posterior_mu
+
+    def sharpe_ratio_qp(self):
+        return self.moments['cov_annual'], self.sharpe_excess(self.moments['mean'])
+
+    # ----------------------------------------------------------------------------------------------------
+
 
     # FINAL OPTIMIZE FUNCTION
+    def cache_key(self):
+        """
+        Content hash of the current problem: the returns window and its moments, the strategy, model, bounds and rf.
+
+        The moments cover the covariance estimator and seeded moments (e.g. rolling or ewm windows); the benchmark,
+        Fama-French factors and their mean RF, fitted factor model and Black-Litterman views are included when the
+        strategy reads them. Warm-start weights are not part of the key, since they only change the path to the same
+        optimum.
+        """
+        moments = self.moments
+        parts = [moments['returns'], moments['mean'], moments['cov'], moments['semivariance'], moments['benchmark_mean'],
+                 list(self.returns.columns), self.optimization_strategy, self.optimization_model,
+                 float(self.lower_bound), float(self.higher_bound), self.rf, self.covariance_estimator]
+        inputs = self.strategy_spec().inputs
+        if 'factors' in inputs:
+            parts.extend([self.ff_returns.to_numpy(dtype=float), self.factor_risk_free_rate()])
+        if 'factor_model' in inputs:
+            parts.extend([self.factor_model()['premia'], self.factor_model()['loadings']])
+        if 'views' in inputs:
+            parts.append(self.black_litterman_views)
+        return optimization_key(*parts)
+
     def optimize(self):
-        """Executes the selected optimization strategy and model."""
-        # Define the objective function based on the chosen strategy
-        if self.optimization_strategy == 'Minimum Variance':
-            self.objective_function = self.minimum_variance
-        elif self.optimization_strategy == 'Omega Ratio':
-            # Here it is assumed that Omega Ratio is maximized, so we minimize its negative
-            self.objective_function = lambda weights: -self.omega_ratio(weights, self.rf)
-        elif self.optimization_strategy == 'Semivariance':
-            self.objective_function = self.semivariance()
-        elif self.optimization_strategy == 'Roy Safety First Ratio':
-            self.objective_function = self.roy_safety_first_ratio
-        elif self.optimization_strategy == 'Sortino Ratio':
-             self.objective_function = self.sortino_ratio
-        elif self.optimization_strategy == 'Fama French':
-            self.objective_function = self.fama_french     
-        elif self.optimization_strategy == 'CVaR':
-            self.objective_function = lambda weights: self.cvar(weights, alpha=0.05)
-        elif self.optimization_strategy == 'HRP': 
+        """
+        Executes the selected optimization strategy and model, reusing the cached weights of an identical problem.
+
+        Under instrumentation.collect_stats the solve is timed and recorded in self.stats with its own objective,
+        gradient and constraint calls, iterations and convergence.
+        """
+        stats = self.stats = active_stats()
+        if stats is None:
+            self.reuse_or_solve()
+            return
+
+        counters = ('objective_calls', 'gradient_calls', 'constraint_calls')
+        calls_before = [stats.counters.get(name, 0) for name in counters]
+        start = time.perf_counter()
+        with stats.phase('optimize'):
+            self.reuse_or_solve()
+        result = self.optimization_result if self.optimization_result is not None else {}
+        stats.record_solve(
+            strategy=self.optimization_strategy,
+            model=self.optimization_model,
+            assets=len(self.tickers),
+            seconds=time.perf_counter() - start,
+            **{name: stats.counters.get(name, 0) - before for name, before in zip(counters, calls_before)},
+            iterations=int(result['nit']) if result.get('nit') is not None else None,
+            evaluations=int(result['nfev']) if result.get('nfev') is not None else None,
+            converged=self.optimal_weights is not None,
+            cached=result.get('message') == 'Cached solution',
+        )
+
+    def reuse_or_solve(self):
+        """
+        Returns the cached weights of an identical problem or solves it and caches the solution.
+
+        The Monte Carlo models sample unseeded random portfolios, so their solutions are not reproducible and are
+        never cached; 'Auto' is resolved first, since it may route to Monte Carlo Batch.
+        """
+        cache = get_default_weights_cache() if self.weights_cache is None else self.weights_cache
+        spec = self.strategy_spec()
+        model = route_model(spec, len(self.tickers)) if self.optimization_model == 'Auto' else self.optimization_model
+        if not cache or (model in STOCHASTIC_MODELS and not spec.closed_form):
+            self.solve()
+            return
+
+        key = self.cache_key()
+        cached = cache.get(key)
+        if cached is not None:
+            weights, labels = cached
+            self.optimal_weights = pd.Series(weights, index=labels, name=self.optimization_strategy) if labels is not None else weights
+            self.optimization_result = OptimizeResult(x=weights, success=True, status=0, nit=0, nfev=0, message='Cached solution')
+            return
+
+        self.solve()
+        if self.optimal_weights is not None:
+            labels = list(self.optimal_weights.index) if isinstance(self.optimal_weights, pd.Series) else None
+            cache.put(key, np.asarray(self.optimal_weights, dtype=float), labels)
+
+    def solve(self):
+        """
+        Executes the selected optimization strategy and model.
+
+        The strategy's inputs are computed first (see prepare_inputs). With the 'Auto' model the strategy registry
+        picks the fastest applicable solver, and a non-convex strategy whose single SLSQP start does not converge
+        is solved again with the multi-start SLSQP.
+        """
+        self.optimization_result = None
+        spec = self.prepare_inputs()
+
+        if spec.closed_form:
+            self.routed_model = None
             self.optimal_weights = self.optimize_hrp()
             return
-        elif self.optimization_strategy == 'Sharpe Ratio':
-             self.objective_function = self.sharpe_ratio
-        elif self.optimization_strategy == 'Black Litterman':
-            self.objective_function = self.black_litterman
-        elif self.optimization_strategy == 'Total Return':
-            self.objective_function = self.Total_return
-        else:
-            raise ValueError("Invalid optimization strategy.")
+
+        # Define the objective function based on the chosen strategy
+        self.objective_function = spec.objective(self)
+
+        model = self.optimization_model
+        if model == 'Auto':
+            model = route_model(spec, len(self.tickers))
+        elif model in MODELS and model not in spec.models():
+            raise ValueError(f"The {model} model does not support the {spec.name} strategy.")
+        self.routed_model = model
 
         # Execute the selected optimization model
-        if self.optimization_model == 'SLSQP':
+        if model == 'SLSQP':
             self.optimize_slsqp()
-        elif self.optimization_model == 'Monte Carlo':
+        elif model == 'Monte Carlo':
             self.optimize_montecarlo()
-        elif self.optimization_model == 'COBYLA':
+        elif model == 'COBYLA':
             self.optimize_cobyla()
+        elif model == 'QP':
+            self.optimize_qp()
+        elif model == 'LP':
+            self.optimize_lp()
+        elif model == 'SLSQP Multi-Start':
+            self.optimize_slsqp_multistart()
+        elif model == 'Monte Carlo Parallel':
+            self.optimize_montecarlo_parallel()
+        elif model == 'Monte Carlo Batch':
+            self.optimize_montecarlo_batch()
         else:
-            raise ValueError("Invalid optimization model.")
\ No newline at end of file
+            raise ValueError("Invalid optimization model.")
+
+        if self.optimization_model == 'Auto' and self.optimal_weights is None and not spec.convex:
+            self.routed_model = 'SLSQP Multi-Start'
+            self.optimize_slsqp_multistart()
\ No newline at end of file
@@ -0,0 +1,134 @@
+"""
+# -- --------------------------------------------------------------------------------------------------- -- #
+# -- project: Quantitative Asset Allocation (QAA)                                                        -- #
+# -- script: instrumentation.py - Python script with the opt-in timings and counters of QAA              -- #
+# -- authors: diegotita4 - Antonio-IF - JoAlfonso - J3SVS - Oscar148                                     -- #
+# -- license: GNU GENERAL PUBLIC LICENSE - Version 3, 29 June 2007                                       -- #
+# -- repository: https://github.com/diegotita4/PAP                                                       -- #
+# -- --------------------------------------------------------------------------------------------------- -- #
+"""
+
+# ----------------------------------------------------------------------------------------------------
+
+# LIBRARIES
+import time
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+import pandas as pd
+
+# ----------------------------------------------------------------------------------------------------
+
+# STATS OBJECT
+class RunStats:
+    """
+    Timings and counters collected while a QAA solve or a backtest runs under collect_stats.
+
+    Phases are timed with a wall clock and may nest (e.g. 'download_prices' runs inside 'load_panel'), so their
+    times are not additive. Counters hold objective, gradient and constraint calls and the number of downloaded
+    values (prices or factor returns, not network bytes); every QAA.optimize adds one entry to solves with its own
+    call counts, iterations and convergence.
+
+    Methods:
+    - phase: Context manager that times a named phase.
+    - count: Adds to a named counter.
+    - counted: Wraps a function so every call adds to a counter.
+    - record_solve: Adds the summary of one optimization.
+    - phases_frame / solves_frame: The phases and solves as DataFrames.
+    - summary: Plain dict with every phase, counter and solve.
+    """
+
+    def __init__(self):
+        self.phases = {}
+        self.counters = {}
+        self.solves = []
+
+    @contextmanager
+    def phase(self, name):
+        """Times the enclosed block and adds it to the phase name."""
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            calls, seconds = self.phases.get(name, (0, 0.))
+            self.phases[name] = (calls + 1, seconds + time.perf_counter() - start)
+
+    def count(self, name, amount=1):
+        """Adds amount to the counter name."""
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def counted(self, name, function):
+        """Wraps function so that every call adds one to the counter name."""
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            self.counters[name] = self.counters.get(name, 0) + 1
+            return function(*args, **kwargs)
+        return wrapper
+
+    def record_solve(self, **entry):
+        """Adds the summary of one optimization (strategy, model, seconds, calls, iterations, convergence)."""
+        self.solves.append(entry)
+
+    def phases_frame(self):
+        """Phases with their number of calls and total and mean seconds, slowest first."""
+        frame = pd.DataFrame([(name, calls, seconds) for name, (calls, seconds) in self.phases.items()],
+                             columns=['phase', 'calls', 'seconds'])
+        frame['mean_seconds'] = frame['seconds'] / frame['calls']
+        return frame.sort_values('seconds', ascending=False, ignore_index=True)
+
+    def solves_frame(self):
+        """One row per optimization."""
+        return pd.DataFrame(self.solves)
+
+    def summary(self):
+        """Every phase, counter and solve as plain Python objects."""
+        return {
+            'phases': {name: {'calls': calls, 'seconds': seconds} for name, (calls, seconds) in self.phases.items()},
+            'counters': dict(self.counters),
+            'solves': list(self.solves),
+        }
+
+# ----------------------------------------------------------------------------------------------------
+
+# ACTIVE COLLECTOR
+# The hooks below only read one module global when no collector is active, so disabled instrumentation is free.
+_ACTIVE = None
+_NO_PHASE = nullcontext()
+
+
+@contextmanager
+def collect_stats(stats=None):
+    """
+    Activates a RunStats for the enclosed block; the previous collector (if any) is restored on exit.
+
+    :param stats: Collector to activate. Defaults to a new RunStats.
+    :type stats: RunStats
+    :return: The active collector.
+    :rtype: RunStats
+    """
+    global _ACTIVE
+    previous, _ACTIVE = _ACTIVE, stats if stats is not None else RunStats()
+    try:
+        yield _ACTIVE
+    finally:
+        _ACTIVE = previous
+
+
+def active_stats():
+    """Collector in use, or None when the instrumentation is disabled."""
+    return _ACTIVE
+
+
+def phase(name):
+    """Times a named phase on the active collector; does nothing when disabled."""
+    return _ACTIVE.phase(name) if _ACTIVE is not None else _NO_PHASE
+
+
+def count(name, amount=1):
+    """Adds to a counter of the active collector; does nothing when disabled."""
+    if _ACTIVE is not None:
+        _ACTIVE.count(name, amount)
+
+
+def counted(name, function):
+    """Wraps function with a call counter of the active collector; returns it unchanged when disabled."""
+    return _ACTIVE.counted(name, function) if _ACTIVE is not None else function
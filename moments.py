@@ -0,0 +1,249 @@
+"""
+# -- --------------------------------------------------------------------------------------------------- -- #
+# -- project: Quantitative Asset Allocation (QAA)                                                        -- #
+# -- script: moments.py - Python script with the incremental moment accumulator used by the backtests    -- #
+# -- authors: diegotita4 - Antonio-IF - JoAlfonso - J3SVS - Oscar148                                     -- #
+# -- license: GNU GENERAL PUBLIC LICENSE - Version 3, 29 June 2007                                       -- #
+# -- repository: https://github.com/diegotita4/PAP                                                       -- #
+# -- --------------------------------------------------------------------------------------------------- -- #
+"""
+
+# ----------------------------------------------------------------------------------------------------
+
+# LIBRARIES
+import numpy as np
+
+# ----------------------------------------------------------------------------------------------------
+
+# WEIGHTED RUNNING MOMENTS
+class _RunningMoments:
+    """
+    Weighted mean and centered second moment of a stream of rows, merged batch by batch.
+
+    The state is (W, V2, mean, M2) with W the sum of weights, V2 the sum of squared weights and
+    M2 = sum w (x - mean)(x - mean)^T (or its diagonal when full=False). Batches are merged with the
+    pairwise update of Chan et al.; a batch with negative weights removes rows from the state.
+    """
+
+    def __init__(self, n_columns, full=True):
+        self.full = full
+        self.W = 0.
+        self.V2 = 0.
+        self.mean = np.zeros(n_columns)
+        self.M2 = np.zeros((n_columns, n_columns)) if full else np.zeros(n_columns)
+
+    def decay(self, factor):
+        """Multiplies the weight of every row seen so far by factor."""
+        self.W *= factor
+        self.V2 *= factor ** 2
+        self.M2 *= factor
+
+    def merge(self, rows, weights, sign=1.):
+        """Adds (sign=1) or removes (sign=-1) a batch of rows with the given positive weights."""
+        batch_W = weights.sum()
+        if batch_W <= 0:
+            return
+        batch_mean = weights @ rows / batch_W
+        centered = rows - batch_mean
+        if self.full:
+            batch_M2 = (centered * weights[:, None]).T @ centered
+        else:
+            batch_M2 = weights @ centered ** 2
+
+        total_W = self.W + sign * batch_W
+        if total_W <= 1e-12 * max(self.W, 1.):
+            self.__init__(len(self.mean), self.full)
+            return
+        delta = batch_mean - self.mean
+        # For a removal the pairwise formula is solved for the remaining part instead of the total
+        if sign > 0:
+            correction = self.W * batch_W / total_W
+            self.mean = self.mean + delta * batch_W / total_W
+        else:
+            self.mean = self.mean - delta * batch_W / total_W
+            correction = total_W * batch_W / self.W
+            delta = batch_mean - self.mean
+        self.M2 = self.M2 + sign * batch_M2 + sign * correction * (np.outer(delta, delta) if self.full else delta ** 2)
+        self.W = total_W
+        self.V2 = self.V2 + sign * (weights ** 2).sum()
+
+    def variance(self):
+        """Unbiased (reliability weights) covariance matrix, or variance vector when full=False."""
+        dof = self.W - self.V2 / self.W if self.W > 0 else 0.
+        if dof <= 0:
+            return np.full_like(self.M2, np.nan)
+        return self.M2 / dof
+
+# ----------------------------------------------------------------------------------------------------
+
+# MOMENT ACCUMULATOR
+class MomentAccumulator:
+    """
+    Incremental estimator of the moments that QAA's strategies read from QAA.moments.
+
+    Only the rows added since the previous update are processed, so a walk-forward backtest costs
+    O(new rows x N^2) per rebalance instead of recomputing the covariance over the whole window.
+
+    Windows:
+    - 'expanding': Every row seen so far, equally weighted (matches QAA.calculate_moments exactly).
+    - 'rolling': The last `length` rows, equally weighted; rows leaving the window are subtracted.
+    - 'ewm': Every row seen so far, weighted by (1 - alpha)^age with alpha from `halflife` (rows), like pandas ewm(adjust=True).
+
+    Methods:
+    - update: Adds the new rows of asset and benchmark returns.
+    - advance: Feeds the rows of a returns panel up to a date and returns the rows of the current window.
+    - moments: Returns the current moments with the same keys as QAA.moments (except 'returns').
+    - reset: Forgets every row.
+    """
+
+    WINDOWS = ('expanding', 'rolling', 'ewm')
+
+    def __init__(self, window='expanding', length=None, halflife=None):
+        """
+        Initialize the MomentAccumulator.
+
+        :param window: Window type, one of 'expanding', 'rolling' or 'ewm'.
+        :type window: str
+        :param length: Number of rows of the rolling window.
+        :type length: int
+        :param halflife: Half-life in rows of the exponentially weighted window.
+        :type halflife: float
+        """
+        if window not in self.WINDOWS:
+            raise ValueError(f"Unknown moment window '{window}'. Use one of {self.WINDOWS}.")
+        if window == 'rolling' and (length is None or length < 2):
+            raise ValueError("A rolling window needs a length of at least 2 rows.")
+        if window == 'ewm' and (halflife is None or halflife <= 0):
+            raise ValueError("An exponentially weighted window needs a positive halflife.")
+        self.window = window
+        self.length = length
+        self.halflife = halflife
+        self.decay = np.exp(np.log(0.5) / halflife) if window == 'ewm' else 1.
+        self.reset()
+
+    def reset(self):
+        """Forgets every row seen so far."""
+        self.n_obs = 0
+        self.rows_fed = 0
+        self._returns = None
+        self._downside = None
+        self._benchmark = None
+        self._excess_downside = None
+        self._buffer = []
+
+    def _streams(self, n_assets):
+        if self._returns is None:
+            self._returns = _RunningMoments(n_assets, full=True)
+            self._downside = _RunningMoments(n_assets, full=False)
+            self._benchmark = _RunningMoments(1, full=False)
+            self._excess_downside = _RunningMoments(n_assets, full=False)
+        return self._returns, self._downside, self._benchmark, self._excess_downside
+
+    def _merge(self, returns, benchmark_returns, weights, sign=1.):
+        returns_stream, downside_stream, benchmark_stream, excess_stream = self._streams(returns.shape[1])
+        returns_stream.merge(returns, weights, sign)
+        downside_stream.merge(np.minimum(returns, 0), weights, sign)
+        if benchmark_returns is not None:
+            # Like the pandas alignment in QAA.calculate_moments, rows without a benchmark return are skipped
+            valid = ~np.isnan(benchmark_returns)
+            benchmark_stream.merge(benchmark_returns[valid, None], weights[valid], sign)
+            excess = np.minimum(returns[valid] - benchmark_returns[valid, None], 0)
+            excess_stream.merge(excess, weights[valid], sign)
+
+    def update(self, returns, benchmark_returns=None):
+        """
+        Adds the rows of returns observed since the previous update.
+
+        :param returns: New daily returns of the assets (k x N), without missing values.
+        :type returns: pd.DataFrame or np.ndarray
+        :param benchmark_returns: New daily returns of the benchmark on the same rows (k).
+        :type benchmark_returns: pd.Series or np.ndarray
+        :return: The accumulator itself.
+        :rtype: MomentAccumulator
+        """
+        returns = np.atleast_2d(np.asarray(returns, dtype=float))
+        if len(returns) == 0:
+            return self
+        if benchmark_returns is not None:
+            benchmark_returns = np.asarray(benchmark_returns, dtype=float).reshape(-1)
+
+        n_new = len(returns)
+        if self.window == 'ewm':
+            weights = self.decay ** np.arange(n_new - 1, -1, -1, dtype=float)
+            if self._returns is not None:
+                for stream in self._streams(returns.shape[1]):
+                    stream.decay(self.decay ** n_new)
+        else:
+            weights = np.ones(n_new)
+        self._merge(returns, benchmark_returns, weights)
+        self.n_obs += n_new
+
+        if self.window == 'rolling':
+            self._buffer.append((returns, benchmark_returns))
+            excess_rows = self.n_obs - self.length
+            while excess_rows > 0:
+                old_returns, old_benchmark = self._buffer[0]
+                drop = min(excess_rows, len(old_returns))
+                self._merge(old_returns[:drop], old_benchmark[:drop] if old_benchmark is not None else None, np.ones(drop), sign=-1.)
+                if drop == len(old_returns):
+                    self._buffer.pop(0)
+                else:
+                    self._buffer[0] = (old_returns[drop:], old_benchmark[drop:] if old_benchmark is not None else None)
+                self.n_obs -= drop
+                excess_rows -= drop
+        return self
+
+    def advance(self, returns, benchmark_returns, window_end):
+        """
+        Feeds the rows of a returns panel that have not been seen yet, up to window_end (exclusive).
+
+        The panel must be the same on every call; only the rows after the previous call are processed.
+
+        :param returns: Daily returns of the full panel.
+        :type returns: pd.DataFrame
+        :param benchmark_returns: Daily benchmark returns of the full panel, aligned to returns.
+        :type benchmark_returns: pd.Series
+        :param window_end: End of the window (exclusive).
+        :type window_end: pd.Timestamp
+        :return: Rows of the panel covered by the current window.
+        :rtype: slice
+        """
+        end_row = returns.index.searchsorted(window_end, side='left')
+        if end_row > self.rows_fed:
+            new_benchmark = benchmark_returns.iloc[self.rows_fed:end_row] if benchmark_returns is not None else None
+            self.update(returns.iloc[self.rows_fed:end_row], new_benchmark)
+            self.rows_fed = end_row
+        start_row = self.rows_fed - self.n_obs if self.window == 'rolling' else 0
+        return slice(start_row, self.rows_fed)
+
+    def moments(self):
+        """
+        Current moments, with the same keys and conventions as QAA.calculate_moments.
+
+        :return: mean, cov, mean_annual, cov_annual, corr, downside_std, semivariance and benchmark_mean.
+        :rtype: dict
+        """
+        if self._returns is None or self.n_obs < 2:
+            raise ValueError("At least two rows of returns are needed to estimate the moments.")
+        mean = self._returns.mean.copy()
+        cov = self._returns.variance()
+        std = np.sqrt(np.diag(cov))
+        corr = cov / np.outer(std, std)
+        downside_std = np.sqrt(self._downside.variance())
+
+        semivariance, benchmark_mean = None, None
+        if self._benchmark.W > 0:
+            downside_risk = np.sqrt(self._excess_downside.variance())
+            semivariance = np.outer(downside_risk, downside_risk) * corr * 100
+            benchmark_mean = float(self._benchmark.mean[0])
+
+        return {
+            'mean': mean,
+            'cov': cov,
+            'mean_annual': mean * 252,
+            'cov_annual': cov * 252,
+            'corr': corr,
+            'downside_std': downside_std,
+            'semivariance': semivariance,
+            'benchmark_mean': benchmark_mean,
+        }
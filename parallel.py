@@ -0,0 +1,607 @@
+"""
+# -- --------------------------------------------------------------------------------------------------- -- #
+# -- project: Quantitative Asset Allocation (QAA)                                                        -- #
+# -- script: parallel.py - Python script with the process-pool runners for batches of QAA solves         -- #
+# -- authors: diegotita4 - Antonio-IF - JoAlfonso - J3SVS - Oscar148                                     -- #
+# -- license: GNU GENERAL PUBLIC LICENSE - Version 3, 29 June 2007                                       -- #
+# -- repository: https://github.com/diegotita4/PAP                                                       -- #
+# -- --------------------------------------------------------------------------------------------------- -- #
+"""
+
+# ----------------------------------------------------------------------------------------------------
+
+# LIBRARIES
+import os
+import copy
+import shutil
+import tempfile
+from itertools import product
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from scipy.optimize import OptimizeResult
+from solvers import project_capped_simplex, sample_bounded_simplex
+from analytics import performance_summary, holdings_turnover
+
+# ----------------------------------------------------------------------------------------------------
+
+# SHARED READ-ONLY PANEL
+class SharedPanel:
+    """
+    Places the price, benchmark and factor panels of a batch in shared memory, once.
+
+    Workers attach to the same buffers instead of receiving a pickled copy of the data with every task.
+    Use it as a context manager so the shared blocks are released when the batch finishes.
+
+    Methods:
+    - descriptor: Picklable description of the shared blocks, sent once to each worker.
+    - attach: Rebuilds the frames on top of the shared blocks inside a worker.
+    - close: Releases the shared blocks.
+    """
+
+    def __init__(self, data, benchmark_data=None, ff_data=None):
+        """
+        Copies the panels into shared memory.
+
+        :param data: Asset prices (T x N).
+        :type data: pd.DataFrame
+        :param benchmark_data: Benchmark prices (T).
+        :type benchmark_data: pd.Series
+        :param ff_data: Fama-French daily factors.
+        :type ff_data: pd.DataFrame
+        """
+        self.blocks = []
+        self._descriptor = {
+            'data': self._share(data),
+            'benchmark_data': self._share(benchmark_data),
+            'ff_data': self._share(ff_data),
+        }
+
+    def _share(self, frame):
+        if frame is None:
+            return None
+        values = np.ascontiguousarray(frame.to_numpy(dtype=float))
+        block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+        np.ndarray(values.shape, dtype=values.dtype, buffer=block.buf)[...] = values
+        self.blocks.append(block)
+        labels = frame.columns if isinstance(frame, pd.DataFrame) else frame.name
+        return {'name': block.name, 'shape': values.shape, 'dtype': values.dtype.str, 'index': frame.index, 'labels': labels}
+
+    def descriptor(self):
+        """Picklable description of the shared blocks."""
+        return self._descriptor
+
+    @staticmethod
+    def attach(descriptor):
+        """
+        Rebuilds the panels on top of the shared blocks, without copying.
+
+        :param descriptor: Output of SharedPanel.descriptor().
+        :type descriptor: dict
+        :return: The attached blocks (keep them alive) and the (data, benchmark_data, ff_data) frames.
+        :rtype: tuple
+        """
+        blocks, frames = [], []
+        for key in ('data', 'benchmark_data', 'ff_data'):
+            entry = descriptor[key]
+            if entry is None:
+                frames.append(None)
+                continue
+            block = shared_memory.SharedMemory(name=entry['name'])
+            blocks.append(block)
+            values = np.ndarray(entry['shape'], dtype=np.dtype(entry['dtype']), buffer=block.buf)
+            values.flags.writeable = False
+            if len(entry['shape']) == 1:
+                frames.append(pd.Series(values, index=entry['index'], name=entry['labels'], copy=False))
+            else:
+                frames.append(pd.DataFrame(values, index=entry['index'], columns=entry['labels'], copy=False))
+        return blocks, tuple(frames)
+
+    def close(self):
+        """Releases the shared blocks."""
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# ----------------------------------------------------------------------------------------------------
+
+# WORKERS
+_WORKER_BLOCKS = None
+_WORKER_PANEL = None
+
+
+def _init_worker(descriptor):
+    """Attaches the shared panel once per worker process."""
+    global _WORKER_BLOCKS, _WORKER_PANEL
+    _WORKER_BLOCKS, _WORKER_PANEL = SharedPanel.attach(descriptor)
+
+
+def _solve_task(task):
+    """Builds a QAA on the shared panel and runs one (strategy, model, params) optimization."""
+    from functions import QAA
+
+    data, benchmark_data, ff_data = _WORKER_PANEL
+    params = dict(task['params'])
+    qaa_instance = QAA(data=data, benchmark_data=benchmark_data, ff_data=ff_data, **params)
+    qaa_instance.set_optimization_strategy(task['strategy'])
+    qaa_instance.set_optimization_model(task['model'])
+    try:
+        qaa_instance.optimize()
+    except Exception as error:
+        return {'optimal_weights': None, 'return': None, 'volatility': None, 'error': repr(error)}
+
+    optimal_weights = qaa_instance.optimal_weights
+    if optimal_weights is None:
+        return {'optimal_weights': None, 'return': None, 'volatility': None, 'error': None}
+    optimal_weights = np.asarray(optimal_weights, dtype=float)
+    qaa_instance.optimal_weights = optimal_weights
+    return {
+        'optimal_weights': optimal_weights,
+        'return': qaa_instance.calculate_portfolio_return(),
+        'volatility': qaa_instance.calculate_portfolio_volatility(),
+        'error': None,
+    }
+
+
+def _backtest_task(task):
+    """Runs one dynamic_backtesting on the shared panel."""
+    from backtest import dynamic_backtesting
+
+    data, benchmark_data, ff_data = _WORKER_PANEL
+    return dynamic_backtesting(data=data, benchmark_data=benchmark_data, ff_data=ff_data, **task)
+
+
+def _rebalance_path_task(task):
+    """Solves one (strategy, model, bounds) sub-problem at every date of a sorted rebalance path on the shared panel."""
+    from backtest import rebalance_solver
+
+    data, benchmark_data, ff_data = _WORKER_PANEL
+    params = dict(task)
+    rebalance_dates = params.pop('rebalance_dates')
+    rebalance_strategy = rebalance_solver(data, benchmark_data, ff_data, **params)
+    weights, solver_stats = [], []
+    try:
+        for window_end in rebalance_dates:
+            optimal_weights, stats = rebalance_strategy(window_end)
+            weights.append(optimal_weights)
+            solver_stats.append(stats)
+    except Exception as error:
+        return {'weights': None, 'solver_stats': None, 'error': repr(error)}
+    return {'weights': np.array(weights), 'solver_stats': solver_stats, 'error': None}
+
+# ----------------------------------------------------------------------------------------------------
+
+# BATCH API
+def _iter_pool(worker, tasks, data, benchmark_data, ff_data, max_workers):
+    """Fans the tasks out over a process pool sharing one panel and yields (key, result) as they finish."""
+    max_workers = max_workers or os.cpu_count()
+    with SharedPanel(data, benchmark_data, ff_data) as panel:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(panel.descriptor(),)) as pool:
+            futures = {pool.submit(worker, task): key for key, task in tasks}
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+
+
+def iter_strategy_grid(grid, data, benchmark_data=None, ff_data=None, max_workers=None, **common_params):
+    """
+    Solves a grid of (strategy, model, params) problems over a process pool against one shared panel.
+
+    Parameters:
+    - grid (list): Tuples (strategy, model) or (strategy, model, params) where params is a dict of QAA keyword arguments.
+    - data (pd.DataFrame): Asset prices shared read-only by every solve.
+    - benchmark_data (pd.Series, optional): Benchmark prices.
+    - ff_data (pd.DataFrame, optional): Fama-French daily factors.
+    - max_workers (int, optional): Number of worker processes. Defaults to the number of cores.
+    - common_params: QAA keyword arguments shared by every grid point (tickers, rf, lower_bound, ...).
+
+    Yields:
+    - tuple: (grid point, result) in completion order; result holds optimal_weights, return, volatility and error.
+    """
+    tasks = []
+    for point in grid:
+        strategy, model = point[0], point[1]
+        params = {**common_params, **(point[2] if len(point) > 2 else {})}
+        tasks.append((point, {'strategy': strategy, 'model': model, 'params': params}))
+    yield from _iter_pool(_solve_task, tasks, data, benchmark_data, ff_data, max_workers)
+
+
+def run_strategy_grid(grid, data, benchmark_data=None, ff_data=None, max_workers=None, **common_params):
+    """
+    Solves a grid of (strategy, model, params) problems in parallel and gathers every result.
+
+    Takes the same arguments as iter_strategy_grid.
+
+    Returns:
+    - dict: Result per grid point.
+    """
+    return dict(iter_strategy_grid(grid, data, benchmark_data, ff_data, max_workers, **common_params))
+
+
+def run_backtest_grid(strategies, data, benchmark_data=None, ff_data=None, max_workers=None, **backtest_params):
+    """
+    Runs one dynamic_backtesting per strategy in parallel against one shared panel.
+
+    Parameters:
+    - strategies (list): Optimization strategies to backtest.
+    - data (pd.DataFrame): Asset prices for the full backtest.
+    - benchmark_data (pd.Series, optional): Benchmark prices.
+    - ff_data (pd.DataFrame, optional): Fama-French daily factors.
+    - max_workers (int, optional): Number of worker processes. Defaults to the number of cores.
+    - backtest_params: Remaining dynamic_backtesting keyword arguments, shared by every strategy.
+
+    Returns:
+    - dict: (results, daily_data, portfolio_values) per strategy.
+    """
+    tasks = [(strategy, {**backtest_params, 'optimization_strategy': strategy}) for strategy in strategies]
+    return dict(_iter_pool(_backtest_task, tasks, data, benchmark_data, ff_data, max_workers))
+
+
+def run_backtest_sweep(tickers, start_date_data, start_backtesting, end_date, rf, strategies, models=('SLSQP',), rebalance_frequencies=(6,),
+                       bounds=((0.10, 0.99),), commissions=(0.0025,), initial_portfolio_value=1_000_000, data=None, benchmark_data=None,
+                       ff_data=None, price_store=None, max_workers=None, **solver_params):
+    """
+    Backtests every combination of strategy, model, rebalance frequency, bounds and commission against one panel.
+
+    The optimal weights only depend on (strategy, model, bounds) and the rebalance date, so each of those sub-problems
+    is solved once: every (strategy, model, bounds) group walks the union of the rebalance dates of all the frequencies
+    in one warm-started pass on a process pool, and every grid point then replays its own schedule and commission over
+    the shared weights with the columnar core, which costs no solves.
+
+    With warm starts the weights of a date can differ by the solver tolerance from a standalone dynamic_backtesting,
+    because the previous optimum comes from the union of the schedules; pass warm_start=False for identical weights.
+
+    Parameters:
+    - tickers (list): List of asset tickers.
+    - start_date_data (str): First date of the historical data.
+    - start_backtesting (str): First rebalance date.
+    - end_date (str): Last date of the backtest.
+    - rf (float): Risk-free rate.
+    - strategies (list): Optimization strategies to sweep.
+    - models (list, optional): Optimization models to sweep. Defaults to ('SLSQP',).
+    - rebalance_frequencies (list, optional): Months between rebalances to sweep. Defaults to (6,).
+    - bounds (list, optional): (lower_bound, higher_bound) pairs to sweep. Defaults to ((0.10, 0.99),).
+    - commissions (list, optional): Proportional commissions to sweep. Defaults to (0.0025,).
+    - initial_portfolio_value (float, optional): Cash invested at the first rebalance. Defaults to 1,000,000.
+    - data, benchmark_data, ff_data, price_store (optional): Preloaded panel or price store; the panel is loaded once when data is None.
+    - max_workers (int, optional): Number of worker processes. Defaults to the number of cores.
+    - solver_params: Remaining rebalance_solver keyword arguments (moment_window, covariance_estimator, warm_start, ...).
+
+    Returns:
+    - tuple: (summary, backtests): one row per grid point with its parameters, solver statistics and the metrics of
+      analytics.performance_summary (against the benchmark, with rf in percent), and the run_backtest output per grid
+      point (None when its sub-problem failed).
+    """
+    from backtest import load_backtest_panel, rebalance_schedule, run_backtest
+
+    if data is None:
+        data, benchmark_data, ff_data = load_backtest_panel(tickers, start_date_data, pd.to_datetime(end_date).strftime('%Y-%m-%d'), rf, price_store)
+
+    points = list(dict.fromkeys(product(strategies, models, rebalance_frequencies, [tuple(bound) for bound in bounds], commissions)))
+    schedules = {frequency: pd.DatetimeIndex(rebalance_schedule(start_backtesting, end_date, frequency)) for frequency in rebalance_frequencies}
+
+    # One sub-problem per (strategy, model, bounds), solved over the union of the dates its grid points rebalance on
+    paths = {}
+    for strategy, model, frequency, bound, _ in points:
+        key = (strategy, model, bound)
+        paths[key] = paths[key].union(schedules[frequency]) if key in paths else schedules[frequency]
+    tasks = [(key, {'tickers': tickers, 'start_date_data': start_date_data, 'rf': rf, 'optimization_strategy': key[0], 'optimization_model': key[1],
+                    'lower_bound': key[2][0], 'higher_bound': key[2][1], 'rebalance_dates': paths[key], **solver_params}) for key in paths]
+    solutions = dict(_iter_pool(_rebalance_path_task, tasks, data, benchmark_data, ff_data, max_workers))
+
+    rows, backtests, navs, turnovers = [], {}, {}, {}
+    for point in points:
+        strategy, model, frequency, (lower_bound, higher_bound), commission = point
+        row = {'optimization_strategy': strategy, 'optimization_model': model, 'rebalance_frequency_months': frequency,
+               'lower_bound': lower_bound, 'higher_bound': higher_bound, 'commission': commission}
+        solution = solutions[(strategy, model, (lower_bound, higher_bound))]
+        if solution['error'] is not None:
+            backtests[point] = None
+            rows.append({**row, 'error': solution['error']})
+            continue
+
+        path_rows = dict(zip(paths[(strategy, model, (lower_bound, higher_bound))], range(len(solution['weights']))))
+        backtest = run_backtest(tickers, start_date_data, start_backtesting, end_date, frequency, rf, strategy, model, initial_portfolio_value,
+                                commission, lower_bound, higher_bound, data=data, benchmark_data=benchmark_data, ff_data=ff_data,
+                                rebalance_strategy=lambda window_end: (solution['weights'][path_rows[window_end]], dict(solution['solver_stats'][path_rows[window_end]])))
+        backtests[point] = backtest
+        navs[len(rows)] = pd.Series(backtest['nav'], index=backtest['dates'])
+        turnovers[len(rows)] = holdings_turnover(backtest['shares'], backtest['prices'], backtest['total_value'])
+        iterations = [stats['iterations'] for stats in backtest['solver_stats'] if stats.get('iterations') is not None]
+        rows.append({**row, 'rebalances': len(backtest['rebalance_dates']),
+                     'solver_iterations': sum(iterations) if iterations else None, 'error': None})
+
+    # Every grid point shares the backtest calendar, so all the NAVs are scored in one vectorized pass (rf is in percent, like QAA's)
+    summary = pd.DataFrame(rows)
+    if navs:
+        metrics = performance_summary(pd.DataFrame(navs), benchmark=benchmark_data, rf=rf / 100 if rf else 0., turnover=turnovers)
+        summary = summary.join(metrics)
+    return summary, backtests
+
+# ----------------------------------------------------------------------------------------------------
+
+# STRATEGY COPIES FOR WORKERS
+def worker_copy(qaa_instance):
+    """
+    Picklable copy of a strategy with everything its objective reads already computed.
+
+    The inputs the strategy declares (moments, Fama-French risk-free rate, Black-Litterman posterior) are computed
+    once in the parent, so the workers only evaluate the objective; the price, benchmark and factor frames and
+    their returns (and the scenario matrix, unless the strategy declares 'scenarios'), the objective closure, price
+    store and stats are left out, so a task does not pickle the panel.
+
+    :param qaa_instance: Strategy with its optimization strategy set.
+    :type qaa_instance: QAA
+    :return: Shallow copy sharing the parent's moments.
+    :rtype: QAA
+    """
+    worker_instance = copy.copy(qaa_instance)
+    spec = worker_instance.prepare_inputs()
+    if 'scenarios' not in spec.inputs:
+        # Only the scenario strategies read the (T x N) returns matrix of the moment cache
+        worker_instance.__dict__['_moments'] = {key: value for key, value in worker_instance.moments.items() if key != 'returns'}
+    for attribute in ('objective_function', 'price_store', 'stats'):
+        worker_instance.__dict__.pop(attribute, None)
+    # Set past the property setters, which would drop the shared moments
+    for attribute in ('_data', '_benchmark_data', '_ff_data', '_returns', '_benchmark_returns', '_ff_returns'):
+        worker_instance.__dict__[attribute] = None
+    worker_instance.weights_cache = False
+    return worker_instance
+
+# ----------------------------------------------------------------------------------------------------
+
+# PROCESS-PARALLEL OPTUNA STUDY
+PARAMETERIZATIONS = ('stick-breaking', 'softmax')
+SOFTMAX_RANGE = 4.0
+
+
+def simplex_from_params(params, n_assets, parameterization='stick-breaking'):
+    """
+    Maps the sampled parameters of a trial to a point of the unit simplex.
+
+    'stick-breaking' uses N - 1 uniforms, each breaking a Beta(1, N - 1 - i) share of the remaining stick, so uniform
+    parameters give uniform (Dirichlet(1)) weights; 'softmax' uses N logits in [-4, 4]. Every trial is a valid
+    portfolio, instead of normalizing free weights and penalizing the infeasible ones.
+
+    :param params: Trial parameters, 'u_i' for stick-breaking or 'z_i' for softmax.
+    :type params: dict
+    :param n_assets: Number of assets.
+    :type n_assets: int
+    :param parameterization: 'stick-breaking' or 'softmax'.
+    :type parameterization: str
+    :return: Weights on the simplex.
+    :rtype: np.ndarray
+    """
+    if parameterization == 'softmax':
+        logits = np.array([params[f'z_{i}'] for i in range(n_assets)])
+        weights = np.exp(logits - logits.max())
+        return weights / weights.sum()
+
+    weights, remaining = np.empty(n_assets), 1.
+    for i in range(n_assets - 1):
+        share = 1 - (1 - params[f'u_{i}']) ** (1 / (n_assets - 1 - i))
+        weights[i] = remaining * share
+        remaining -= weights[i]
+    weights[-1] = remaining
+    return weights
+
+
+def params_from_simplex(weights, parameterization='stick-breaking'):
+    """Inverse of simplex_from_params, used to enqueue the warm-start weights as the first trial."""
+    weights = np.clip(np.asarray(weights, dtype=float), 1e-12, None)
+    weights = weights / weights.sum()
+    n_assets = len(weights)
+    if parameterization == 'softmax':
+        logits = np.clip(np.log(weights) - np.log(weights).max() + SOFTMAX_RANGE, -SOFTMAX_RANGE, SOFTMAX_RANGE)
+        return {f'z_{i}': float(logit) for i, logit in enumerate(logits)}
+
+    params, remaining = {}, 1.
+    for i in range(n_assets - 1):
+        share = min(weights[i] / remaining, 1.) if remaining > 0 else 0.
+        params[f'u_{i}'] = float(np.clip(1 - (1 - share) ** (n_assets - 1 - i), 0., 1.))
+        remaining -= weights[i]
+    return params
+
+
+def _suggest_params(trial, n_assets, parameterization):
+    if parameterization == 'softmax':
+        return {f'z_{i}': trial.suggest_float(f'z_{i}', -SOFTMAX_RANGE, SOFTMAX_RANGE) for i in range(n_assets)}
+    return {f'u_{i}': trial.suggest_float(f'u_{i}', 0., 1.) for i in range(n_assets - 1)}
+
+
+def _journal_storage(path):
+    """Optuna JournalStorage over a file; optuna < 4.0 names the file backend JournalFileStorage."""
+    from optuna.storages import JournalStorage
+    try:
+        from optuna.storages.journal import JournalFileBackend
+    except ImportError:
+        from optuna.storages import JournalFileStorage as JournalFileBackend
+    return JournalStorage(JournalFileBackend(path))
+
+
+def _study_worker(task):
+    """Runs trials of a shared study until the study as a whole reaches its trial budget."""
+    import optuna
+    optuna.logging.set_verbosity(optuna.logging.WARNING)
+
+    qaa_instance, n_assets = task['qaa_instance'], len(task['qaa_instance'].tickers)
+    storage = _journal_storage(task['storage_path'])
+    study = optuna.load_study(study_name=task['study_name'], storage=storage, sampler=optuna.samplers.TPESampler(seed=task['seed']))
+
+    def objective(trial):
+        simplex = simplex_from_params(_suggest_params(trial, n_assets, task['parameterization']), n_assets, task['parameterization'])
+        weights = project_capped_simplex(simplex, qaa_instance.lower_bound, qaa_instance.higher_bound)
+        value = float(qaa_instance.batch_objective(weights[None, :])[0])
+        return value if np.isfinite(value) else 1e10
+
+    budget = optuna.study.MaxTrialsCallback(task['n_trials'], states=None)
+    study.optimize(objective, n_trials=task['n_trials'], callbacks=[budget])
+
+
+def run_parallel_study(qaa_instance, n_trials=500, n_workers=None, parameterization='stick-breaking', seed=None):
+    """
+    Optimizes the selected strategy with one Optuna study shared by several worker processes.
+
+    The study lives in a JournalStorage file in a temporary directory; every worker runs a TPE sampler against it
+    and stops when the study as a whole has n_trials trials, so the budget does not grow with the workers (up to
+    n_workers - 1 trials can be in flight when it is reached). Trials are scored with QAA.batch_objective on a
+    worker_copy of the strategy.
+
+    Parameters:
+    - qaa_instance (QAA): Strategy with its optimization strategy set and its data loaded.
+    - n_trials (int, optional): Trial budget of the whole study. Defaults to 500.
+    - n_workers (int, optional): Worker processes. Defaults to the number of cores.
+    - parameterization (str, optional): 'stick-breaking' or 'softmax', see simplex_from_params. Defaults to 'stick-breaking'.
+    - seed (int, optional): Seed of the first worker's sampler (the next workers use seed + 1, ...). Defaults to None.
+
+    Returns:
+    - OptimizeResult: x (best weights, within the bounds), fun, nit (number of the best trial + 1) and nfev (trials run).
+    """
+    import optuna
+    optuna.logging.set_verbosity(optuna.logging.WARNING)
+
+    if parameterization not in PARAMETERIZATIONS:
+        raise ValueError(f"Unknown parameterization '{parameterization}'. Use one of {PARAMETERIZATIONS}.")
+    n_workers = max(1, min(n_workers or os.cpu_count(), n_trials))
+    n_assets = len(qaa_instance.tickers)
+
+    worker_instance = worker_copy(qaa_instance)
+
+    directory = tempfile.mkdtemp(prefix='qaa_optuna_')
+    try:
+        storage_path = os.path.join(directory, 'journal.log')
+        study = optuna.create_study(study_name='qaa', storage=_journal_storage(storage_path), direction='minimize')
+        if qaa_instance.initial_weights is not None:
+            # The warm-start weights are evaluated first, so the search never ends worse than the previous optimum
+            study.enqueue_trial(params_from_simplex(qaa_instance.starting_weights(), parameterization))
+
+        tasks = [{'qaa_instance': worker_instance, 'storage_path': storage_path, 'study_name': 'qaa', 'n_trials': n_trials,
+                  'parameterization': parameterization, 'seed': seed + worker if seed is not None else None} for worker in range(n_workers)]
+        if n_workers == 1:
+            _study_worker(tasks[0])
+        else:
+            with ProcessPoolExecutor(max_workers=n_workers) as pool:
+                for future in [pool.submit(_study_worker, task) for task in tasks]:
+                    future.result()
+
+        best_trial = study.best_trial
+        trials = study.get_trials(deepcopy=False, states=(optuna.trial.TrialState.COMPLETE,))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    simplex = simplex_from_params(best_trial.params, n_assets, parameterization)
+    weights = project_capped_simplex(simplex, qaa_instance.lower_bound, qaa_instance.higher_bound)
+    return OptimizeResult(x=weights, fun=best_trial.value, success=True, nit=best_trial.number + 1, nfev=len(trials),
+                          message=f'{len(trials)} trials over {n_workers} processes.')
+
+# ----------------------------------------------------------------------------------------------------
+
+# MULTI-START SLSQP
+def multistart_points(qaa_instance, n_starts=8, seed=None):
+    """
+    Diverse feasible starting points for a multi-start local solver.
+
+    In order: the warm-start weights (when the strategy has them), equal weights, corners that put the higher bound
+    on the assets with the highest mean return, and Dirichlet draws over the bounded simplex for the rest.
+
+    :param qaa_instance: Strategy whose bounds and moments define the points.
+    :type qaa_instance: QAA
+    :param n_starts: Number of starting points.
+    :type n_starts: int
+    :param seed: Seed of the Dirichlet draws.
+    :type seed: int
+    :return: Starting points (n_starts x N).
+    :rtype: np.ndarray
+    """
+    n_assets = len(qaa_instance.tickers)
+    lower_bound, higher_bound = qaa_instance.lower_bound, qaa_instance.higher_bound
+    points = []
+    if qaa_instance.initial_weights is not None:
+        points.append(qaa_instance.starting_weights())
+    points.append(project_capped_simplex(np.ones(n_assets) / n_assets, lower_bound, higher_bound))
+
+    n_corners = min(n_assets, max(1, (n_starts - len(points)) // 3))
+    for asset in np.argsort(-qaa_instance.moments['mean'])[:n_corners]:
+        corner = np.full(n_assets, lower_bound, dtype=float)
+        corner[asset] = higher_bound
+        points.append(project_capped_simplex(corner, lower_bound, higher_bound))
+
+    n_random = n_starts - len(points)
+    if n_random > 0:
+        points.extend(sample_bounded_simplex(n_random, n_assets, lower_bound, higher_bound, seed))
+    return np.array(points[:n_starts])
+
+
+def _slsqp_start_task(task):
+    """Runs one SLSQP solve of a strategy copy from one starting point."""
+    qaa_instance = copy.copy(task['qaa_instance'])
+    qaa_instance.initial_weights = task['start']
+    qaa_instance.optimize_slsqp()
+    result = qaa_instance.optimization_result
+    return {'x': np.asarray(result.x, dtype=float), 'fun': float(result.fun), 'success': bool(result.success),
+            'nit': int(result.nit), 'nfev': int(result.nfev)}
+
+
+def run_multistart_slsqp(qaa_instance, n_starts=8, n_workers=None, agreement=3, tolerance=1e-6, seed=None):
+    """
+    Solves the selected strategy with SLSQP from several starting points and keeps the best converged solution.
+
+    Starts come from multistart_points and run on a process pool (inline with one worker). The search stops early,
+    cancelling the pending starts, once `agreement` converged starts reach the best objective within `tolerance`
+    (relative) at weights within 1e-3 of each other, since further starts are unlikely to find a better optimum.
+
+    Parameters:
+    - qaa_instance (QAA): Strategy with its optimization strategy set and its data loaded.
+    - n_starts (int, optional): Maximum number of starting points. Defaults to 8.
+    - n_workers (int, optional): Worker processes. Defaults to the number of cores.
+    - agreement (int, optional): Converged starts at the same optimum that end the search. Defaults to 3.
+    - tolerance (float, optional): Relative objective tolerance of the agreement test. Defaults to 1e-6.
+    - seed (int, optional): Seed of the Dirichlet starting points. Defaults to None.
+
+    Returns:
+    - OptimizeResult: The best converged start (success=False and the best start overall when none converged), with
+      nfev summed over every start that ran, starts (number run) and agreeing (starts at the best optimum).
+    """
+    points = multistart_points(qaa_instance, n_starts, seed)
+    n_workers = max(1, min(n_workers or os.cpu_count(), len(points)))
+    worker_instance = worker_copy(qaa_instance)
+    tasks = [{'qaa_instance': worker_instance, 'start': start} for start in points]
+
+    outcomes = []
+
+    def agreeing():
+        converged = [outcome for outcome in outcomes if outcome['success']]
+        if not converged:
+            return 0
+        best = min(converged, key=lambda outcome: outcome['fun'])
+        return sum(abs(outcome['fun'] - best['fun']) <= tolerance * (1 + abs(best['fun']))
+                   and np.abs(outcome['x'] - best['x']).max() <= 1e-3 for outcome in converged)
+
+    if n_workers == 1:
+        for task in tasks:
+            outcomes.append(_slsqp_start_task(task))
+            if agreeing() >= agreement:
+                break
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            futures = [pool.submit(_slsqp_start_task, task) for task in tasks]
+            for future in as_completed(futures):
+                outcomes.append(future.result())
+                if agreeing() >= agreement:
+                    for pending in futures:
+                        pending.cancel()
+                    break
+
+    converged = [outcome for outcome in outcomes if outcome['success']]
+    best = min(converged or outcomes, key=lambda outcome: outcome['fun'])
+    n_agreeing = agreeing()
+    return OptimizeResult(x=best['x'], fun=best['fun'], success=bool(converged), nit=best['nit'],
+                          nfev=sum(outcome['nfev'] for outcome in outcomes), starts=len(outcomes), agreeing=int(n_agreeing),
+                          message=f'{len(converged)} of {len(outcomes)} starts converged; {n_agreeing} agree on the best optimum.')
@@ -0,0 +1,373 @@
+"""
+# -- --------------------------------------------------------------------------------------------------- -- #
+# -- project: Quantitative Asset Allocation (QAA)                                                        -- #
+# -- script: solvers.py - Python script with the dedicated solvers used by the QAA optimization models   -- #
+# -- authors: diegotita4 - Antonio-IF - JoAlfonso - J3SVS - Oscar148                                     -- #
+# -- license: GNU GENERAL PUBLIC LICENSE - Version 3, 29 June 2007                                       -- #
+# -- repository: https://github.com/diegotita4/PAP                                                       -- #
+# -- --------------------------------------------------------------------------------------------------- -- #
+"""
+
+# ----------------------------------------------------------------------------------------------------
+
+# LIBRARIES
+import numpy as np
+from scipy.optimize import OptimizeResult
+
+# ----------------------------------------------------------------------------------------------------
+
+# FEASIBLE SET: {w : sum(w) = 1, lower <= w <= higher}
+def check_feasible_bounds(n_assets, lower_bound, higher_bound):
+    """
+    Checks that the budget constraint can be met within the bounds.
+
+    :param n_assets: Number of assets.
+    :type n_assets: int
+    :param lower_bound: Lower bound for every weight.
+    :type lower_bound: float
+    :param higher_bound: Higher bound for every weight.
+    :type higher_bound: float
+    :return: None when the bounds are feasible, otherwise the reason, used as the message of a failed result.
+    :rtype: str
+    """
+    if n_assets * lower_bound > 1 + 1e-12 or n_assets * higher_bound < 1 - 1e-12 or lower_bound > higher_bound:
+        return "The bounds do not allow weights that sum to 1."
+    return None
+
+
+def infeasible_result(message):
+    """Failed result of a solver whose bounds admit no portfolio, like the one SLSQP reports."""
+    return OptimizeResult(x=None, fun=None, success=False, nit=0, message=message)
+
+
+def project_capped_simplex(weights, lower_bound, higher_bound, total=1.0):
+    """
+    Euclidean projection onto {w : sum(w) = total, lower <= w <= higher}.
+
+    The projection is clip(weights - shift) for the shift that meets the budget. The clipped sum is
+    piecewise linear in the shift with breakpoints at weights - higher and weights - lower, so it is
+    evaluated at every breakpoint with sorted prefix sums and the shift is interpolated exactly.
+
+    :param weights: Point to project.
+    :type weights: np.ndarray
+    :param lower_bound: Lower bound for every weight.
+    :type lower_bound: float
+    :param higher_bound: Higher bound for every weight.
+    :type higher_bound: float
+    :param total: Budget.
+    :type total: float
+    :return: Projected weights.
+    :rtype: np.ndarray
+    """
+    weights = np.asarray(weights, dtype=float)
+    n_assets = weights.shape[0]
+    upper_breaks = np.sort(weights - higher_bound)
+    lower_breaks = np.sort(weights - lower_bound)
+    upper_prefix = np.concatenate([[0.0], np.cumsum(upper_breaks + higher_bound)])
+    lower_prefix = np.concatenate([[0.0], np.cumsum(lower_breaks + lower_bound)])
+
+    shifts = np.concatenate([upper_breaks, lower_breaks])
+    shifts.sort()
+    below_upper = np.searchsorted(upper_breaks, shifts, side='left')
+    below_lower = np.searchsorted(lower_breaks, shifts, side='right')
+    clipped_sums = (higher_bound * (n_assets - below_upper) + lower_bound * below_lower
+                    + upper_prefix[below_upper] - lower_prefix[below_lower] - shifts * (below_upper - below_lower))
+
+    # The clipped sum decreases with the shift; np.interp needs increasing abscissas
+    shift = np.interp(total, clipped_sums[::-1], shifts[::-1])
+    return np.clip(weights - shift, lower_bound, higher_bound)
+
+# ----------------------------------------------------------------------------------------------------
+
+# QUADRATIC PROGRAMMING
+def solve_box_qp(quadratic, linear=None, lower_bound=0.0, higher_bound=1.0, initial_weights=None, tol=1e-10, max_iter=None):
+    """
+    Solves min 0.5 * w'Qw + c'w subject to sum(w) = 1 and lower <= w <= higher exactly.
+
+    A short accelerated projected-gradient run identifies the bounds that are active at the optimum; a
+    primal active-set method then solves the KKT system on the free weights until every multiplier has
+    the right sign. Passing the previous solution as initial_weights usually leaves only the final KKT
+    solve to do.
+
+    :param quadratic: Positive semidefinite matrix Q (N x N).
+    :type quadratic: np.ndarray
+    :param linear: Linear term c (N). Defaults to zeros.
+    :type linear: np.ndarray
+    :param lower_bound: Lower bound for every weight.
+    :type lower_bound: float
+    :param higher_bound: Higher bound for every weight.
+    :type higher_bound: float
+    :param initial_weights: Warm start. Defaults to equal weights.
+    :type initial_weights: np.ndarray
+    :param tol: Tolerance for steps and multipliers.
+    :type tol: float
+    :param max_iter: Maximum number of active-set iterations. Defaults to 10 * N.
+    :type max_iter: int
+    :return: Result with x, fun, success, nit (projected-gradient plus active-set iterations) and message;
+             x is None and success False when the bounds admit no portfolio.
+    :rtype: scipy.optimize.OptimizeResult
+    """
+    quadratic = np.asarray(quadratic, dtype=float)
+    quadratic = (quadratic + quadratic.T) / 2
+    n_assets = quadratic.shape[0]
+    linear = np.zeros(n_assets) if linear is None else np.asarray(linear, dtype=float)
+    infeasible = check_feasible_bounds(n_assets, lower_bound, higher_bound)
+    if infeasible:
+        return infeasible_result(infeasible)
+    max_iter = 10 * n_assets if max_iter is None else max_iter
+
+    start = np.full(n_assets, 1 / n_assets) if initial_weights is None else np.asarray(initial_weights, dtype=float)
+    weights = project_capped_simplex(start, lower_bound, higher_bound)
+
+    # Accelerated projected gradient to land near the optimal face; with a (nearly) linear objective the floor keeps
+    # the steps within the scale of the weights, where the projection cannot lose the budget to rounding
+    lipschitz = max(np.linalg.eigvalsh(quadratic)[-1], np.abs(linear).max(), 1e-12)
+    momentum, previous = 1.0, weights
+    warmup_steps = 50 if initial_weights is None else 10
+    for _ in range(warmup_steps):
+        gradient = quadratic.dot(weights) + linear
+        candidate = project_capped_simplex(weights - gradient / lipschitz, lower_bound, higher_bound)
+        next_momentum = (1 + np.sqrt(1 + 4 * momentum ** 2)) / 2
+        weights, previous = candidate + (momentum - 1) / next_momentum * (candidate - previous), candidate
+        weights = project_capped_simplex(weights, lower_bound, higher_bound)
+        momentum = next_momentum
+    weights = previous
+
+    # The projection clips onto the bounds exactly, so the initial working set is read off directly
+    scale = max(np.abs(quadratic).max(), np.abs(linear).max(), 1e-300)
+    at_lower = weights == lower_bound
+    at_higher = ~at_lower & (weights == higher_bound)
+
+    converged, iteration = False, 0
+    for iteration in range(1, max_iter + 1):
+        free = ~(at_lower | at_higher)
+        gradient = quadratic.dot(weights) + linear
+        n_free = free.sum()
+
+        # Equality-constrained step on the free weights: [Q_FF 1; 1' 0] [p; -mu] = [-g_F; 0]
+        kkt = np.zeros((n_free + 1, n_free + 1))
+        kkt[:n_free, :n_free] = quadratic[np.ix_(free, free)]
+        kkt[:n_free, n_free] = 1
+        kkt[n_free, :n_free] = 1
+        rhs = np.append(-gradient[free], 0)
+        solution = np.linalg.lstsq(kkt, rhs, rcond=None)[0]
+        step = np.zeros(n_assets)
+        step[free] = solution[:n_free]
+        multiplier = -solution[n_free] if n_free > 0 else np.median(gradient)
+
+        if np.max(np.abs(step), initial=0) <= tol:
+            # Signs of the bound multipliers decide whether a bound should be released
+            bound_multipliers = np.where(at_lower, gradient - multiplier, np.where(at_higher, multiplier - gradient, np.inf))
+            worst = np.argmin(bound_multipliers)
+            if bound_multipliers[worst] >= -tol * scale:
+                converged = True
+                break
+            at_lower[worst] = at_higher[worst] = False
+            continue
+
+        # Longest feasible step along the direction, adding the first blocking bound to the working set
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratios = np.where(step < -tol, (lower_bound - weights) / step, np.where(step > tol, (higher_bound - weights) / step, np.inf))
+        ratios[~free] = np.inf
+        blocking = np.argmin(ratios)
+        alpha = min(1.0, ratios[blocking])
+        weights = weights + alpha * step
+        if alpha < 1.0:
+            if step[blocking] < 0:
+                at_lower[blocking], weights[blocking] = True, lower_bound
+            else:
+                at_higher[blocking], weights[blocking] = True, higher_bound
+
+    weights = np.clip(weights, lower_bound, higher_bound)
+    message = 'Optimal active set found.' if converged else 'Iteration limit reached.'
+    if abs(weights.sum() - 1) > 1e-9:
+        # Never hand back weights off the budget: project them and report the solve as failed
+        weights, converged, message = project_capped_simplex(weights, lower_bound, higher_bound), False, 'The weights lost the budget constraint.'
+    return OptimizeResult(x=weights, fun=0.5 * weights.dot(quadratic).dot(weights) + linear.dot(weights), success=converged,
+                          nit=warmup_steps + iteration, message=message)
+
+
+def maximize_ratio_on_frontier(quadratic, linear, ratio, lower_bound=0.0, higher_bound=1.0, initial_weights=None, tol=1e-6):
+    """
+    Maximizes a return/risk ratio (e.g. Sharpe) by searching the bounded mean-variance frontier.
+
+    Each frontier point is the QP min 0.5 * (1 - t) * w'Qw - t * c'w; the ratio is quasi-concave along the
+    frontier, so a golden-section search over t in [0, 1] finds its maximum. Each QP is warm-started from
+    the previous frontier point. The best portfolio is only guaranteed to lie on the frontier when its
+    excess return is positive, so the search reports failure otherwise.
+
+    :param quadratic: Covariance matrix (N x N).
+    :type quadratic: np.ndarray
+    :param linear: Expected excess returns (N), with the same excess as the numerator of the ratio.
+    :type linear: np.ndarray
+    :param ratio: Function of the weights to maximize.
+    :type ratio: callable
+    :param lower_bound: Lower bound for every weight.
+    :type lower_bound: float
+    :param higher_bound: Higher bound for every weight.
+    :type higher_bound: float
+    :param initial_weights: Warm start for the first QP.
+    :type initial_weights: np.ndarray
+    :param tol: Tolerance on t.
+    :type tol: float
+    :return: Result with x, fun (the maximized ratio), success and nit (number of QPs solved).
+    :rtype: scipy.optimize.OptimizeResult
+    """
+    linear = np.asarray(linear, dtype=float)
+    infeasible = check_feasible_bounds(len(linear), lower_bound, higher_bound)
+    if infeasible:
+        return infeasible_result(infeasible)
+    # Normalize both terms so t trades them off on comparable scales
+    quadratic_scale = max(np.abs(quadratic).max(), 1e-300)
+    linear_scale = max(np.abs(linear).max(), 1e-300)
+    state = {'weights': initial_weights, 'solves': 0, 'success': True}
+    evaluated = {}
+
+    def frontier_point(t):
+        if t not in evaluated:
+            result = solve_box_qp((1 - t) * quadratic / quadratic_scale + 1e-12 * np.eye(len(linear)), -t * linear / linear_scale,
+                                  lower_bound, higher_bound, state['weights'])
+            state['weights'], state['solves'] = result.x, state['solves'] + 1
+            state['success'] &= result.success
+            evaluated[t] = (ratio(result.x), result.x)
+        return evaluated[t]
+
+    golden = (np.sqrt(5) - 1) / 2
+    low, high = 0.0, 1.0
+    left, right = high - golden * (high - low), low + golden * (high - low)
+    while high - low > tol:
+        # Past the highest-return corner the frontier is flat in t; ties (up to rounding) move towards lower risk
+        left_value, right_value = frontier_point(left)[0], frontier_point(right)[0]
+        if left_value >= right_value - 1e-9 * abs(right_value):
+            high, right = right, left
+            left = high - golden * (high - low)
+        else:
+            low, left = left, right
+            right = low + golden * (high - low)
+
+    best_value, best_weights = max((frontier_point(t) for t in (0.0, (low + high) / 2, 1.0)), key=lambda point: point[0])
+    if linear.dot(best_weights) <= 0:
+        # With a negative excess the ratio grows with the risk, away from the efficient frontier
+        return OptimizeResult(x=best_weights, fun=best_value, success=False, nit=state['solves'],
+                              message='No frontier portfolio has a positive excess return.')
+    return OptimizeResult(x=best_weights, fun=best_value, success=state['success'], nit=state['solves'],
+                          message='Frontier search finished.')
+
+# ----------------------------------------------------------------------------------------------------
+
+# LINEAR PROGRAMMING
+def solve_cvar_lp(returns, alpha=0.05, lower_bound=0.0, higher_bound=1.0):
+    """
+    Minimizes the CVaR of the portfolio losses with the Rockafellar-Uryasev linear program.
+
+    The primal program over the weights w (N), the VaR level z and one excess loss u_t per scenario (T) is
+
+        min z + 1 / (alpha * T) * sum(u)
+        s.t. u_t >= -r_t'w - z, u >= 0, sum(w) = 1, lower <= w <= higher
+
+    It is solved through its dual, which has only N + 1 equality rows and box-bounded scenario
+    probabilities q, so HiGHS works on a much smaller basis:
+
+        max v + lower * sum(s) - higher * sum(t)
+        s.t. R'q + v + s - t = 0, sum(q) = 1, 0 <= q <= 1 / (alpha * T), s, t >= 0
+
+    The optimal weights are the multipliers of the N asset rows. The matrices are sparse apart from the
+    returns block, so long histories stay within bounded memory, and HiGHS is deterministic.
+
+    :param returns: Scenario matrix of daily returns (T x N).
+    :type returns: np.ndarray
+    :param alpha: Tail probability.
+    :type alpha: float
+    :param lower_bound: Lower bound for every weight.
+    :type lower_bound: float
+    :param higher_bound: Higher bound for every weight.
+    :type higher_bound: float
+    :return: Result with x (the weights), fun (the CVaR of the losses), success, nit and message; x is None and
+             success False when the bounds admit no portfolio.
+    :rtype: scipy.optimize.OptimizeResult
+    """
+    from scipy import sparse
+    from scipy.optimize import linprog
+
+    returns = np.asarray(returns, dtype=float)
+    n_scenarios, n_assets = returns.shape
+    infeasible = check_feasible_bounds(n_assets, lower_bound, higher_bound)
+    if infeasible:
+        return infeasible_result(infeasible)
+    tail_weight = 1 / (alpha * n_scenarios)
+
+    cost = np.concatenate([np.zeros(n_scenarios), [-1.0], np.full(n_assets, -lower_bound), np.full(n_assets, higher_bound)])
+    identity = sparse.identity(n_assets, format='csr')
+    a_eq = sparse.vstack([
+        sparse.hstack([sparse.csr_matrix(returns.T), np.ones((n_assets, 1)), identity, -identity]),
+        sparse.hstack([sparse.csr_matrix(np.ones((1, n_scenarios))), sparse.csr_matrix((1, 1 + 2 * n_assets))]),
+    ], format='csr')
+    b_eq = np.concatenate([np.zeros(n_assets), [1.0]])
+    bounds = [(0, tail_weight)] * n_scenarios + [(None, None)] + [(0, None)] * (2 * n_assets)
+
+    result = linprog(cost, A_eq=a_eq, b_eq=b_eq, bounds=bounds, method='highs')
+    if result.status != 0:
+        return OptimizeResult(x=None, fun=None, success=False, nit=result.nit, message=result.message)
+
+    weights = -result.eqlin.marginals[:n_assets]
+    if abs(weights.sum() - 1) > 1e-6 or weights.min() < lower_bound - 1e-6 or weights.max() > higher_bound + 1e-6:
+        return _solve_cvar_lp_primal(returns, alpha, lower_bound, higher_bound)
+    return OptimizeResult(x=np.clip(weights, lower_bound, higher_bound), fun=-result.fun, success=True, nit=result.nit,
+                          message=result.message)
+
+
+def _solve_cvar_lp_primal(returns, alpha, lower_bound, higher_bound):
+    """Primal form of solve_cvar_lp, used when the dual multipliers cannot be read back as weights."""
+    from scipy import sparse
+    from scipy.optimize import linprog
+
+    n_scenarios, n_assets = returns.shape
+    cost = np.concatenate([np.zeros(n_assets), [1.0], np.full(n_scenarios, 1 / (alpha * n_scenarios))])
+    a_ub = sparse.hstack([sparse.csr_matrix(-returns), -np.ones((n_scenarios, 1)), -sparse.identity(n_scenarios, format='csr')], format='csr')
+    a_eq = sparse.csr_matrix(np.concatenate([np.ones(n_assets), np.zeros(1 + n_scenarios)]).reshape(1, -1))
+    bounds = [(lower_bound, higher_bound)] * n_assets + [(None, None)] + [(0, None)] * n_scenarios
+
+    result = linprog(cost, A_ub=a_ub, b_ub=np.zeros(n_scenarios), A_eq=a_eq, b_eq=[1.0], bounds=bounds, method='highs')
+    weights = result.x[:n_assets] if result.status == 0 else None
+    return OptimizeResult(x=weights, fun=result.fun, success=result.status == 0, nit=result.nit, message=result.message)
+
+# ----------------------------------------------------------------------------------------------------
+
+# RANDOM SEARCH
+def sample_bounded_simplex(n_samples, n_assets, lower_bound=0.0, higher_bound=1.0, seed=None, max_redraws=10):
+    """
+    Draws weight vectors uniformly from {w : sum(w) = 1, lower <= w <= higher}.
+
+    Samples are lower + (1 - N * lower) * Dirichlet(1), which always meet the budget and the lower bound;
+    rows above the higher bound are redrawn a few times and the rest projected onto the feasible set.
+
+    :param n_samples: Number of weight vectors (K).
+    :type n_samples: int
+    :param n_assets: Number of assets (N).
+    :type n_assets: int
+    :param lower_bound: Lower bound for every weight.
+    :type lower_bound: float
+    :param higher_bound: Higher bound for every weight.
+    :type higher_bound: float
+    :param seed: Seed for the random generator.
+    :type seed: int
+    :param max_redraws: Rounds of redraws before projecting the remaining infeasible rows.
+    :type max_redraws: int
+    :return: Weight matrix (K x N).
+    :rtype: np.ndarray
+    """
+    infeasible = check_feasible_bounds(n_assets, lower_bound, higher_bound)
+    if infeasible:
+        raise ValueError(infeasible)
+    rng = np.random.default_rng(seed)
+    free_budget = 1 - n_assets * lower_bound
+    weights = lower_bound + free_budget * rng.dirichlet(np.ones(n_assets), size=n_samples)
+
+    for _ in range(max_redraws):
+        infeasible = np.flatnonzero(weights.max(axis=1) > higher_bound)
+        if infeasible.size == 0:
+            break
+        weights[infeasible] = lower_bound + free_budget * rng.dirichlet(np.ones(n_assets), size=infeasible.size)
+    for row in np.flatnonzero(weights.max(axis=1) > higher_bound):
+        weights[row] = project_capped_simplex(weights[row], lower_bound, higher_bound)
+    return weights
@@ -0,0 +1,208 @@
+"""
+# -- --------------------------------------------------------------------------------------------------- -- #
+# -- project: Quantitative Asset Allocation (QAA)                                                        -- #
+# -- script: strategies.py - Python script with the registry of QAA strategies and their capabilities    -- #
+# -- authors: diegotita4 - Antonio-IF - JoAlfonso - J3SVS - Oscar148                                     -- #
+# -- license: GNU GENERAL PUBLIC LICENSE - Version 3, 29 June 2007                                       -- #
+# -- repository: https://github.com/diegotita4/PAP                                                       -- #
+# -- --------------------------------------------------------------------------------------------------- -- #
+"""
+
+# ----------------------------------------------------------------------------------------------------
+
+# LIBRARIES
+# Objectives and gradients are built from QAA methods by name, so this module does not import functions.py
+
+# ----------------------------------------------------------------------------------------------------
+
+# STRATEGY SPECIFICATION
+class StrategySpec:
+    """
+    What a QAA strategy needs and which solvers can handle it.
+
+    Inputs name the data the objective reads. The moment cache (QAA.moments) is always built in one pass and already
+    holds the scenarios, the downside deviations and, with benchmark prices, the semivariance matrix; the inputs
+    past it are only computed by QAA.prepare_inputs for the strategies that declare them:
+    - 'moments': Mean vector and covariance matrix of the returns window.
+    - 'scenarios': The (T x N) returns matrix itself (Omega, CVaR); parallel.worker_copy only ships it to the
+      workers of the strategies that declare it.
+    - 'downside': Downside standard deviation of every asset (part of the moment cache).
+    - 'benchmark': Benchmark returns (semivariance matrix, benchmark mean); QAA.prepare_inputs fails early without them.
+    - 'factors': Fama-French daily factors, loaded only when declared.
+    - 'factor_model': Betas, premia and low-rank covariance fitted on the factors (QAA.factor_model), only when declared.
+    - 'views': Black-Litterman views and posterior, only when declared.
+
+    Attributes:
+    - name: Strategy name, as passed to QAA.set_optimization_strategy.
+    - objective / gradient: Functions of a QAA returning the objective (to minimize) and its gradient, or None.
+    - batch_objective: Function of a QAA returning the objective of every row of a (K x N) weight matrix, used by
+      QAA.batch_objective (Monte Carlo Batch and Parallel), or None.
+    - qp: Function of a QAA returning the (Q, c) of min 0.5 * w'Qw + c'w solved by the QP model, or None.
+    - frontier: The QP is a mean-variance frontier (covariance, excess returns) along which the objective is
+      minimized, instead of the problem itself (Sharpe).
+    - inputs: Tuple of the inputs above.
+    - convex: Whether the objective is convex over the bounded simplex, so any local optimum is global.
+    - exact_models: Models that solve the strategy exactly ('QP', 'LP').
+    - exact_min_assets: Number of assets from which the exact model is faster than SLSQP; None keeps 'Auto' from choosing it.
+    - closed_form: Weights come from a closed-form allocation (HRP) rather than from an objective.
+    """
+
+    def __init__(self, name, objective=None, gradient=None, batch_objective=None, qp=None, frontier=False, inputs=('moments',),
+                 convex=False, exact_models=(), exact_min_assets=0, closed_form=False):
+        self.name = name
+        self.objective = objective
+        self.gradient = gradient
+        self.batch_objective = batch_objective
+        self.qp = qp
+        self.frontier = frontier
+        self.inputs = inputs
+        self.convex = convex
+        self.exact_models = exact_models
+        self.exact_min_assets = exact_min_assets
+        self.closed_form = closed_form
+
+    @property
+    def batch(self):
+        """Whether QAA.batch_objective scores many portfolios at once, which the batch models need."""
+        return self.batch_objective is not None
+
+    def models(self):
+        """Optimization models that accept the strategy."""
+        if self.closed_form:
+            return list(MODELS)
+        return [model for model in MODELS if (model not in EXACT_MODELS or model in self.exact_models)
+                and (model not in BATCH_MODELS or self.batch)]
+
+    def __repr__(self):
+        return f'StrategySpec({self.name!r})'
+
+# ----------------------------------------------------------------------------------------------------
+
+# REGISTRY
+# 'Auto' routes every strategy to the fastest model that accepts it (see route_model)
+MODELS = ['Auto', 'SLSQP', 'SLSQP Multi-Start', 'Monte Carlo', 'Monte Carlo Parallel', 'COBYLA', 'QP', 'LP', 'Monte Carlo Batch']
+# Models that only solve the strategies listing them in exact_models
+EXACT_MODELS = ('QP', 'LP')
+# Models that score portfolios with the batch objective
+BATCH_MODELS = ('Monte Carlo Batch', 'Monte Carlo Parallel')
+# Models that sample random portfolios, so two solves of the same problem return different weights
+STOCHASTIC_MODELS = ('Monte Carlo', 'Monte Carlo Parallel', 'Monte Carlo Batch')
+
+STRATEGIES = {spec.name: spec for spec in [
+    StrategySpec('Minimum Variance',
+                 objective=lambda qaa: qaa.minimum_variance,
+                 gradient=lambda qaa: qaa.minimum_variance_gradient,
+                 batch_objective=lambda qaa: qaa.minimum_variance_batch,
+                 qp=lambda qaa: qaa.minimum_variance_qp(),
+                 convex=True, exact_models=('QP',), exact_min_assets=30),
+    StrategySpec('Omega Ratio',
+                 objective=lambda qaa: lambda weights: -qaa.omega_ratio(weights, qaa.rf),
+                 gradient=lambda qaa: lambda weights: qaa.omega_ratio_gradient(weights, qaa.rf),
+                 batch_objective=lambda qaa: qaa.omega_ratio_batch,
+                 inputs=('moments', 'scenarios')),
+    StrategySpec('Semivariance',
+                 objective=lambda qaa: qaa.semivariance(),
+                 gradient=lambda qaa: qaa.semivariance_gradient,
+                 batch_objective=lambda qaa: qaa.semivariance_batch,
+                 qp=lambda qaa: qaa.semivariance_qp(),
+                 inputs=('moments', 'benchmark'), convex=True, exact_models=('QP',), exact_min_assets=30),
+    StrategySpec('Roy Safety First Ratio',
+                 objective=lambda qaa: qaa.roy_safety_first_ratio,
+                 gradient=lambda qaa: qaa.roy_safety_first_ratio_gradient,
+                 batch_objective=lambda qaa: qaa.roy_safety_first_ratio_batch),
+    StrategySpec('Sortino Ratio',
+                 objective=lambda qaa: qaa.sortino_ratio,
+                 gradient=lambda qaa: qaa.sortino_ratio_gradient,
+                 batch_objective=lambda qaa: qaa.sortino_ratio_batch,
+                 inputs=('moments', 'downside')),
+    StrategySpec('Fama French',
+                 objective=lambda qaa: qaa.fama_french,
+                 gradient=lambda qaa: qaa.fama_french_gradient,
+                 batch_objective=lambda qaa: qaa.fama_french_batch,
+                 inputs=('moments', 'factors')),
+    StrategySpec('Fama French Factor Model',
+                 objective=lambda qaa: qaa.fama_french_factor_model,
+                 gradient=lambda qaa: qaa.fama_french_factor_model_gradient,
+                 batch_objective=lambda qaa: qaa.fama_french_factor_model_batch,
+                 inputs=('moments', 'factors', 'factor_model')),
+    StrategySpec('CVaR',
+                 objective=lambda qaa: lambda weights: qaa.cvar(weights, alpha=0.05),
+                 gradient=lambda qaa: lambda weights: qaa.cvar_gradient(weights, alpha=0.05),
+                 batch_objective=lambda qaa: lambda weights: qaa.cvar_batch(weights, alpha=0.05),
+                 inputs=('moments', 'scenarios'), convex=True, exact_models=('LP',)),
+    StrategySpec('HRP', inputs=('moments',), convex=True, closed_form=True),
+    # The QP frontier search fails when no frontier portfolio has a positive excess, so 'Auto' keeps Sharpe on SLSQP
+    StrategySpec('Sharpe Ratio',
+                 objective=lambda qaa: qaa.sharpe_ratio,
+                 gradient=lambda qaa: qaa.sharpe_ratio_gradient,
+                 batch_objective=lambda qaa: qaa.sharpe_ratio_batch,
+                 qp=lambda qaa: qaa.sharpe_ratio_qp(), frontier=True,
+                 exact_models=('QP',), exact_min_assets=None),
+    StrategySpec('Black Litterman',
+                 objective=lambda qaa: qaa.black_litterman,
+                 gradient=lambda qaa: qaa.black_litterman_gradient,
+                 batch_objective=lambda qaa: qaa.black_litterman_batch,
+                 qp=lambda qaa: qaa.black_litterman_qp(),
+                 inputs=('moments', 'views'), convex=True, exact_models=('QP',), exact_min_assets=30),
+    StrategySpec('Total Return',
+                 objective=lambda qaa: qaa.Total_return,
+                 gradient=lambda qaa: qaa.Total_return_gradient,
+                 batch_objective=lambda qaa: qaa.Total_return_batch,
+                 inputs=('moments', 'benchmark')),
+]}
+
+# Other spellings used across the pages and older code
+ALIASES = {
+    'Hierarchical Risk Parity': 'HRP',
+    'Min Variance': 'Minimum Variance',
+    'Omega': 'Omega Ratio',
+    'Sortino': 'Sortino Ratio',
+    'Sharpe': 'Sharpe Ratio',
+    'Total Return AA': 'Total Return',
+}
+
+# ----------------------------------------------------------------------------------------------------
+
+# LOOKUP AND ROUTING
+def canonical_strategy(name):
+    """Registry name of a strategy, resolving aliases; unknown names are returned unchanged."""
+    return ALIASES.get(name, name)
+
+
+def get_strategy(name):
+    """
+    Specification of a strategy.
+
+    :param name: Strategy name or alias.
+    :type name: str
+    :return: The registered specification.
+    :rtype: StrategySpec
+    """
+    spec = STRATEGIES.get(canonical_strategy(name))
+    if spec is None:
+        raise ValueError("Invalid optimization strategy.")
+    return spec
+
+
+def route_model(spec, n_assets):
+    """
+    Fastest applicable model for a strategy, used by the 'Auto' model.
+
+    Exact models win from exact_min_assets assets on (the LP always, since CVaR is not smooth); below that, and
+    for the non-convex ratios, SLSQP with the analytic gradient is faster. Strategies without a gradient fall back
+    to Monte Carlo Batch (or Monte Carlo without a batch objective). Closed-form strategies are solved before any
+    model runs.
+
+    :param spec: Strategy specification.
+    :type spec: StrategySpec
+    :param n_assets: Number of assets.
+    :type n_assets: int
+    :return: Model name.
+    :rtype: str
+    """
+    for model in spec.exact_models:
+        if spec.exact_min_assets is not None and n_assets >= spec.exact_min_assets:
+            return model
+    if spec.gradient is not None:
+        return 'SLSQP'
+    return 'Monte Carlo Batch' if spec.batch else 'Monte Carlo'
@@ -3,6 +3,7 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 from backtest import dynamic_backtesting  
+from analytics import performance_summary
 import yfinance as yf
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
@@ -50,11 +51,12 @@ def show_backtesting():
         with col3:
             optimization_strategy = st.selectbox("ESTRATEGIA QAA", 
                                                  ['Minimum Variance', 'Omega Ratio', 'Semivariance',
-                                                  'Roy Safety First Ratio', 'Sortino Ratio', 'Fama French', 'CVaR', 
+                                                  'Roy Safety First Ratio', 'Sortino Ratio', 'Fama French', 'Fama French Factor Model', 'CVaR', 
                                                   'HRP', 'Sharpe Ratio', 'Black Litterman', 'Total Return'])
-            optimization_model = st.selectbox("MODELO DE OPTIMIZACIÓN", ['SLSQP', 'Monte Carlo', 'COBYLA'])            
+            optimization_model = st.selectbox("MODELO DE OPTIMIZACIÓN", ['Auto', 'SLSQP', 'SLSQP Multi-Start', 'Monte Carlo', 'Monte Carlo Parallel', 'Monte Carlo Batch', 'COBYLA'])            
             initial_portfolio_value = st.text_input("VALOR INICIAL DEL PORTAFOLIO ($)", value='0')
             commission = st.number_input("COMISIÓN (%)", value=0.0000, format="%.4f")
+            instrument = st.checkbox("MEDIR TIEMPOS Y LLAMADAS", value=False)
   
         submitted = st.form_submit_button(":violet[CALCULA BACKTESTING]", type="secondary", use_container_width=True)
 
@@ -80,12 +82,14 @@ def show_backtesting():
             optimization_strategy=optimization_strategy, 
             optimization_model=optimization_model,
             initial_portfolio_value=initial_portfolio_value,
-            commission=commission
+            commission=commission,
+            instrument=instrument
         )
 
         st.session_state['resultados_backtesting'] = resultados_backtesting
         st.session_state['daily_data'] = daily_data
         st.session_state['portfolio_values'] = portfolio_values
+        st.session_state['backtesting_stats'] = resultados_backtesting.attrs.get('stats')
 
     if 'resultados_backtesting' in st.session_state:
     
@@ -96,14 +100,33 @@ def show_backtesting():
 
             # Plot the portfolio value with optional rebalance lines
             plot_portfolio_value(st.session_state['daily_data'], st.session_state['portfolio_values'], rebalance_dates)
+            show_metrics(st.session_state['portfolio_values'], st.session_state['resultados_backtesting'], rf)
 
         # Always plot the last asset weights pie chart
         plot_asset_weights_pie_chart(st.session_state['resultados_backtesting'], tickers_list)
 
+        if st.session_state.get('backtesting_stats') is not None:
+            show_stats_panel(st.session_state['backtesting_stats'])
+
     add_vertical_space(5)
 
     badge(type="github", name="diegotita4/PAP")
 
+def show_metrics(portfolio_values, resultados_backtesting, rf):
+    # Métricas vectorizadas del valor diario del portafolio (ver analytics.performance_summary)
+    turnover = {portfolio_values.name: resultados_backtesting.attrs['turnover']} if 'turnover' in resultados_backtesting.attrs else None
+    metrics = performance_summary(portfolio_values, rf=rf / 100, turnover=turnover).iloc[0]
+    columns = st.columns(4)
+    columns[0].metric("CAGR", f"{metrics['cagr']:.2%}")
+    columns[1].metric("VOLATILIDAD ANUAL", f"{metrics['annual_volatility']:.2%}")
+    columns[2].metric("SHARPE", f"{metrics['sharpe_ratio']:.2f}")
+    columns[3].metric("SORTINO", f"{metrics['sortino_ratio']:.2f}")
+    columns = st.columns(4)
+    columns[0].metric("MÁXIMO DRAWDOWN", f"{metrics['max_drawdown']:.2%}")
+    columns[1].metric("DURACIÓN DEL DRAWDOWN (días)", f"{metrics['max_drawdown_duration']:.0f}")
+    columns[2].metric("CALMAR", f"{metrics['calmar_ratio']:.2f}")
+    columns[3].metric("ROTACIÓN ANUAL", f"{metrics['annual_turnover']:.2%}")
+
 def plot_asset_weights_pie_chart(resultados_backtesting, tickers):
     last_weights = resultados_backtesting.iloc[-1]
     weights = [last_weights[f'weight_{ticker}'] for ticker in tickers]
@@ -125,4 +148,25 @@ def plot_portfolio_value(daily_data, portfolio_values, rebalance_dates=None, sho
         for date in rebalance_dates:
             fig.add_vline(x=date, line_width=2, line_dash="dash", line_color="red")
 
-    st.plotly_chart(fig, use_container_width=True)
\ No newline at end of file
+    st.plotly_chart(fig, use_container_width=True)
+
+def show_stats_panel(stats):
+    """Per-phase timings, solver counters and one row per optimization of an instrumented backtest."""
+    with st.expander("INSTRUMENTACIÓN", expanded=False):
+        solves = stats.solves_frame()
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("OPTIMIZACIONES", len(solves))
+        col2.metric("LLAMADAS A LA FUNCIÓN OBJETIVO", stats.counters.get('objective_calls', 0))
+        col3.metric("LLAMADAS A RESTRICCIONES", stats.counters.get('constraint_calls', 0))
+        col4.metric("VALORES DESCARGADOS", f"{stats.counters.get('downloaded_values', 0):,}")
+
+        phases = stats.phases_frame()
+        st.caption("Las fases pueden estar anidadas (p. ej. la optimización dentro del rebalanceo), por lo que sus tiempos no se suman.")
+        fig = px.bar(phases, x='phase', y='seconds', labels={'phase': 'Fase', 'seconds': 'Segundos'}, title='TIEMPO POR FASE',
+                     color_discrete_sequence=['violet'])
+        st.plotly_chart(fig, use_container_width=True)
+        st.dataframe(phases)
+
+        if not solves.empty:
+            st.write(f"Convergencia: {solves['converged'].mean():.0%} de las optimizaciones.")
+            st.dataframe(solves)
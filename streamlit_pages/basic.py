@@ -4,14 +4,16 @@ import numpy as np
 import plotly.express as px
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
-from backtest import dynamic_backtesting
+from backtest import load_backtest_panel
+from parallel import run_backtest_grid
+from analytics import performance_summary
 import random
 from streamlit_extras.badges import badge
 from streamlit_extras.add_vertical_space import add_vertical_space
 from streamlit_extras.stoggle import stoggle
 
 list_strategy = ['Minimum Variance', 'Omega Ratio', 'Semivariance',
-                 'Roy Safety First Ratio', 'Sortino Ratio', 'Fama French', 'CVaR', 
+                 'Roy Safety First Ratio', 'Sortino Ratio', 'Fama French', 'Fama French Factor Model', 'CVaR', 
                  'HRP', 'Sharpe Ratio', 'Black Litterman', 'Total Return']
 
 def validate_date(date_text):
@@ -28,25 +30,36 @@ def parse_int_from_string(input_string):
 
 @st.cache_data(show_spinner=False)
 def run_backtesting(tickers, start_date, start_backtesting, end_date, frequency, rf, initial_value, commission):
-    strategy_results = {}
-    for i, strategy in enumerate(list_strategy):
-        results, daily_data, portfolio_values = dynamic_backtesting(
-            tickers=tickers,
-            start_date_data=start_date,
-            start_backtesting=start_backtesting,
-            end_date=end_date,
-            rebalance_frequency_months=frequency,
-            rf=rf,
-            optimization_strategy=strategy,
-            optimization_model='SLSQP',
-            initial_portfolio_value=initial_value,
-            commission=commission
-        )
-        strategy_results[strategy] = (results, daily_data, portfolio_values)
-    return strategy_results
+    # Load the data once and backtest every strategy in parallel against the same panel
+    data, benchmark_data, ff_data = load_backtest_panel(tickers, start_date, end_date, rf)
+    strategy_results = run_backtest_grid(
+        list_strategy, data, benchmark_data, ff_data,
+        tickers=tickers,
+        start_date_data=start_date,
+        start_backtesting=start_backtesting,
+        end_date=end_date,
+        rebalance_frequency_months=frequency,
+        rf=rf,
+        optimization_model='SLSQP',
+        initial_portfolio_value=initial_value,
+        commission=commission
+    )
+    return {strategy: strategy_results[strategy] for strategy in list_strategy}, benchmark_data
+
+def show_metrics_table(strategy_results, benchmark_data, rf):
+    # Todas las estrategias comparten el calendario del backtest: una matriz de valores y una sola pasada para las métricas
+    navs = pd.DataFrame({strategy: portfolio_values for strategy, (_, _, portfolio_values) in strategy_results.items()})
+    turnover = {strategy: result_df.attrs['turnover'] for strategy, (result_df, _, _) in strategy_results.items() if 'turnover' in result_df.attrs}
+    metrics = performance_summary(navs, benchmark=benchmark_data, rf=rf / 100, turnover=turnover)
+    st.subheader(":violet[MÉTRICAS DE DESEMPEÑO]", divider="violet")
+    st.dataframe(metrics.sort_values('final_value', ascending=False).style.format({
+        'final_value': "${:,.2f}", 'total_return': "{:.2%}", 'cagr': "{:.2%}", 'annual_volatility': "{:.2%}", 'max_drawdown': "{:.2%}",
+        'tracking_error': "{:.2%}", 'annual_turnover': "{:.2%}", 'max_drawdown_duration': "{:.0f}",
+        'sharpe_ratio': "{:.2f}", 'sortino_ratio': "{:.2f}", 'calmar_ratio': "{:.2f}", 'information_ratio': "{:.2f}"}, na_rep='-'))
+    add_vertical_space(3)
 
 def display_results(strategy_results, show_all_strategies):
-    sorted_strategies = sorted(strategy_results.items(), key=lambda x: x[1][2][-1], reverse=True)
+    sorted_strategies = sorted(strategy_results.items(), key=lambda x: x[1][2].iloc[-1], reverse=True)
     if show_all_strategies:
         strategies_to_display = sorted_strategies
     else:
@@ -56,7 +69,7 @@ def display_results(strategy_results, show_all_strategies):
         st.subheader(f":violet[{strategy}]", divider="violet")
         st.dataframe(result_df.assign(total_portfolio_value=lambda x: x['total_portfolio_value'].apply("${:,.2f}".format)))
         plot_strategy_performance(daily_data, portfolio_values, strategy)
-        final_value = portfolio_values[-1]
+        final_value = portfolio_values.iloc[-1]
         st.markdown(f":violet[${final_value:,.2f} (USD)]")
 
         add_vertical_space(3)
@@ -123,8 +136,9 @@ def show_basic():
             st.error("Ingresa un número válido para el Valor inicial del Portafolio.")
             return
 
-        strategy_results = run_backtesting(tickers_list, start_date_data, start_backtesting, end_date,
-                                           rebalance_frequency_months, rf, parsed_initial_value, commission)
+        strategy_results, benchmark_data = run_backtesting(tickers_list, start_date_data, start_backtesting, end_date,
+                                                           rebalance_frequency_months, rf, parsed_initial_value, commission)
+        show_metrics_table(strategy_results, benchmark_data, rf)
         display_results(strategy_results, show_all_strategies)
 
     add_vertical_space(5)
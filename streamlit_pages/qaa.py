@@ -1,5 +1,6 @@
 import streamlit as st
-from functions import QAA
+from backtest import load_backtest_panel
+from parallel import run_strategy_grid
 import pandas as pd
 from streamlit_extras.badges import badge
 from streamlit_extras.add_vertical_space import add_vertical_space
@@ -46,23 +47,26 @@ def show_qaa():
     badge(type="github", name="diegotita4/PAP")
 
 def calculate_all_strategies(tickers, start_date, end_date, rf, lower_bound, higher_bound):
-    optimization_models = ['SLSQP', 'Monte Carlo', 'COBYLA']
+    optimization_models = ['Auto', 'SLSQP', 'Monte Carlo', 'COBYLA']
     strategies = ['Minimum Variance', 'Omega Ratio', 'Semivariance', 'Roy Safety First Ratio',
-                  'Sortino Ratio', 'Fama French', 'CVaR', 'HRP', 'Sharpe Ratio',
+                  'Sortino Ratio', 'Fama French', 'Fama French Factor Model', 'CVaR', 'HRP', 'Sharpe Ratio',
                   'Black Litterman', 'Total Return']
     tickers_list = [ticker.strip() for ticker in tickers.split(',')]
     results = {}
 
+    # Download once and solve every strategy x model pair in parallel against the same panel
+    data, benchmark_data, ff_data = load_backtest_panel(tickers_list, start_date, end_date, rf)
+    grid = [(strategy, model) for strategy in strategies for model in optimization_models]
+    solutions = run_strategy_grid(grid, data, benchmark_data, ff_data, tickers=tickers_list, start_date=start_date, end_date=end_date,
+                                  rf=rf, lower_bound=lower_bound, higher_bound=higher_bound)
+
     for strategy in strategies:
         results[strategy] = pd.DataFrame(columns=['MODELO', 'PESOS', 'RENDIMIENTO', 'VOLATILIDAD'])
         for model in optimization_models:
-            qaa_instance = QAA(tickers=tickers_list, start_date=start_date, end_date=end_date, rf=rf, lower_bound=lower_bound, higher_bound=higher_bound)
-            qaa_instance.set_optimization_strategy(strategy)
-            qaa_instance.set_optimization_model(model)
-            qaa_instance.optimize()
-            if qaa_instance.optimal_weights is not None:
-                formatted_weights = [f"{weight * 100:.2f}%" for weight in qaa_instance.optimal_weights]
-                portfolio_return, portfolio_volatility = calculate_portfolio_metrics(qaa_instance)
+            solution = solutions[(strategy, model)]
+            if solution['optimal_weights'] is not None:
+                formatted_weights = [f"{weight * 100:.2f}%" for weight in solution['optimal_weights']]
+                portfolio_return, portfolio_volatility = solution['return'] * 100, solution['volatility'] * 100
                 new_row = pd.DataFrame({
                     'MODELO': [model], 
                     'PESOS': [", ".join(formatted_weights)], 
@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from analytics import performance_summary, rolling_metrics
+
+RF = 0.03
+
+
+def nav_panel(n_days=1500, seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range('2015-01-01', periods=n_days)
+    returns = rng.normal([0.0003, 0.0006, -0.0001], [0.008, 0.015, 0.011], size=(n_days, 3))
+    nav = pd.DataFrame(1e6 * np.cumprod(1 + returns, axis=0), index=index, columns=['steady', 'volatile', 'losing'])
+    # A portfolio that starts later and a few days without a price
+    nav.iloc[:200, 1] = np.nan
+    nav.iloc[700:703, 2] = np.nan
+    benchmark = pd.Series(100 * np.cumprod(1 + rng.normal(0.0003, 0.01, n_days)), index=index).drop(index[[n_days // 30, n_days * 3 // 5]])
+    return nav, benchmark
+
+
+def longest_drawdown(path):
+    # Periods since the row of the last peak; a missing value does not end the drawdown
+    peak, peak_row, longest = -np.inf, None, 0
+    for row, value in enumerate(path):
+        if value >= peak:
+            peak, peak_row = value, row
+        elif peak_row is not None:
+            longest = max(longest, row - peak_row)
+    return longest
+
+
+def reference_summary(nav, benchmark):
+    returns = nav.pct_change(fill_method=None)
+    excess = returns - RF / 252
+    active = returns.sub(benchmark.reindex(nav.index).pct_change(fill_method=None), axis=0)
+    rows = {}
+    for column in nav:
+        path = nav[column].dropna()
+        n_returns = nav.index.get_loc(path.index[-1]) - nav.index.get_loc(path.index[0])
+        cagr = (path.iloc[-1] / path.iloc[0]) ** (252 / n_returns) - 1
+        max_drawdown = (nav[column] / nav[column].cummax() - 1).min()
+        rows[column] = {
+            'final_value': path.iloc[-1],
+            'total_return': path.iloc[-1] / path.iloc[0] - 1,
+            'cagr': cagr,
+            'annual_volatility': returns[column].std() * np.sqrt(252),
+            'sharpe_ratio': excess[column].mean() / returns[column].std() * np.sqrt(252),
+            'sortino_ratio': excess[column].mean() / np.sqrt((excess[column].clip(upper=0) ** 2).mean()) * np.sqrt(252),
+            'max_drawdown': max_drawdown,
+            'max_drawdown_duration': longest_drawdown(nav[column]),
+            'calmar_ratio': cagr / abs(max_drawdown),
+            'tracking_error': active[column].std() * np.sqrt(252),
+            'information_ratio': active[column].mean() * 252 / (active[column].std() * np.sqrt(252)),
+        }
+    return pd.DataFrame(rows).T
+
+
+def test_performance_summary_matches_pandas():
+    nav, benchmark = nav_panel()
+    summary = performance_summary(nav, benchmark=benchmark, rf=RF)
+    expected = reference_summary(nav, benchmark)
+
+    pd.testing.assert_frame_equal(summary, expected[summary.columns], check_exact=False, rtol=1e-10, check_dtype=False)
+
+
+def test_performance_summary_of_a_flat_path_is_undefined():
+    flat = pd.Series(100., index=pd.bdate_range('2020-01-01', periods=50), name='flat')
+    summary = performance_summary(flat)
+
+    assert summary.loc['flat', 'max_drawdown'] == 0
+    assert summary[['sharpe_ratio', 'sortino_ratio', 'calmar_ratio']].isna().all(axis=None)
+
+
+@pytest.mark.parametrize('window', [2, 21, 252])
+def test_rolling_metrics_match_pandas(window):
+    nav, benchmark = nav_panel()
+    metrics = rolling_metrics(nav, window=window, benchmark=benchmark, rf=RF)
+
+    returns = nav.pct_change(fill_method=None).iloc[1:]
+    excess = returns - RF / 252
+    active = returns.sub(benchmark.reindex(nav.index).pct_change(fill_method=None).iloc[1:], axis=0)
+    rolling = lambda frame: frame.rolling(window, min_periods=1)
+    expected = {
+        'annual_return': rolling(returns).mean() * 252,
+        'annual_volatility': rolling(returns).std() * np.sqrt(252),
+        'sharpe_ratio': rolling(excess).mean() / rolling(returns).std() * np.sqrt(252),
+        'sortino_ratio': rolling(excess).mean() / np.sqrt(rolling(excess.clip(upper=0) ** 2).mean()) * np.sqrt(252),
+        'tracking_error': rolling(active).std() * np.sqrt(252),
+    }
+
+    # Window sums are differences of cumulative sums, which lose a few digits on two-day windows with almost no spread
+    assert set(metrics) == set(expected)
+    for name, frame in expected.items():
+        frame = frame.iloc[window - 1:].replace([np.inf, -np.inf], np.nan)
+        pd.testing.assert_frame_equal(metrics[name], frame, check_exact=False, rtol=1e-5, atol=1e-10, check_freq=False, obj=name)
+
+
+def test_rolling_metrics_reject_a_window_longer_than_the_path():
+    nav, _ = nav_panel(n_days=30)
+    with pytest.raises(ValueError):
+        rolling_metrics(nav, window=30)
@@ -0,0 +1,88 @@
+import warnings
+
+import numpy as np
+import pytest
+
+from backtest import dynamic_backtesting, dynamic_backtesting_x2
+from benchmark import synthetic_market
+
+COMMISSION = 0.0025
+
+
+@pytest.fixture(scope='module')
+def market():
+    tickers, data, benchmark_data, ff_data = synthetic_market(4, 4, seed=3)
+    # The first year and a half of the panel is the estimation window of the first rebalance
+    return tickers, data, benchmark_data, ff_data, data.index[378], data.index[-1]
+
+
+def run_x2(market, **flows):
+    tickers, data, benchmark_data, ff_data, start_backtesting, end_date = market
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        return dynamic_backtesting_x2(tickers, data.index[0], start_backtesting, end_date, 0.02, 'Minimum Variance', data, benchmark_data,
+                                      rebalance_frequency_months=6, ff_data=ff_data, initial_portfolio_value=1_000_000,
+                                      commission=COMMISSION, **flows)
+
+
+def event_prices(data, results):
+    # Every event trades at the last close before its date
+    return data.to_numpy(dtype=float)[data.index.searchsorted(results['end_date'].astype('datetime64[ns]'), side='left') - 1]
+
+
+def columns(results, prefix, data):
+    return results[[f'{prefix}_{ticker}' for ticker in data.columns]].to_numpy(dtype=float)
+
+
+@pytest.mark.parametrize('flows', [
+    {},
+    {'input_cash_amount': 100_000, 'input_cash_frequency_months': 12},
+    {'withdraw_amount': 150_000, 'withdraw_frequency_months': 4},
+    {'input_cash_amount': 50_000, 'input_cash_frequency_months': 3, 'withdraw_amount': 80_000, 'withdraw_frequency_months': 5},
+    # Withdrawals larger than the portfolio are skipped instead of leaving a negative cash account
+    {'withdraw_amount': 900_000, 'withdraw_frequency_months': 6},
+])
+def test_cash_is_never_negative_and_flows_reconcile(market, flows):
+    data = market[1]
+    results, daily_data, portfolio_value = run_x2(market, **flows)
+
+    assert (results['remaining_cash'] >= 0).all()
+    assert (daily_data['remaining_cash'] >= 0).all()
+
+    # Between events the holdings do not change, so each event moves the value only by its cash flow
+    prices = event_prices(data, results)
+    shares, cash = columns(results, 'shares', data), results['remaining_cash'].to_numpy()
+    before = (shares[:-1] * prices[1:]).sum(axis=1) + cash[:-1]
+    np.testing.assert_allclose(results['total_portfolio_value'].to_numpy()[1:], before + results['cash_flow'].to_numpy()[1:], rtol=1e-12)
+    np.testing.assert_allclose(results['total_portfolio_value'], (shares * prices).sum(axis=1) + cash, rtol=1e-12)
+    assert not results.loc[results['action'] == 'Withdraw skipped', 'cash_flow'].any()
+
+    # The daily value is the holdings in force on each day at that day's close
+    daily_prices = data.loc[daily_data.index].to_numpy(dtype=float)
+    daily_shares = daily_data[[f'shares_{ticker}' for ticker in data.columns]].to_numpy()
+    np.testing.assert_allclose(portfolio_value, (daily_shares * daily_prices).sum(axis=1) + daily_data['remaining_cash'], rtol=1e-12)
+
+
+def test_matches_dynamic_backtesting_without_flows(market):
+    tickers, data, benchmark_data, ff_data, start_backtesting, end_date = market
+    results, _, portfolio_value = run_x2(market)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        expected, _, expected_value = dynamic_backtesting(tickers, data.index[0], start_backtesting, end_date, 6, 0.02, 'Minimum Variance', 'SLSQP',
+                                                          1_000_000, commission=COMMISSION, data=data, benchmark_data=benchmark_data, ff_data=ff_data)
+
+    # dynamic_backtesting also rebalances on end_date, which the event queue leaves out
+    assert list(results['action']) == ['Start'] + ['Rebalance'] * (len(results) - 1)
+    assert list(results['end_date']) == list(expected['end_date'])[:-1]
+    np.testing.assert_allclose(columns(results, 'weight', data), columns(expected, 'weight', data)[:-1], atol=1e-10)
+
+    # Up to the first rebalance nothing has been carried yet
+    np.testing.assert_array_equal(columns(results, 'shares', data)[0], columns(expected, 'shares', data)[0])
+    first_period = portfolio_value.index < results['end_date'].astype('datetime64[ns]').iloc[1]
+    np.testing.assert_allclose(portfolio_value[first_period], expected_value[first_period], rtol=1e-12)
+
+    # Afterwards the same rule applies, but the uninvested cash that dynamic_backtesting drops stays in the portfolio
+    prices = event_prices(data, results)
+    weights, shares, cash = columns(results, 'weight', data), columns(results, 'shares', data), results['remaining_cash'].to_numpy()
+    carried_value = (shares[:-1] * prices[1:]).sum(axis=1) + cash[:-1]
+    np.testing.assert_array_equal(shares[1:], np.floor(carried_value[:, None] * weights[1:] / (prices[1:] * (1 + COMMISSION))))
@@ -0,0 +1,49 @@
+import warnings
+
+import numpy as np
+import pytest
+from scipy.optimize import approx_fprime
+
+from benchmark import synthetic_market
+from functions import QAA
+from strategies import STRATEGIES
+
+# Omega and CVaR are piecewise linear in the weights; their registered gradients are smoothed surrogates
+SURROGATE_GRADIENTS = ('Omega Ratio', 'CVaR')
+SMOOTH_STRATEGIES = [name for name, spec in STRATEGIES.items() if spec.gradient is not None and name not in SURROGATE_GRADIENTS]
+
+
+def prepared_strategy(strategy, covariance_estimator='Sample', n_assets=6, seed=0):
+    tickers, data, benchmark_data, ff_data = synthetic_market(n_assets, 2, seed)
+    qaa = QAA(tickers=tickers, rf=0.02, lower_bound=0.0, higher_bound=0.99, data=data, benchmark_data=benchmark_data,
+              ff_data=ff_data, covariance_estimator=covariance_estimator, weights_cache=False)
+    qaa.set_optimization_strategy(strategy)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        spec = qaa.prepare_inputs()
+    return spec.objective(qaa), spec.gradient(qaa)
+
+
+def interior_points(n_assets, n_points=4, seed=0):
+    return np.random.default_rng(seed).dirichlet(np.ones(n_assets), n_points)
+
+
+@pytest.mark.parametrize('covariance_estimator', ['Sample', 'Ledoit-Wolf', 'Factor Model'])
+@pytest.mark.parametrize('strategy', SMOOTH_STRATEGIES)
+def test_gradient_matches_finite_differences(strategy, covariance_estimator):
+    objective, gradient = prepared_strategy(strategy, covariance_estimator)
+    for weights in interior_points(6):
+        numerical = approx_fprime(weights, objective, 1e-7)
+        np.testing.assert_allclose(gradient(weights), numerical, rtol=0, atol=1e-5 * np.abs(numerical).max())
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+@pytest.mark.parametrize('strategy', SURROGATE_GRADIENTS)
+def test_surrogate_gradient_follows_finite_differences(strategy, seed):
+    # Only the direction along the budget constraint matters to SLSQP, so both are projected onto sum(w) = 0
+    objective, gradient = prepared_strategy(strategy, n_assets=8, seed=seed)
+    for weights in interior_points(8, seed=seed):
+        numerical = approx_fprime(weights, objective, 1e-7)
+        surrogate = gradient(weights)
+        numerical, surrogate = numerical - numerical.mean(), surrogate - surrogate.mean()
+        assert numerical.dot(surrogate) / (np.linalg.norm(numerical) * np.linalg.norm(surrogate)) > 0.95
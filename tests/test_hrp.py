@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.cluster.hierarchy import linkage
+from scipy.spatial.distance import squareform
+
+from functions import HierarchicalRiskParity
+
+
+def returns_panel(n_rows=500, n_assets=12, seed=0):
+    # A few correlated blocks, so the dendrogram has real clusters to bisect
+    rng = np.random.default_rng(seed)
+    blocks = rng.integers(0, 3, n_assets)
+    factors = rng.normal(0, 0.01, size=(n_rows, 3))
+    noise = rng.normal(0, rng.uniform(0.005, 0.02, n_assets), size=(n_rows, n_assets))
+    index = pd.bdate_range('2020-01-01', periods=n_rows)
+    return pd.DataFrame(factors[:, blocks] + noise, index=index, columns=[f'A{i:02d}' for i in range(n_assets)])
+
+
+def reference_quasi_diagonalization(link):
+    # Recursive expansion of the last cluster into its leaves (Lopez de Prado, 2016)
+    link = link.astype(int)
+    sort_ix = pd.Series([link[-1, 0], link[-1, 1]])
+    num_items = link[-1, 3]
+    while sort_ix.max() >= num_items:
+        sort_ix.index = range(0, sort_ix.shape[0] * 2, 2)
+        clusters = sort_ix[sort_ix >= num_items]
+        i, j = clusters.index, clusters.values - num_items
+        sort_ix[i] = link[j, 0]
+        sort_ix = pd.concat([sort_ix, pd.Series(link[j, 1], index=i + 1)]).sort_index()
+        sort_ix.index = range(sort_ix.shape[0])
+    return sort_ix.tolist()
+
+
+def reference_cluster_variance(cov, items):
+    c_cov = cov.iloc[items, items]
+    ivp = 1. / np.diag(c_cov)
+    ivp /= ivp.sum()
+    return float(ivp @ c_cov.to_numpy() @ ivp)
+
+
+def reference_hrp(returns, linkage_method):
+    cov, corr = returns.cov(), returns.corr()
+    distance = np.clip(1 - corr.to_numpy(), 0, None)
+    distance = (distance + distance.T) / 2
+    np.fill_diagonal(distance, 0)
+    sort_ix = reference_quasi_diagonalization(linkage(squareform(distance, checks=False), method=linkage_method))
+
+    weights = pd.Series(1., index=sort_ix)
+    clusters = [sort_ix]
+    while len(clusters) > 0:
+        clusters = [cluster[start:end] for cluster in clusters
+                    for start, end in ((0, len(cluster) // 2), (len(cluster) // 2, len(cluster))) if len(cluster) > 1]
+        for i in range(0, len(clusters), 2):
+            c_var0 = reference_cluster_variance(cov, clusters[i])
+            c_var1 = reference_cluster_variance(cov, clusters[i + 1])
+            alpha = 1 - c_var0 / (c_var0 + c_var1)
+            weights[clusters[i]] *= alpha
+            weights[clusters[i + 1]] *= 1 - alpha
+    return sort_ix, pd.Series(weights.sort_index().to_numpy(), index=returns.columns)
+
+
+@pytest.mark.parametrize('linkage_method', ['single', 'complete', 'average', 'weighted', 'centroid', 'median', 'ward'])
+@pytest.mark.parametrize('n_assets, seed', [(2, 0), (7, 1), (12, 2), (33, 3)])
+def test_hrp_matches_reference_bisection(linkage_method, n_assets, seed):
+    returns = returns_panel(n_assets=n_assets, seed=seed)
+    expected_order, expected = reference_hrp(returns, linkage_method)
+
+    hrp = HierarchicalRiskParity(returns)
+    weights = hrp.optimize_hrp(linkage_method)
+
+    assert list(hrp.sort_ix) == expected_order
+    np.testing.assert_allclose(weights.to_numpy(), expected.to_numpy(), rtol=1e-10, atol=1e-14)
+    assert list(weights.index) == list(returns.columns)
+    assert weights.sum() == pytest.approx(1.0)
+
+
+def test_hrp_uses_the_given_moments():
+    returns = returns_panel(seed=4)
+    cov, corr = returns.cov().to_numpy(), returns.corr().to_numpy()
+
+    given = HierarchicalRiskParity(returns, cov=cov, corr=corr).optimize_hrp('average')
+    estimated = HierarchicalRiskParity(returns).optimize_hrp('average')
+
+    np.testing.assert_allclose(given.to_numpy(), estimated.to_numpy(), rtol=1e-10)
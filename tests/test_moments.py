@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from moments import MomentAccumulator
+
+
+def returns_panel(n_rows=400, n_assets=5, seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range('2020-01-01', periods=n_rows)
+    returns = pd.DataFrame(rng.normal(0.0004, 0.012, size=(n_rows, n_assets)), index=index)
+    benchmark = pd.Series(returns.mean(axis=1).to_numpy() + rng.normal(0, 0.003, n_rows), index=index)
+    return returns, benchmark
+
+
+def feed_in_batches(accumulator, returns, benchmark, seed=1):
+    # Uneven batches, so rows leave the rolling window in the middle of a stored batch
+    rng = np.random.default_rng(seed)
+    row = 0
+    while row < len(returns):
+        end = min(len(returns), row + int(rng.integers(1, 40)))
+        accumulator.update(returns.iloc[row:end], benchmark.iloc[row:end])
+        row = end
+        yield end
+
+
+@pytest.mark.parametrize('length', [20, 63, 250])
+def test_rolling_matches_pandas(length):
+    returns, benchmark = returns_panel()
+    accumulator = MomentAccumulator('rolling', length=length)
+    rolling_cov = returns.rolling(length).cov()
+    rolling_mean = returns.rolling(length).mean()
+    downside_std = np.minimum(returns, 0).rolling(length).std()
+    benchmark_mean = benchmark.rolling(length).mean()
+
+    checked = 0
+    for end in feed_in_batches(accumulator, returns, benchmark):
+        if end < length:
+            continue
+        date = returns.index[end - 1]
+        moments = accumulator.moments()
+        np.testing.assert_allclose(moments['mean'], rolling_mean.loc[date].to_numpy(), rtol=1e-9, atol=1e-13)
+        np.testing.assert_allclose(moments['cov'], rolling_cov.loc[date].to_numpy(), rtol=1e-8, atol=1e-14)
+        np.testing.assert_allclose(moments['downside_std'], downside_std.loc[date].to_numpy(), rtol=1e-8, atol=1e-13)
+        assert moments['benchmark_mean'] == pytest.approx(benchmark_mean.loc[date], rel=1e-9, abs=1e-13)
+        checked += 1
+    assert checked > 0
+
+
+def test_expanding_matches_pandas():
+    returns, benchmark = returns_panel(n_rows=200)
+    accumulator = MomentAccumulator('expanding')
+    for end in feed_in_batches(accumulator, returns, benchmark):
+        pass
+    moments = accumulator.moments()
+    np.testing.assert_allclose(moments['mean'], returns.mean().to_numpy(), rtol=1e-10)
+    np.testing.assert_allclose(moments['cov'], returns.cov().to_numpy(), rtol=1e-9)
+
+
+def test_ewm_matches_pandas():
+    returns, benchmark = returns_panel(n_rows=300)
+    accumulator = MomentAccumulator('ewm', halflife=30)
+    for end in feed_in_batches(accumulator, returns, benchmark):
+        pass
+    ewm = returns.ewm(halflife=30, adjust=True)
+    np.testing.assert_allclose(accumulator.moments()['mean'], ewm.mean().iloc[-1].to_numpy(), rtol=1e-9)
+    np.testing.assert_allclose(accumulator.moments()['cov'], ewm.cov().loc[returns.index[-1]].to_numpy(), rtol=1e-8)
@@ -0,0 +1,121 @@
+import numpy as np
+import pytest
+from scipy.optimize import minimize
+
+from solvers import solve_box_qp, maximize_ratio_on_frontier, solve_cvar_lp, _solve_cvar_lp_primal
+
+
+def random_qp(n_assets, seed):
+    rng = np.random.default_rng(seed)
+    factors = rng.normal(size=(n_assets, n_assets))
+    quadratic = factors @ factors.T / n_assets + 0.1 * np.eye(n_assets)
+    return quadratic, rng.normal(scale=0.5, size=n_assets)
+
+
+def slsqp_qp(quadratic, linear, lower_bound, higher_bound):
+    n_assets = len(linear)
+    result = minimize(lambda w: 0.5 * w @ quadratic @ w + linear @ w, np.ones(n_assets) / n_assets,
+                      jac=lambda w: quadratic @ w + linear, method='SLSQP',
+                      bounds=[(lower_bound, higher_bound)] * n_assets,
+                      constraints={'type': 'eq', 'fun': lambda w: w.sum() - 1, 'jac': lambda w: np.ones(n_assets)},
+                      options={'ftol': 1e-14, 'maxiter': 1000})
+    assert result.success
+    return result
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('lower_bound, higher_bound', [(0.0, 1.0), (0.02, 0.3), (0.05, 0.99)])
+def test_box_qp_matches_slsqp(seed, lower_bound, higher_bound):
+    quadratic, linear = random_qp(12, seed)
+    exact = solve_box_qp(quadratic, linear, lower_bound, higher_bound)
+    reference = slsqp_qp(quadratic, linear, lower_bound, higher_bound)
+
+    assert exact.success
+    assert exact.x.sum() == pytest.approx(1, abs=1e-10)
+    assert exact.x.min() >= lower_bound and exact.x.max() <= higher_bound
+    assert exact.fun <= reference.fun + 1e-9
+    # The objective is strictly convex, so the optimum is unique
+    np.testing.assert_allclose(exact.x, reference.x, atol=1e-5)
+
+
+def test_box_qp_warm_start_keeps_the_optimum():
+    quadratic, linear = random_qp(20, 7)
+    cold = solve_box_qp(quadratic, linear, 0.01, 0.2)
+    warm = solve_box_qp(quadratic, linear, 0.01, 0.2, initial_weights=cold.x)
+    np.testing.assert_allclose(warm.x, cold.x, atol=1e-10)
+
+
+@pytest.mark.parametrize('lower_bound, higher_bound', [(0.2, 0.9), (0.0, 0.05), (0.3, 0.2)])
+def test_box_qp_reports_infeasible_bounds(lower_bound, higher_bound):
+    quadratic, linear = random_qp(6, 0)
+    for result in (solve_box_qp(quadratic, linear, lower_bound, higher_bound),
+                   maximize_ratio_on_frontier(quadratic, linear, lambda w: linear @ w, lower_bound, higher_bound)):
+        assert not result.success and result.x is None
+
+
+def multistart_sharpe(cov, mean, risk_free, lower_bound, higher_bound, n_starts=20):
+    n_assets = len(mean)
+    sharpe = lambda w: (w @ mean - risk_free) * 252 / np.sqrt(252 * w @ cov @ w)
+    starts = np.random.default_rng(0).dirichlet(np.ones(n_assets), n_starts)
+    best = -np.inf
+    for start in np.clip(starts, lower_bound, higher_bound):
+        result = minimize(lambda w: -sharpe(w), start / start.sum(), method='SLSQP', bounds=[(lower_bound, higher_bound)] * n_assets,
+                          constraints={'type': 'eq', 'fun': lambda w: w.sum() - 1}, options={'ftol': 1e-12, 'maxiter': 500})
+        if result.success:
+            best = max(best, sharpe(result.x))
+    return sharpe, best
+
+
+@pytest.mark.parametrize('risk_free', [0.0, 2e-4, 6e-4, 0.045])
+@pytest.mark.parametrize('lower_bound, higher_bound', [(0.0, 0.5), (0.02, 0.3)])
+def test_sharpe_frontier_matches_multistart_slsqp(risk_free, lower_bound, higher_bound):
+    rng = np.random.default_rng(3)
+    returns = rng.normal(rng.uniform(-2e-4, 1e-3, 15), rng.uniform(0.005, 0.02, 15), size=(500, 15))
+    cov, mean = np.cov(returns, rowvar=False), returns.mean(axis=0)
+    sharpe, best = multistart_sharpe(cov, mean, risk_free, lower_bound, higher_bound)
+    result = maximize_ratio_on_frontier(cov * 252, mean - risk_free, sharpe, lower_bound, higher_bound)
+
+    if best <= 0:
+        # The maximum is off the frontier, which must be reported rather than returned as optimal
+        assert not result.success
+    else:
+        assert result.success
+        assert result.x.sum() == pytest.approx(1, abs=1e-9)
+        assert result.fun >= best - 1e-6 * abs(best)
+
+
+def test_box_qp_keeps_the_budget_on_a_linear_objective():
+    # The end of the frontier (t = 1) is a linear program: the highest returns fill up to the higher bound
+    linear = -np.array([0.3, 0.9, 0.1, 1.0, 0.5])
+    result = solve_box_qp(1e-12 * np.eye(5), linear, 0.0, 0.99)
+    assert result.success
+    assert result.x.sum() == pytest.approx(1, abs=1e-12)
+    np.testing.assert_allclose(result.x, [0, 0.01, 0, 0.99, 0], atol=1e-12)
+
+
+def empirical_cvar(returns, weights, alpha):
+    # Rockafellar-Uryasev value at the optimal VaR level, which is one of the portfolio losses
+    losses = -returns @ weights
+    return min(z + np.maximum(losses - z, 0).sum() / (alpha * len(losses)) for z in losses)
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('alpha, lower_bound, higher_bound', [(0.05, 0.0, 1.0), (0.05, 0.05, 0.4), (0.1, 0.02, 0.99)])
+def test_cvar_dual_matches_primal(seed, alpha, lower_bound, higher_bound):
+    rng = np.random.default_rng(seed)
+    returns = rng.standard_t(4, size=(300, 8)) * 0.01 + rng.normal(0.0005, 0.0002, size=8)
+    dual = solve_cvar_lp(returns, alpha, lower_bound, higher_bound)
+    primal = _solve_cvar_lp_primal(returns, alpha, lower_bound, higher_bound)
+
+    assert dual.success and primal.success
+    assert dual.x.sum() == pytest.approx(1, abs=1e-6)
+    assert dual.x.min() >= lower_bound and dual.x.max() <= higher_bound
+    assert dual.fun == pytest.approx(primal.fun, rel=1e-7, abs=1e-10)
+    # The weights read from the dual multipliers reach the same CVaR
+    assert empirical_cvar(returns, dual.x, alpha) == pytest.approx(primal.fun, rel=1e-6, abs=1e-10)
+
+
+def test_cvar_lp_reports_infeasible_bounds():
+    returns = np.random.default_rng(0).normal(0, 0.01, size=(100, 5))
+    result = solve_cvar_lp(returns, 0.05, 0.25, 0.9)
+    assert not result.success and result.x is None
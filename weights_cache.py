@@ -0,0 +1,206 @@
+"""
+# -- --------------------------------------------------------------------------------------------------- -- #
+# -- project: Quantitative Asset Allocation (QAA)                                                        -- #
+# -- script: weights_cache.py - Python script with the content-addressed cache of optimal weights        -- #
+# -- authors: diegotita4 - Antonio-IF - JoAlfonso - J3SVS - Oscar148                                     -- #
+# -- license: GNU GENERAL PUBLIC LICENSE - Version 3, 29 June 2007                                       -- #
+# -- repository: https://github.com/diegotita4/PAP                                                       -- #
+# -- --------------------------------------------------------------------------------------------------- -- #
+"""
+
+# ----------------------------------------------------------------------------------------------------
+
+# LIBRARIES
+import os
+import hashlib
+from collections import OrderedDict
+import numpy as np
+
+# ----------------------------------------------------------------------------------------------------
+
+# CACHE KEYS
+def optimization_key(*parts):
+    """
+    Content hash of an optimization problem.
+
+    Arrays are hashed by dtype, shape and bytes, so two windows with the same returns share a key whatever
+    their origin; every other part (strategy, model, bounds, ...) is hashed by its repr.
+
+    :param parts: Arrays, scalars, strings, None or nested tuples/lists/dicts of them.
+    :type parts: object
+    :return: Hexadecimal BLAKE2b digest.
+    :rtype: str
+    """
+    digest = hashlib.blake2b(digest_size=20)
+
+    def feed(part):
+        if isinstance(part, np.ndarray):
+            part = np.ascontiguousarray(part)
+            digest.update(f'array:{part.dtype.str}:{part.shape}:'.encode())
+            digest.update(part.tobytes())
+        elif isinstance(part, (tuple, list)):
+            digest.update(f'seq:{len(part)}:'.encode())
+            for item in part:
+                feed(item)
+        elif isinstance(part, dict):
+            digest.update(f'dict:{len(part)}:'.encode())
+            for name in sorted(part):
+                feed(name)
+                feed(part[name])
+        else:
+            digest.update(f'{type(part).__name__}:{part!r};'.encode())
+
+    for part in parts:
+        feed(part)
+    return digest.hexdigest()
+
+# ----------------------------------------------------------------------------------------------------
+
+# TWO-TIER CACHE
+class WeightsCache:
+    """
+    Cache of optimal weights with an in-memory LRU tier and an optional on-disk tier.
+
+    The memory tier keeps the most recently used max_entries solutions. The disk tier stores one .npz file
+    per key under root and, after every write, removes the least recently used files until the directory
+    fits in max_disk_bytes; a disk hit refreshes the file and promotes the entry to memory.
+
+    Methods:
+    - get: Returns the cached weights (and labels) of a key, or None.
+    - put: Stores the weights of a key in both tiers.
+    - clear: Empties both tiers.
+    """
+
+    def __init__(self, max_entries=256, root='.qaa_store/weights', max_disk_bytes=64 * 1024 ** 2):
+        """
+        Initialize the WeightsCache.
+
+        :param max_entries: Number of solutions kept in memory.
+        :type max_entries: int
+        :param root: Directory of the disk tier, or None to keep the cache in memory only.
+        :type root: str
+        :param max_disk_bytes: Size limit of the disk tier in bytes.
+        :type max_disk_bytes: int
+        """
+        self.max_entries = max_entries
+        self.root = root
+        self.max_disk_bytes = max_disk_bytes
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        if self.root is not None:
+            os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.root, f'{key}.npz')
+
+    def get(self, key):
+        """
+        Returns the cached solution of a key.
+
+        :param key: Key from optimization_key.
+        :type key: str
+        :return: (weights, labels) with labels None for unlabeled weights, or None on a miss. Both are copies, so
+                 callers may modify them without changing the cache.
+        :rtype: tuple
+        """
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return self._detached(self._memory[key])
+
+        if self.root is not None and os.path.exists(self._path(key)):
+            try:
+                with np.load(self._path(key), allow_pickle=False) as stored:
+                    entry = (stored['weights'], list(stored['labels']) if 'labels' in stored else None)
+            except (OSError, ValueError, KeyError):
+                # A partial or corrupted file is treated as a miss and overwritten by the next put
+                entry = None
+            if entry is not None:
+                os.utime(self._path(key))
+                self._remember(key, entry)
+                self.hits += 1
+                return self._detached(entry)
+
+        self.misses += 1
+        return None
+
+    def put(self, key, weights, labels=None):
+        """
+        Stores a solution under a key.
+
+        :param key: Key from optimization_key.
+        :type key: str
+        :param weights: Optimal weights.
+        :type weights: np.ndarray
+        :param labels: Asset labels of the weights (e.g. the index of an HRP Series).
+        :type labels: list
+        """
+        entry = (np.array(weights, dtype=float), [str(label) for label in labels] if labels is not None else None)
+        self._remember(key, entry)
+        if self.root is not None:
+            arrays = {'weights': entry[0]}
+            if entry[1] is not None:
+                arrays['labels'] = np.array(entry[1], dtype=str)
+            # Write to a temporary file first so concurrent readers never see a partial entry
+            temporary = os.path.join(self.root, f'{key}.{os.getpid()}.tmp.npz')
+            np.savez(temporary, **arrays)
+            os.replace(temporary, self._path(key))
+            self._evict_disk()
+
+    @staticmethod
+    def _detached(entry):
+        weights, labels = entry
+        return weights.copy(), list(labels) if labels is not None else None
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self):
+        """Removes the least recently used files until the disk tier fits in max_disk_bytes."""
+        files = []
+        for entry in os.scandir(self.root):
+            if entry.name.endswith('.npz') and '.tmp.' not in entry.name:
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        """Empties the memory and disk tiers."""
+        self._memory.clear()
+        if self.root is not None:
+            for entry in os.scandir(self.root):
+                if entry.name.endswith('.npz'):
+                    os.remove(entry.path)
+
+# ----------------------------------------------------------------------------------------------------
+
+# DEFAULT CACHE
+_DEFAULT_CACHE = None
+
+
+def set_default_weights_cache(cache):
+    """
+    Sets the cache used by every QAA created without an explicit weights_cache.
+
+    :param cache: WeightsCache shared by the process, or None to disable the default cache.
+    :type cache: WeightsCache
+    """
+    global _DEFAULT_CACHE
+    _DEFAULT_CACHE = cache
+
+
+def get_default_weights_cache():
+    """Cache used by every QAA created without an explicit weights_cache (None when disabled)."""
+    return _DEFAULT_CACHE